@@ -117,6 +117,8 @@ if [[ ! -f "$OUT_TSV" ]]; then
 fi
 
 trap 'write_summary' EXIT
+# No flight recorder here: ignore SIGUSR1 instead of dying from it without a summary
+trap '' USR1
 
 {
   # One-time metadata snapshot for easier per-task attribution
@@ -1,10 +1,26 @@
 #!/usr/bin/env python3
 import argparse
+import gzip
 import json
+import math
 import os
+import re
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
-from statistics import mean
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Optional binary reader (samplestore.py next to this script)
+try:
+    from samplestore import StoreReader  # type: ignore
+except Exception:
+    StoreReader = None
+
+# Optional NumPy: vectorizes the per-chunk statistics; the pure-Python path gives the same results
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None
 
 FIELDS_NUMERIC = [
     "load1",
@@ -20,21 +36,87 @@ FIELDS_NUMERIC = [
     "alt_pmem",
     "alt_rss_mb",
     "alt_vsz_mb",
+    "alt_pss_mb",
     "alt_read_mb",
     "alt_write_mb",
+    "alt_workers",
+    # True peaks between samples: VmHWM of the tree (restarted per phase) and of its largest process
+    "alt_hwm_sum_mb",
+    "alt_proc_hwm_mb",
+    # Cgroup memory and exhaustion forecasts (null while not trending toward the limit)
+    "cg_mem_current_mb",
+    "cg_mem_peak_mb",
+    "cg_mem_anon_mb",
+    "cg_mem_file_mb",
+    "cg_mem_dirty_mb",
+    "cg_mem_writeback_mb",
+    # Container CPU and memory against the cgroup limits: the sizing metrics
+    "cg_cpu_cores",
+    "cg_cpu_limit_cores",
+    "cg_cpu_util_pct",
+    "cg_throttled_pct",
+    "cg_throttled_s",
+    "cg_mem_working_set_mb",
+    "cg_mem_limit_mb",
+    "cg_mem_util_pct",
+    # Pressure stall (PSI): percent of wall time stalled since the previous sample
+    "psi_cpu_some",
+    "psi_cpu_full",
+    "psi_mem_some",
+    "psi_mem_full",
+    "psi_io_some",
+    "psi_io_full",
+    "disk_full_eta_s",
+    "mem_oom_eta_s",
+    # Input read progress of the AltAnalyze tree (null while no BAM/BED is open)
+    "progress_mb_s",
+    "progress_stalled_s",
     # Optional IO rates
     "disk_read_mb_s",
     "disk_write_mb_s",
     "net_recv_mb_s",
     "net_sent_mb_s",
+    # Optional per-device IO of the disks behind the Cromwell root, / and the working directory
+    "disk_iops",
+    "disk_await_ms",
+    "disk_queue",
+    "disk_util_pct",
+    "disk_iops_root",
+    "disk_await_ms_root",
+    "disk_queue_root",
+    "disk_util_pct_root",
+    "disk_iops_pwd",
+    "disk_await_ms_pwd",
+    "disk_queue_pwd",
+    "disk_util_pct_pwd",
 ]
 
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="Aggregate resource-monitor JSONL into summary metrics.")
-    p.add_argument("monitor_dir", help="Directory containing usage.jsonl and metadata.json")
-    p.add_argument("--out-json", default=None, help="Path to write summary JSON (default: monitor_dir/summary.metrics.json)")
-    p.add_argument("--out-tsv", default=None, help="Path to write summary TSV (default: monitor_dir/summary.metrics.tsv)")
+    p.add_argument("monitor_dir", help="Directory containing usage.jsonl and metadata.json (with --stitch or --fleet: "
+                                        "a tree of them; with --query: the fleet database)")
+    p.add_argument("--out-json", default=None, help="Path to write summary JSON (default: monitor_dir/summary.metrics.json, "
+                                                     "with --stitch monitor_dir/attempts.json)")
+    p.add_argument("--out-tsv", default=None, help="Path to write summary TSV (default: monitor_dir/summary.metrics.tsv, "
+                                                    "with --stitch monitor_dir/attempts.tsv)")
+    p.add_argument("--stitch", action="store_true",
+                   help="Find every monitoring dir under monitor_dir, group attempts of the same task/shard and "
+                        "report the compute and bytes lost to attempts that were retried")
+    p.add_argument("--fleet", action="store_true",
+                   help="Aggregate every monitoring dir under monitor_dir in parallel into the SQLite --db, "
+                        "skipping dirs already ingested and unchanged since")
+    p.add_argument("--db", default=None, help="Fleet database for --fleet (default: monitor_dir/fleet.sqlite)")
+    p.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Worker processes for --fleet (default: CPUs)")
+    p.add_argument("--label", default="",
+                   help="With --fleet: tag the ingested attempts (e.g. the tissue); with --query: only those")
+    p.add_argument("--query", default=None, metavar="FIELD",
+                   help="Percentiles of FIELD over a fleet database: a run column (mem_peak_mb), "
+                        "metric.stat (alt_rss_mb.max) or a sampled metric (alt_rss_mb, over every sample)")
+    p.add_argument("--call", default=None, help="With --query: only calls matching this glob (e.g. 'BamToBed*')")
+    p.add_argument("--quantile", type=float, default=95.0, help="With --query: the percentile to report (default 95)")
+    p.add_argument("--source", choices=["auto", "bin", "jsonl"], default="auto",
+                   help="Read usage.bin or usage.jsonl (default auto: usage.bin unless missing or its ring wrapped)")
     return p.parse_args()
 
 
@@ -48,68 +130,606 @@ def parse_time(ts: str) -> Optional[datetime]:
         return None
 
 
-def aggregate(records: List[Dict[str, Any]]) -> Dict[str, Any]:
-    if not records:
-        return {"count": 0}
-
-    # time span
-    t0 = parse_time(records[0].get("ts", ""))
-    t1 = parse_time(records[-1].get("ts", ""))
-    duration_s = (t1 - t0).total_seconds() if (t0 and t1) else None
-
-    # Task context (take last non-empty)
-    task = next((r.get("task") for r in reversed(records) if r.get("task")), "")
-    shard = next((r.get("shard") for r in reversed(records) if r.get("shard")), "")
-    attempt = next((r.get("attempt") for r in reversed(records) if r.get("attempt")), "")
-
-    # Numeric aggregates
-    agg: Dict[str, Dict[str, Optional[float]]] = {}
-    for key in FIELDS_NUMERIC:
-        vals = [r.get(key) for r in records if isinstance(r.get(key), (int, float))]
-        if vals:
-            agg[key] = {
-                "min": float(min(vals)),
-                "max": float(max(vals)),
-                "avg": float(mean(vals)),
-            }
+def usage_segments(mon_dir: str) -> List[str]:
+    """Rolled usage.jsonl.<seq>[.gz] segments oldest first, followed by the live usage.jsonl."""
+    segs = []
+    for fn in os.listdir(mon_dir):
+        if not fn.startswith("usage.jsonl."):
+            continue
+        seq = fn[len("usage.jsonl."):]
+        if seq.endswith(".gz"):
+            seq = seq[:-3]
+        if seq.isdigit():
+            segs.append((int(seq), os.path.join(mon_dir, fn)))
+    paths = [p for _, p in sorted(segs)]
+    live = os.path.join(mon_dir, "usage.jsonl")
+    if os.path.exists(live):
+        paths.append(live)
+    return paths
+
+
+def open_store(mon_dir: str, source: str = "auto"):
+    """StoreReader for usage.bin when it should be read, else None (JSONL instead)."""
+    bin_path = os.path.join(mon_dir, "usage.bin")
+    if source != "jsonl" and StoreReader is not None and os.path.exists(bin_path):
+        try:
+            reader = StoreReader(bin_path)
+        except Exception:
+            if source == "bin":
+                raise
+            return None
+        # A wrapped ring has lost its oldest samples; the rotated JSONL still has them
+        if source == "bin" or not reader.wrapped or not usage_segments(mon_dir):
+            return reader
+        reader.close()
+    elif source == "bin":
+        raise SystemExit(f"Cannot read {bin_path} (missing, or samplestore.py not importable)")
+    return None
+
+
+def iter_records(mon_dir: str, source: str = "auto") -> Iterator[Dict[str, Any]]:
+    """Samples oldest first, one at a time: usage.bin, or the rolled and live usage.jsonl segments."""
+    reader = open_store(mon_dir, source)
+    if reader is not None:
+        try:
+            yield from reader.records()
+        finally:
+            reader.close()
+        return
+    for path in usage_segments(mon_dir):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except Exception:
+                    continue
+
+
+def feed(acc: "StreamAggregator", mon_dir: str, source: str = "auto") -> None:
+    """Stream a run's samples into ``acc``: usage.bin a column chunk at a time when NumPy is
+    installed (no per-record dicts), else record by record."""
+    reader = open_store(mon_dir, source) if np is not None else None
+    if reader is None:
+        for r in iter_records(mon_dir, source):
+            acc.add(r)
+        return
+    try:
+        for key in acc.context:
+            if reader.context.get(key):
+                acc.context[key] = reader.context[key]
+        enums = reader.header.get("enums", {})
+        for cols in reader.chunks(CHUNK):
+            acc.add_columns(cols, enums)
+    finally:
+        reader.close()
+
+
+def read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def task_context_from_path(path: str):
+    """(call, shard, attempt) from Cromwell execution path components, as monitor.py does."""
+    call = shard = attempt = ""
+    for p in path.split(os.sep):
+        if p.startswith("call-"):
+            call = p[len("call-"):]
+        elif p.startswith("shard-"):
+            shard = p[len("shard-"):]
+        elif p.startswith("attempt-"):
+            attempt = p[len("attempt-"):]
+    return call, shard, attempt
+
+
+def load_phases(mon_dir: str) -> List[Dict[str, Any]]:
+    """Per-phase rows of phases.tsv (written by monitor.py), numbers converted."""
+    path = os.path.join(mon_dir, "phases.tsv")
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        lines = [ln.rstrip("\n").split("\t") for ln in f if ln.strip()]
+    if not lines:
+        return []
+    rows = []
+    for vals in lines[1:]:
+        row: Dict[str, Any] = {}
+        for key, val in zip(lines[0], vals):
+            if val == "None":
+                row[key] = None
+                continue
+            try:
+                row[key] = int(val)
+            except ValueError:
+                try:
+                    row[key] = float(val)
+                except ValueError:
+                    row[key] = val
+        rows.append(row)
+    return rows
+
+
+def load_events(mon_dir: str) -> Optional[List[Dict[str, Any]]]:
+    """events.jsonl written by monitor.py (without the embedded samples); None when absent."""
+    path = os.path.join(mon_dir, "events.jsonl")
+    if not os.path.exists(path):
+        return None
+    events = []
+    with open(path) as f:
+        for line in f:
+            try:
+                ev = json.loads(line)
+            except Exception:
+                continue
+            ev.pop("sample", None)
+            events.append(ev)
+    return events
+
+
+# Headroom over the observed peak for the recommended memory request
+MEM_HEADROOM = 1.2
+# Quantiles reported per metric, and the sketch's relative error
+QUANTILES = (50, 95, 99)
+SKETCH_REL_ERR = 0.01
+# Sample spacing above this is a monitor restart or a gap, not an interval the value covers
+MAX_GAP_S = 300.0
+# Records buffered between statistics updates; bounds memory on runs of any length
+CHUNK = 4096
+
+
+class QuantileSketch:
+    """Relative-error quantile sketch over log-spaced buckets (DDSketch).
+
+    A value v lands in bucket ceil(log_gamma(|v|)), so every quantile estimate is within
+    ``rel_err`` of a value actually at that rank, whatever the spread of the data. Memory
+    is bounded by ``max_bins`` buckets per sign (the smallest ones are folded together past
+    it, which only coarsens the lowest quantiles); sketches with the same ``rel_err``
+    merge exactly, which is how per-task summaries roll up into fleet percentiles.
+    """
+
+    def __init__(self, rel_err: float = SKETCH_REL_ERR, max_bins: int = 2048):
+        self.rel_err = rel_err
+        self.gamma = (1 + rel_err) / (1 - rel_err)
+        self._inv_lg = 1.0 / math.log(self.gamma)
+        self.max_bins = max_bins
+        self.pos: Dict[int, int] = {}
+        self.neg: Dict[int, int] = {}
+        self.zero = 0
+        self.count = 0
+
+    def add(self, v: float) -> None:
+        self.count += 1
+        if v > 1e-9:
+            k = math.ceil(math.log(v) * self._inv_lg)
+            self.pos[k] = self.pos.get(k, 0) + 1
+            if len(self.pos) > self.max_bins:
+                self._fold(self.pos)
+        elif v < -1e-9:
+            k = math.ceil(math.log(-v) * self._inv_lg)
+            self.neg[k] = self.neg.get(k, 0) + 1
+            if len(self.neg) > self.max_bins:
+                self._fold(self.neg)
+        else:
+            self.zero += 1
+
+    def add_array(self, v) -> None:
+        """Add a NumPy array of values (no NaNs) at once."""
+        self.count += int(v.size)
+        for bins, part in ((self.pos, v[v > 1e-9]), (self.neg, -v[v < -1e-9])):
+            if part.size:
+                keys, counts = np.unique(np.ceil(np.log(part) * self._inv_lg).astype(np.int64), return_counts=True)
+                for k, n in zip(keys.tolist(), counts.tolist()):
+                    bins[k] = bins.get(k, 0) + n
+                while len(bins) > self.max_bins:
+                    self._fold(bins)
+        self.zero += int(np.count_nonzero(np.abs(v) <= 1e-9))
+
+    @staticmethod
+    def _fold(bins: Dict[int, int]) -> None:
+        a, b = sorted(bins)[:2]
+        bins[b] += bins.pop(a)
+
+    def _value(self, k: int) -> float:
+        return 2.0 * self.gamma ** k / (self.gamma + 1)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate of the ``q`` percentile (0-100); None when empty."""
+        if not self.count:
+            return None
+        rank = q / 100.0 * (self.count - 1)
+        seen = 0
+        for k in sorted(self.neg, reverse=True):
+            seen += self.neg[k]
+            if seen > rank:
+                return -self._value(k)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for k in sorted(self.pos):
+            seen += self.pos[k]
+            if seen > rank:
+                return self._value(k)
+        return self._value(max(self.pos)) if self.pos else 0.0
+
+    def merge(self, other: "QuantileSketch") -> None:
+        for mine, theirs in ((self.pos, other.pos), (self.neg, other.neg)):
+            for k, n in theirs.items():
+                mine[k] = mine.get(k, 0) + n
+            while len(mine) > self.max_bins:
+                self._fold(mine)
+        self.zero += other.zero
+        self.count += other.count
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"rel_err": self.rel_err, "zero": self.zero,
+                "pos": {str(k): n for k, n in self.pos.items()}, "neg": {str(k): n for k, n in self.neg.items()}}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "QuantileSketch":
+        sk = cls(d.get("rel_err", SKETCH_REL_ERR))
+        sk.zero = d.get("zero", 0)
+        sk.pos = {int(k): n for k, n in d.get("pos", {}).items()}
+        sk.neg = {int(k): n for k, n in d.get("neg", {}).items()}
+        sk.count = sk.zero + sum(sk.pos.values()) + sum(sk.neg.values())
+        return sk
+
+
+class RunningStats:
+    """Min, max, mean and variance, a quantile sketch and a time-weighted mean of one metric.
+
+    Mean and variance come from running sums of the values shifted by the first one (so a
+    constant series has exactly its value and no variance). The sums are accumulated in
+    sample order on both paths (``np.cumsum`` is sequential), which keeps the NumPy and
+    pure-Python results bit-identical whatever the chunking.
+
+    The time weight of a sample is the interval since the previous sample (capped at
+    ``MAX_GAP_S``): the monitor measures rates over the interval that ends at a sample, and
+    denser sampling during busy phases would otherwise pull a plain average toward them.
+    ``tw_sum`` is then the metric integrated over time (e.g. core-seconds for cores).
+    """
+
+    __slots__ = ("n", "min", "max", "shift", "s1", "s2", "tw_sum", "tw_span", "last", "sketch")
+
+    def __init__(self):
+        self.n = 0
+        self.min = self.max = self.last = None
+        self.shift = self.s1 = self.s2 = 0.0
+        self.tw_sum = self.tw_span = 0.0
+        self.sketch = QuantileSketch()
+
+    @property
+    def mean(self) -> float:
+        return self.shift + self.s1 / self.n if self.n else 0.0
+
+    @property
+    def m2(self) -> float:
+        """Sum of squared deviations from the mean."""
+        return max(0.0, self.s2 - self.s1 * self.s1 / self.n) if self.n else 0.0
+
+    def add(self, v: float, dt: Optional[float] = None) -> None:
+        if not self.n:
+            self.shift = v
+        self.n += 1
+        if self.min is None or v < self.min:
+            self.min = v
+        if self.max is None or v > self.max:
+            self.max = v
+        d = v - self.shift
+        self.s1 += d
+        self.s2 += d * d
+        if dt:
+            self.tw_sum += v * dt
+            self.tw_span += dt
+        self.last = v
+        self.sketch.add(v)
+
+    @staticmethod
+    def _acc(total: float, a) -> float:
+        """``total`` plus the elements of ``a`` added one at a time, as the scalar path does."""
+        return float(np.cumsum(np.concatenate(([total], a)))[-1])
+
+    def add_array(self, v, dt) -> None:
+        """Add a NumPy array of values with their time weights (NaN where unknown); NaN values are skipped."""
+        ok = ~np.isnan(v)
+        v, dt = v[ok], dt[ok]
+        if not v.size:
+            return
+        if not self.n:
+            self.shift = float(v[0])
+        self.n += int(v.size)
+        d = v - self.shift
+        self.s1 = self._acc(self.s1, d)
+        self.s2 = self._acc(self.s2, d * d)
+        lo, hi = float(v.min()), float(v.max())
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+        w = ~np.isnan(dt) & (dt > 0)
+        if w.any():
+            self.tw_sum = self._acc(self.tw_sum, v[w] * dt[w])
+            self.tw_span = self._acc(self.tw_span, dt[w])
+        self.last = float(v[-1])
+        self.sketch.add_array(v)
+
+    def quantile(self, q: float) -> Optional[float]:
+        v = self.sketch.quantile(q)
+        # The sketch answers to within rel_err; never outside the observed range
+        return None if v is None else min(max(v, self.min), self.max)
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        if not self.n:
+            out: Dict[str, Optional[float]] = {"min": None, "max": None, "avg": None, "std": None}
+            out.update({f"p{q}": None for q in QUANTILES})
+            out["tw_avg"] = None
+            return out
+        out = {"min": float(self.min), "max": float(self.max), "avg": _sig(self.mean),
+               "std": _sig(math.sqrt(self.m2 / (self.n - 1))) if self.n > 1 else 0.0}
+        out.update({f"p{q}": self.quantile(q) for q in QUANTILES})
+        out["tw_avg"] = _sig(self.tw_sum / self.tw_span) if self.tw_span > 0 else None
+        return out
+
+
+def _sig(v: float) -> float:
+    """``v`` to 12 significant digits, without the last-bit noise of floating-point sums."""
+    return float(f"{v:.12g}")
+
+
+class StreamAggregator:
+    """One pass over the samples in constant memory: ``add()`` each record, then ``result()``.
+
+    Keeps a RunningStats per numeric field plus the few run-level facts the summary needs
+    (time span, task context, low-disk sample counts, phases reached, last cumulative I/O).
+    Records are buffered ``CHUNK`` at a time and folded into the statistics a column at a
+    time, with NumPy when it is installed.
+    """
+
+    def __init__(self, fields: List[str] = FIELDS_NUMERIC):
+        self.stats = {k: RunningStats() for k in fields}
+        self.count = 0
+        self.first_ts = self.last_ts = None
+        self._t0 = self._prev_t = None
+        self.context = {"task": "", "shard": "", "attempt": ""}
+        self.low_disk = {"warn": 0, "crit": 0}
+        self.phases: Dict[str, None] = {}
+        self.last_phase = None
+        self.first: Dict[str, Any] = {}
+        self._chunk: List[Dict[str, Any]] = []
+        self._dts: List[Optional[float]] = []
+
+    def add(self, r: Dict[str, Any]) -> None:
+        self.count += 1
+        ts = r.get("ts", "")
+        t = parse_time(ts)
+        if self.first_ts is None:
+            self.first_ts = ts
+            self._t0 = t
+        self.last_ts = ts
+        dt = None
+        if t is not None:
+            if self._prev_t is not None:
+                dt = min(max(0.0, (t - self._prev_t).total_seconds()), MAX_GAP_S)
+            self._prev_t = t
+        for key in self.context:
+            if r.get(key):
+                self.context[key] = r[key]
+        if r.get("phase"):
+            self.phases[r["phase"]] = None
+            self.last_phase = r["phase"]
+        free = r.get("disk_free_gb")
+        if free is not None and free.__class__ in (int, float):
+            self.low_disk["warn"] += free <= 20
+            self.low_disk["crit"] += free <= 5
+        self._chunk.append(r)
+        self._dts.append(dt)
+        if len(self._chunk) >= CHUNK:
+            self.flush()
+
+    def add_columns(self, cols: Dict[str, Any], enums: Optional[Dict[str, List[str]]] = None) -> None:
+        """Add a chunk of samples as NumPy column arrays (``StoreReader.chunks()``: epoch ``t``,
+        NaN for nulls, enum columns as indexes into ``enums``)."""
+        self.flush()
+        t = cols.get("t")
+        if t is None or not len(t):
+            return
+        self.count += len(t)
+        first, last = datetime.fromtimestamp(float(t[0])), datetime.fromtimestamp(float(t[-1]))
+        if self.first_ts is None:
+            self.first_ts, self._t0 = first.isoformat(), first
+        prev = self._prev_t.timestamp() if self._prev_t is not None else np.nan
+        self.last_ts, self._prev_t = last.isoformat(), last
+        # Whole microseconds, rounded from the fraction as datetime.fromtimestamp() does for the
+        # ISO timestamps of usage.jsonl, so both paths weight samples alike
+        tt = np.concatenate(([prev], t))
+        sec = np.floor(tt)
+        us = (sec - sec[-1]) * 1e6 + np.round((tt - sec) * 1e6)
+        dt = np.clip(np.diff(us) / 1e6, 0.0, MAX_GAP_S)
+        names = (enums or {}).get("phase")
+        codes = cols.get("phase")
+        if names and codes is not None:
+            codes = codes[~np.isnan(codes)].astype(int)
+            for c in dict.fromkeys(codes.tolist()):
+                if 0 <= c < len(names) and names[c]:
+                    self.phases[names[c]] = None
+            if codes.size and 0 <= codes[-1] < len(names) and names[codes[-1]]:
+                self.last_phase = names[codes[-1]]
+        free = cols.get("disk_free_gb")
+        if free is not None:
+            self.low_disk["warn"] += int(np.count_nonzero(free <= 20))
+            self.low_disk["crit"] += int(np.count_nonzero(free <= 5))
+        for key, st in self.stats.items():
+            col = cols.get(key)
+            if col is None:
+                continue
+            if key not in self.first:
+                idx = np.flatnonzero(~np.isnan(col))
+                if idx.size:
+                    self.first[key] = float(col[idx[0]])
+            st.add_array(col, dt)
+
+    def flush(self) -> None:
+        """Fold the buffered records into the statistics (``result()`` does this itself)."""
+        rows, dts = self._chunk, self._dts
+        self._chunk, self._dts = [], []
+        if not rows:
+            return
+        dt_arr = np.array(dts, dtype=float) if np is not None else None
+        for key, st in self.stats.items():
+            if dt_arr is not None:
+                try:
+                    # None becomes NaN; a non-numeric value sends this column down the slow path
+                    col = np.array([r.get(key) for r in rows], dtype=float)
+                except (TypeError, ValueError):
+                    col = None
+                if col is not None:
+                    if key not in self.first:
+                        idx = np.flatnonzero(~np.isnan(col))
+                        if idx.size:
+                            self.first[key] = float(col[idx[0]])
+                    st.add_array(col, dt_arr)
+                    continue
+            for r, dt in zip(rows, dts):
+                v = r.get(key)
+                if v is not None and v.__class__ in (int, float):
+                    st.add(v, dt)
+                    if key not in self.first:
+                        self.first[key] = v
+
+    def duration_s(self) -> Optional[float]:
+        return (self._prev_t - self._t0).total_seconds() if (self._t0 and self._prev_t) else None
+
+    def result(self, events: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        self.flush()
+        if not self.count:
+            return {"count": 0}
+        agg = {key: st.summary() for key, st in self.stats.items()}
+
+        # Event counts: episodes from the monitor's events.jsonl (begin and one-off events, not
+        # ends); runs without one fall back to counting low-disk samples at the default thresholds
+        event_counts: Dict[str, int] = {}
+        if events is not None:
+            for ev in events:
+                if ev.get("state") != "end":
+                    event_counts[ev.get("event", "")] = event_counts.get(ev.get("event", ""), 0) + 1
+            low_disk_warn_count = event_counts.get("low_disk_warn", 0)
+            low_disk_crit_count = event_counts.get("low_disk_crit", 0)
         else:
-            agg[key] = {"min": None, "max": None, "avg": None}
+            low_disk_warn_count = self.low_disk["warn"]
+            low_disk_crit_count = self.low_disk["crit"]
+
+        # High-water mark for AltAnalyze RSS: sampled RSS of the tree, or the VmHWM of its largest
+        # process when that saw more. The summed VmHWM of all members is only an upper bound
+        # (they need not peak together) and is reported apart as alt_hwm_sum_mb
+        peaks = [v for v in (agg["alt_rss_mb"]["max"], agg["alt_proc_hwm_mb"]["max"]) if v is not None]
+        alt_hwm_rss_mb = max(peaks) if peaks else None
+        # Cgroup memory peak: the kernel's counter, else the highest sampled usage
+        cg_mem_peak_mb = agg["cg_mem_peak_mb"]["max"]
+        if cg_mem_peak_mb is None:
+            cg_mem_peak_mb = agg["cg_mem_current_mb"]["max"]
+
+        return {
+            **self.context,
+            "count": self.count,
+            "start_ts": self.first_ts,
+            "end_ts": self.last_ts,
+            "duration_s": self.duration_s(),
+            "metrics": agg,
+            "sizing": sizing(self, alt_hwm_rss_mb),
+            "events": {
+                "source": "events.jsonl" if events is not None else "samples",
+                "low_disk_warn_count": low_disk_warn_count,
+                "low_disk_crit_count": low_disk_crit_count,
+                "oom_kill_count": event_counts.get("oom_kill", 0) if events is not None else None,
+                "cpu_throttled_count": event_counts.get("cpu_throttled", 0) if events is not None else None,
+                "counts": event_counts,
+                "min_disk_free_gb": agg["disk_free_gb"]["min"],
+                "alt_hwm_rss_mb": alt_hwm_rss_mb,
+                "alt_hwm_sum_mb": agg["alt_hwm_sum_mb"]["max"],
+                "cg_mem_peak_mb": cg_mem_peak_mb,
+                "min_disk_full_eta_s": agg["disk_full_eta_s"]["min"],
+                "min_mem_oom_eta_s": agg["mem_oom_eta_s"]["min"],
+            },
+        }
+
 
-    # Low disk events
-    low_disk_warn = [r for r in records if isinstance(r.get("disk_free_gb"), (int, float)) and r["disk_free_gb"] <= 20]
-    low_disk_crit = [r for r in records if isinstance(r.get("disk_free_gb"), (int, float)) and r["disk_free_gb"] <= 5]
+def sizing(acc: StreamAggregator, alt_hwm_rss_mb: Optional[float]) -> Dict[str, Any]:
+    """CPU and memory the task actually used, for sizing its runtime attributes.
 
-    # High-water mark for AltAnalyze RSS
-    alt_hwm_rss_mb = agg["alt_rss_mb"]["max"]
+    Uses the cgroup fields (cores from cpu.stat usage, working set against memory.max) when
+    the samples have them; otherwise the AltAnalyze tree, since host load and host memory
+    include every other container on a shared VM. Average cores are time-weighted, so
+    core-seconds are the cores integrated over the run.
+    """
+    st = acc.stats
+    cgroup = bool(st["cg_cpu_cores"].n or st["cg_mem_working_set_mb"].n)
+    cpu, scale = (st["cg_cpu_cores"], 1.0) if cgroup else (st["alt_cpu"], 0.01)
+    core_s = cpu.tw_sum * scale
+    avg = core_s / cpu.tw_span if cpu.tw_span > 0 else None
+    p95 = cpu.quantile(95) * scale if cpu.n else None
+    limit = st["cg_cpu_limit_cores"].last
+    thr = st["cg_throttled_s"]
+    thr_pct = st["cg_throttled_pct"]
+    # Throttled for a tenth of the periods: usage is capped by the limit and understates demand
+    cpu_limited = bool(thr_pct.n) and thr_pct.mean >= 10.0
 
+    # Memory peak: the sampled working set, or the tree's RSS high-water mark (sampled, or the
+    # VmHWM of its largest process) when it caught a spike between samples. memory.peak is not
+    # used: it counts page cache the kernel would have reclaimed. The tree's summed VmHWM
+    # bounds the peak from above without feeding the recommendation
+    ws = st["cg_mem_working_set_mb"]
+    mem_limit = st["cg_mem_limit_mb"].last
+    peaks = [v for v in (ws.max, alt_hwm_rss_mb) if v is not None]
+    mem_peak = max(peaks) if peaks else None
+    uppers = [v for v in (mem_peak, st["alt_hwm_sum_mb"].max) if v is not None]
+
+    rec_cpu = max(1, math.ceil(p95 - 1e-9)) if p95 is not None else None
+    if rec_cpu is not None and cpu_limited and limit:
+        rec_cpu = max(rec_cpu, math.ceil(limit) + 1)
+    first_thr = acc.first.get("cg_throttled_s")
     return {
-        "task": task,
-        "shard": shard,
-        "attempt": attempt,
-        "count": len(records),
-        "start_ts": records[0].get("ts"),
-        "end_ts": records[-1].get("ts"),
-        "duration_s": duration_s,
-        "metrics": agg,
-        "events": {
-            "low_disk_warn_count": len(low_disk_warn),
-            "low_disk_crit_count": len(low_disk_crit),
-            "min_disk_free_gb": agg["disk_free_gb"]["min"],
-            "alt_hwm_rss_mb": alt_hwm_rss_mb,
-        },
+        "source": "cgroup" if cgroup else "alt_tree",
+        "cpu_core_s": round(core_s, 1),
+        "cpu_cores_avg": round(avg, 2) if avg is not None else None,
+        "cpu_cores_p95": round(p95, 2) if p95 is not None else None,
+        "cpu_cores_max": cpu.max * scale if cpu.n else None,
+        "cpu_limit_cores": limit,
+        "cpu_util_avg_pct": round(avg * 100.0 / limit, 1) if avg is not None and limit else None,
+        "cpu_throttled_s": round(thr.last - first_thr, 1) if thr.n > 1 and thr.last >= first_thr else None,
+        "cpu_throttled_pct_avg": round(thr_pct.mean, 1) if thr_pct.n else None,
+        "cpu_limited": cpu_limited,
+        "mem_working_set_max_mb": ws.max,
+        "mem_working_set_p95_mb": round(ws.quantile(95), 1) if ws.n else None,
+        "mem_peak_mb": mem_peak,
+        "mem_peak_upper_mb": max(uppers) if uppers else None,
+        "mem_limit_mb": mem_limit,
+        "mem_util_max_pct": round(ws.max * 100.0 / mem_limit, 1) if ws.n and mem_limit else None,
+        "recommended_cpu_cores": rec_cpu,
+        "recommended_mem_gb": math.ceil(mem_peak * MEM_HEADROOM / 1024) if mem_peak else None,
     }
 
 
+def aggregate(records: Iterable[Dict[str, Any]], events: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    acc = StreamAggregator()
+    for r in records:
+        acc.add(r)
+    return acc.result(events)
+
+
 def write_tsv(summary: Dict[str, Any], path: str) -> None:
     # Flatten key metrics into a small TSV row
     hdr = [
         "task","shard","attempt","count","duration_s",
-        "load1_avg","mem_used_mb_max","disk_free_gb_min","alt_rss_mb_max",
+        "load1_avg","mem_used_mb_max","disk_free_gb_min","alt_rss_mb_max","alt_hwm_rss_mb","cg_mem_peak_mb",
         "disk_read_mb_s_avg","disk_write_mb_s_avg","net_recv_mb_s_avg","net_sent_mb_s_avg",
-        "low_disk_warn_count","low_disk_crit_count",
+        "low_disk_warn_count","low_disk_crit_count","oom_kill_count","cpu_throttled_count",
+        "sizing_source","cpu_cores_avg","cpu_cores_p95","cpu_limit_cores","cpu_throttled_s",
+        "mem_working_set_max_mb","mem_peak_mb","mem_limit_mb","recommended_cpu_cores","recommended_mem_gb",
     ]
     m = summary.get("metrics", {})
     ev = summary.get("events", {})
+    sz = summary.get("sizing", {})
     row = [
         summary.get("task",""),
         summary.get("shard",""),
@@ -120,38 +740,480 @@ def write_tsv(summary: Dict[str, Any], path: str) -> None:
         str((m.get("mem_used_mb") or {}).get("max","")),
         str((m.get("disk_free_gb") or {}).get("min","")),
         str((m.get("alt_rss_mb") or {}).get("max","")),
+        str(ev.get("alt_hwm_rss_mb","")),
+        str(ev.get("cg_mem_peak_mb","")),
         str((m.get("disk_read_mb_s") or {}).get("avg","")),
         str((m.get("disk_write_mb_s") or {}).get("avg","")),
         str((m.get("net_recv_mb_s") or {}).get("avg","")),
         str((m.get("net_sent_mb_s") or {}).get("avg","")),
         str(ev.get("low_disk_warn_count","")),
         str(ev.get("low_disk_crit_count","")),
-    ]
+        str(ev.get("oom_kill_count","")),
+        str(ev.get("cpu_throttled_count","")),
+        str(sz.get("source","")),
+    ] + [str(sz.get(k,"")) for k in ("cpu_cores_avg","cpu_cores_p95","cpu_limit_cores","cpu_throttled_s",
+                                     "mem_working_set_max_mb","mem_peak_mb","mem_limit_mb",
+                                     "recommended_cpu_cores","recommended_mem_gb")]
     with open(path, "w") as f:
         f.write("\t".join(hdr)+"\n")
         f.write("\t".join(row)+"\n")
 
 
+def find_monitor_dirs(root: str) -> List[str]:
+    """Directories under ``root`` holding one monitored task: metadata.json plus samples or a checkpoint."""
+    out = []
+    for d, _, files in os.walk(root):
+        names = set(files)
+        if "metadata.json" in names and names & {"checkpoint.json", "usage.jsonl", "usage.bin"}:
+            out.append(d)
+    return sorted(out)
+
+
+def attempt_info(mon_dir: str, acc: Optional["StreamAggregator"] = None) -> Dict[str, Any]:
+    """One attempt's wall time, compute and bytes, from checkpoint.json or else from its samples
+    (``acc`` when the caller has already fed them)."""
+    meta = read_json(os.path.join(mon_dir, "metadata.json")) or {}
+    ckpt = read_json(os.path.join(mon_dir, "checkpoint.json"))
+    src = ckpt or meta
+    call, shard, attempt = src.get("task", ""), src.get("shard", ""), src.get("attempt", "")
+    if not call:
+        call, shard, attempt = task_context_from_path(os.path.abspath(mon_dir))
+    info: Dict[str, Any] = {
+        "dir": mon_dir, "task": call, "shard": shard,
+        # Cromwell runs the first attempt without an attempt-N directory
+        "attempt": int(attempt) if str(attempt).isdigit() else 1,
+        "status": None, "task_exit": None, "preempted": None, "start_ts": None, "end_ts": None, "wall_s": None,
+        "phase": None, "phases_reached": [], "cpu_core_s": None, "read_mb": None, "write_mb": None,
+    }
+    cores = meta.get("cpu_limit_cores") or meta.get("cpu_count")
+    if ckpt:
+        counters = ckpt.get("counters") or {}
+        info.update({
+            "status": ckpt.get("status"), "task_exit": ckpt.get("task_exit"), "preempted": ckpt.get("preempted"),
+            "start_ts": ckpt.get("start_ts"), "end_ts": ckpt.get("end_ts") or ckpt.get("ts"),
+            "wall_s": ckpt.get("wall_s"), "phase": ckpt.get("phase"),
+            "phases_reached": ckpt.get("phases_reached") or [],
+            "cpu_core_s": counters.get("cg_cpu_core_s") or counters.get("alt_cpu_core_s"),
+            "read_mb": counters.get("alt_read_mb") if counters.get("alt_read_mb") is not None else counters.get("cg_read_mb"),
+            "write_mb": counters.get("alt_write_mb") if counters.get("alt_write_mb") is not None else counters.get("cg_write_mb"),
+        })
+        # A checkpoint still saying "running" was never finalized: the VM went away without a SIGTERM
+        if info["status"] == "running":
+            info["status"] = "vanished"
+    else:
+        if acc is None:
+            acc = StreamAggregator(["alt_cpu", "alt_read_mb", "alt_write_mb"])
+            feed(acc, mon_dir)
+        acc.flush()
+        if acc.count:
+            st = acc.stats
+            wall_s = acc.duration_s()
+            info.update({
+                "status": "unknown", "start_ts": acc.first_ts, "end_ts": acc.last_ts,
+                "wall_s": round(wall_s, 1) if wall_s is not None else None,
+                "phase": acc.last_phase, "phases_reached": list(acc.phases),
+                "cpu_core_s": round(st["alt_cpu"].tw_sum / 100.0, 1),
+                "read_mb": st["alt_read_mb"].last, "write_mb": st["alt_write_mb"].last,
+            })
+    info["cores"] = cores
+    info["vcpu_s"] = round(info["wall_s"] * cores, 1) if info["wall_s"] is not None and cores else None
+    return info
+
+
+def end_reason(info: Dict[str, Any]) -> str:
+    """How an attempt ended: ``preempted``, ``finished`` or ``task_failed`` (stopped by the task,
+    with its exit status), else the checkpoint status (``terminated``, ``vanished``, ...)."""
+    if info["preempted"]:
+        return "preempted"
+    if info["status"] == "finished":
+        return "task_failed" if info.get("task_exit") else "finished"
+    return info["status"] or "unknown"
+
+
+def unexplained(info: Dict[str, Any]) -> bool:
+    """Ended without the task's own stop and without an answer from the metadata server: with
+    the WDL recording every normal stop, that is a preemption or a VM that went away."""
+    return info["preempted"] is None and info["status"] in ("terminated", "vanished")
+
+
+def stitch(root: str) -> Dict[str, Any]:
+    """Group attempts by (task, shard); every attempt before the last one was lost to a retry.
+
+    ``preempted_attempts`` counts the lost attempts that were preempted or ended unexplained.
+    """
+    groups: Dict[Any, List[Dict[str, Any]]] = {}
+    for d in find_monitor_dirs(root):
+        info = attempt_info(d)
+        groups.setdefault((info["task"], info["shard"]), []).append(info)
+    keys = ("wall_s", "vcpu_s", "cpu_core_s", "read_mb", "write_mb")
+    shards = []
+    totals: Dict[str, Any] = {"shards": 0, "attempts": 0, "lost_attempts": 0, "preempted_attempts": 0}
+    totals.update({f"total_{k}": 0.0 for k in keys})
+    totals.update({f"wasted_{k}": 0.0 for k in keys})
+    for (task, shard), attempts in sorted(groups.items()):
+        attempts.sort(key=lambda a: (a["attempt"], a["start_ts"] or ""))
+        lost = attempts[:-1]
+        for a in attempts:
+            a["lost"] = a is not attempts[-1]
+            a["reason"] = end_reason(a) if a["lost"] else None
+        row: Dict[str, Any] = {
+            "task": task, "shard": shard, "attempts": len(attempts), "lost_attempts": len(lost),
+            "preempted_attempts": sum(1 for a in lost if a["reason"] == "preempted" or unexplained(a)),
+            "final_status": attempts[-1]["status"],
+            "lost_at_phase": [a["phase"] for a in lost],
+        }
+        for k in keys:
+            row[f"total_{k}"] = round(sum((a[k] or 0.0 for a in attempts), 0.0), 1)
+            row[f"wasted_{k}"] = round(sum((a[k] or 0.0 for a in lost), 0.0), 1)
+            totals[f"total_{k}"] += row[f"total_{k}"]
+            totals[f"wasted_{k}"] += row[f"wasted_{k}"]
+        row["attempt_details"] = attempts
+        shards.append(row)
+        totals["shards"] += 1
+        totals["attempts"] += row["attempts"]
+        totals["lost_attempts"] += row["lost_attempts"]
+        totals["preempted_attempts"] += row["preempted_attempts"]
+    for k in keys:
+        totals[f"total_{k}"] = round(totals[f"total_{k}"], 1)
+        totals[f"wasted_{k}"] = round(totals[f"wasted_{k}"], 1)
+    totals["wasted_vcpu_fraction"] = (round(totals["wasted_vcpu_s"] / totals["total_vcpu_s"], 4)
+                                      if totals["total_vcpu_s"] else None)
+    return {"root": root, "totals": totals, "shards": shards}
+
+
+def write_attempts_tsv(result: Dict[str, Any], path: str) -> None:
+    hdr = ["task", "shard", "attempt", "lost", "reason", "status", "task_exit", "preempted", "phase",
+           "start_ts", "end_ts", "wall_s", "cores", "vcpu_s", "cpu_core_s", "read_mb", "write_mb", "dir"]
+    with open(path, "w") as f:
+        f.write("\t".join(hdr) + "\n")
+        for row in result["shards"]:
+            for a in row["attempt_details"]:
+                f.write("\t".join("" if a.get(k) is None else str(a.get(k)) for k in hdr) + "\n")
+
+# Fleet store: one row per monitored attempt, keyed by workflow, call, shard and attempt
+UUID_RE = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+RUN_COLUMNS = [
+    "count", "duration_s", "wall_s", "cores", "vcpu_s", "cpu_core_s", "read_mb", "write_mb",
+    "alt_hwm_rss_mb", "cg_mem_peak_mb", "min_disk_free_gb",
+    "low_disk_warn_count", "low_disk_crit_count", "oom_kill_count", "cpu_throttled_count",
+    "cpu_cores_avg", "cpu_cores_p95", "cpu_cores_max", "cpu_limit_cores", "cpu_throttled_s",
+    "mem_working_set_max_mb", "mem_peak_mb", "mem_limit_mb", "recommended_cpu_cores", "recommended_mem_gb",
+]
+STAT_COLUMNS = ["min", "max", "avg", "std", "p50", "p95", "p99", "tw_avg"]
+FLEET_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    dir TEXT NOT NULL UNIQUE,
+    signature TEXT NOT NULL,
+    ingested_ts TEXT,
+    label TEXT,
+    workflow TEXT,
+    workflow_id TEXT,
+    root_workflow_id TEXT,
+    call TEXT,
+    shard INTEGER,
+    attempt INTEGER,
+    sample TEXT,
+    status TEXT,
+    preempted INTEGER,
+    start_ts TEXT,
+    end_ts TEXT,
+    {", ".join(f"{c} REAL" for c in RUN_COLUMNS)},
+    summary TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_key ON runs (workflow_id, call, shard, attempt);
+CREATE INDEX IF NOT EXISTS runs_call ON runs (call, label);
+CREATE INDEX IF NOT EXISTS runs_label ON runs (label, call);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    metric TEXT NOT NULL,
+    n INTEGER,
+    {", ".join(f"{c} REAL" for c in STAT_COLUMNS)},
+    m2 REAL,
+    tw_sum REAL,
+    tw_span REAL,
+    sketch TEXT,
+    PRIMARY KEY (metric, run_id)
+);
+"""
+
+
+def workflow_from_path(path: str):
+    """(workflow name, workflow id, root workflow id) from a Cromwell execution path.
+
+    The workflow id is the one the call directory belongs to (a sub-workflow's own id when
+    nested), so it is unique together with call, shard and attempt.
+    """
+    parts = path.split(os.sep)
+    name = wf_id = root_id = ""
+    last = None
+    for i, p in enumerate(parts):
+        if UUID_RE.match(p):
+            root_id = root_id or p
+            last = i
+        elif p.startswith("call-") and last is not None:
+            wf_id = parts[last]
+            name = parts[last - 1] if last else ""
+    return name, wf_id, root_id
+
+
+def dir_signature(mon_dir: str) -> str:
+    """Total size and newest mtime of the files in a monitoring dir: changes while the task still runs."""
+    size = mtime = 0
+    with os.scandir(mon_dir) as it:
+        for e in it:
+            if e.is_file():
+                st = e.stat()
+                size += st.st_size
+                mtime = max(mtime, st.st_mtime_ns)
+    return f"{size}:{mtime}"
+
+
+def fleet_summary(mon_dir: str, source: str = "auto") -> Dict[str, Any]:
+    """Summary, attempt info and per-metric statistics of one monitoring dir (runs in a worker process)."""
+    acc = StreamAggregator()
+    feed(acc, mon_dir, source)
+    summary = acc.result(load_events(mon_dir))
+    info = attempt_info(mon_dir, acc)
+    try:
+        with open(os.path.join(mon_dir, "sample_name.txt")) as f:
+            sample = f.read().strip()
+    except Exception:
+        sample = ""
+    metrics = {}
+    for key, st in acc.stats.items():
+        if st.n:
+            metrics[key] = dict(summary["metrics"][key], n=st.n, m2=st.m2, tw_sum=st.tw_sum,
+                                tw_span=st.tw_span, sketch=st.sketch.to_dict())
+    summary.pop("metrics", None)
+    return {"summary": summary, "info": info, "sample": sample, "metrics": metrics}
+
+
+def open_fleet_db(path: str):
+    db = sqlite3.connect(path)
+    # WAL: queries can run while an ingest is still writing
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(FLEET_SCHEMA)
+    return db
+
+
+def store_run(db, mon_dir: str, signature: str, label: str, res: Dict[str, Any]) -> None:
+    """Replace the rows of ``mon_dir`` with a fresh fleet_summary() result."""
+    summary, info = res["summary"], res["info"]
+    ev, sz = summary.get("events", {}), summary.get("sizing", {})
+    name, wf_id, root_id = workflow_from_path(mon_dir)
+    vals: Dict[str, Any] = {}
+    for src in (ev, sz, info, summary):
+        for c in RUN_COLUMNS:
+            if vals.get(c) is None and src.get(c) is not None:
+                vals[c] = src[c]
+    shard = str(info.get("shard", ""))
+    row = {
+        "dir": mon_dir, "signature": signature, "ingested_ts": datetime.utcnow().isoformat() + "Z",
+        "label": label, "workflow": name, "workflow_id": wf_id, "root_workflow_id": root_id,
+        "call": info.get("task", ""), "shard": int(shard) if shard.isdigit() else None,
+        "attempt": info.get("attempt"), "sample": res.get("sample", ""), "status": info.get("status"),
+        "preempted": None if info.get("preempted") is None else int(bool(info["preempted"])),
+        "start_ts": info.get("start_ts") or summary.get("start_ts"),
+        "end_ts": info.get("end_ts") or summary.get("end_ts"),
+        **{c: vals.get(c) for c in RUN_COLUMNS},
+        "summary": json.dumps(summary),
+    }
+    old = db.execute("SELECT id FROM runs WHERE dir = ?", (mon_dir,)).fetchone()
+    if old:
+        db.execute("DELETE FROM metrics WHERE run_id = ?", old)
+        db.execute("DELETE FROM runs WHERE id = ?", old)
+    cur = db.execute(f"INSERT INTO runs ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                     list(row.values()))
+    cols = ["run_id", "metric", "n"] + STAT_COLUMNS + ["m2", "tw_sum", "tw_span", "sketch"]
+    db.executemany(f"INSERT INTO metrics ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                   [[cur.lastrowid, key, m["n"]] + [m.get(c) for c in STAT_COLUMNS] +
+                    [m["m2"], m["tw_sum"], m["tw_span"], json.dumps(m["sketch"])]
+                    for key, m in res["metrics"].items()])
+
+
+def fleet_ingest(root: str, db_path: str, jobs: int, label: str = "", source: str = "auto") -> Dict[str, int]:
+    """Aggregate every monitoring dir under ``root`` not yet in ``db_path`` (or changed since) in a
+    process pool, storing each result as it completes so an interrupted ingest keeps its progress."""
+    db = open_fleet_db(db_path)
+    known = dict(db.execute("SELECT dir, signature FROM runs"))
+    todo = []
+    stats = {"found": 0, "skipped": 0, "ingested": 0, "failed": 0}
+    # Absolute paths: the same tree is recognized whatever directory the ingest runs from
+    for d in find_monitor_dirs(os.path.abspath(root)):
+        stats["found"] += 1
+        try:
+            sig = dir_signature(d)
+        except OSError:
+            continue
+        if known.get(d) == sig:
+            stats["skipped"] += 1
+        else:
+            todo.append((d, sig))
+
+    def done(d: str, sig: str, res: Optional[Dict[str, Any]], err: Optional[BaseException]) -> None:
+        if err is not None:
+            stats["failed"] += 1
+            print(f"Skipping {d}: {err}")
+            return
+        store_run(db, d, sig, label, res)
+        stats["ingested"] += 1
+        if stats["ingested"] % 100 == 0:
+            db.commit()
+
+    try:
+        if jobs <= 1 or len(todo) <= 1:
+            for d, sig in todo:
+                try:
+                    res = fleet_summary(d, source)
+                except Exception as e:
+                    done(d, sig, None, e)
+                    continue
+                done(d, sig, res, None)
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                futures = {pool.submit(fleet_summary, d, source): (d, sig) for d, sig in todo}
+                for fut in as_completed(futures):
+                    d, sig = futures[fut]
+                    err = fut.exception()
+                    done(d, sig, None if err else fut.result(), err)
+    finally:
+        db.commit()
+        db.close()
+    return stats
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Linear-interpolated ``q`` percentile (0-100) of exact values."""
+    if not values:
+        return None
+    values = sorted(values)
+    pos = q / 100.0 * (len(values) - 1)
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+def fleet_query(db_path: str, what: str, call: Optional[str] = None, label: Optional[str] = None,
+                q: float = 95.0) -> Dict[str, Any]:
+    """Distribution of ``what`` over the stored attempts matching ``call`` (a GLOB) and ``label``.
+
+    ``what`` is a run column (e.g. ``mem_peak_mb``: one value per attempt), ``metric.stat``
+    (e.g. ``alt_rss_mb.max``: that statistic of each attempt's samples), or a bare sampled
+    metric (e.g. ``alt_rss_mb``: every sample of every attempt, from the merged sketches).
+    """
+    if not os.path.exists(db_path):
+        raise SystemExit(f"Not found: {db_path}")
+    db = sqlite3.connect(db_path)
+    where, params = [], []
+    if call:
+        where.append("r.call GLOB ?")
+        params.append(call)
+    if label:
+        where.append("r.label = ?")
+        params.append(label)
+    cond = (" AND " + " AND ".join(where)) if where else ""
+    metric, _, stat = what.partition(".")
+    out: Dict[str, Any] = {"query": what, "call": call, "label": label, "quantile": q}
+    try:
+        if what in RUN_COLUMNS:
+            rows = db.execute(f"SELECT r.{what} FROM runs r WHERE r.{what} IS NOT NULL{cond}", params)
+            values = [v for (v,) in rows]
+            out["over"] = "attempts"
+        elif stat:
+            if stat not in STAT_COLUMNS:
+                raise SystemExit(f"Unknown statistic {stat!r}; one of {', '.join(STAT_COLUMNS)}")
+            rows = db.execute(f"SELECT m.{stat} FROM metrics m JOIN runs r ON r.id = m.run_id "
+                              f"WHERE m.metric = ? AND m.{stat} IS NOT NULL{cond}", [metric] + params)
+            values = [v for (v,) in rows]
+            out["over"] = "attempts"
+        else:
+            rows = db.execute("SELECT m.n, m.min, m.max, m.avg, m.sketch FROM metrics m JOIN runs r "
+                              f"ON r.id = m.run_id WHERE m.metric = ?{cond}", [metric] + params).fetchall()
+            if not rows and metric not in FIELDS_NUMERIC:
+                raise SystemExit(f"Unknown field {what!r}: a run column ({', '.join(RUN_COLUMNS)}), "
+                                 "a sampled metric, or metric.stat")
+            sk = QuantileSketch()
+            n, total = 0, 0.0
+            lo = hi = None
+            for rn, rmin, rmax, ravg, rsk in rows:
+                sk.merge(QuantileSketch.from_dict(json.loads(rsk)))
+                n += rn
+                total += ravg * rn
+                lo = rmin if lo is None else min(lo, rmin)
+                hi = rmax if hi is None else max(hi, rmax)
+            out.update({"over": "samples", "attempts": len(rows), "n": n, "min": lo, "max": hi,
+                        "avg": total / n if n else None})
+
+            def quant(x):
+                v = sk.quantile(x)
+                return None if v is None else min(max(v, lo), hi)
+            out.update({f"p{x}": quant(x) for x in QUANTILES})
+            out["value"] = quant(q)
+            return out
+    finally:
+        db.close()
+    out.update({"attempts": len(values), "n": len(values),
+                "min": min(values) if values else None, "max": max(values) if values else None,
+                "avg": sum(values) / len(values) if values else None})
+    out.update({f"p{x}": percentile(values, x) for x in QUANTILES})
+    out["value"] = percentile(values, q)
+    return out
+
+
 def main() -> None:
     args = parse_args()
     mon_dir = args.monitor_dir
+    if args.query:
+        result = fleet_query(mon_dir, args.query, args.call, args.label or None, args.quantile)
+        print(json.dumps(result, indent=2))
+        return
+    if args.fleet:
+        db_path = args.db or os.path.join(mon_dir, "fleet.sqlite")
+        t = fleet_ingest(mon_dir, db_path, args.jobs, args.label, args.source)
+        print(f"{t['found']} monitoring dirs: {t['ingested']} ingested, {t['skipped']} unchanged, "
+              f"{t['failed']} failed")
+        print(f"Wrote {db_path}")
+        return
+    if args.stitch:
+        result = stitch(mon_dir)
+        out_json = args.out_json or os.path.join(mon_dir, "attempts.json")
+        out_tsv = args.out_tsv or os.path.join(mon_dir, "attempts.tsv")
+        with open(out_json, "w") as f:
+            json.dump(result, f, indent=2)
+        write_attempts_tsv(result, out_tsv)
+        t = result["totals"]
+        print(f"{t['attempts']} attempts of {t['shards']} shards, {t['lost_attempts']} lost: "
+              f"{t['wasted_vcpu_s']} of {t['total_vcpu_s']} vCPU-seconds wasted")
+        print(f"Wrote {out_json} and {out_tsv}")
+        return
     jsonl_path = os.path.join(mon_dir, "usage.jsonl")
     meta_path = os.path.join(mon_dir, "metadata.json")
-    if not os.path.exists(jsonl_path):
+    if not usage_segments(mon_dir) and not os.path.exists(os.path.join(mon_dir, "usage.bin")):
         raise SystemExit(f"Not found: {jsonl_path}")
 
-    records: List[Dict[str, Any]] = []
-    with open(jsonl_path, "r") as f:
-        for line in f:
-            try:
-                obj = json.loads(line)
-                records.append(obj)
-            except Exception:
-                continue
-    if not records:
-        raise SystemExit("No records parsed from usage.jsonl")
+    acc = StreamAggregator()
+    feed(acc, mon_dir, args.source)
+    if not acc.count:
+        raise SystemExit("No records parsed from usage.bin/usage.jsonl")
 
-    summary = aggregate(records)
+    summary = acc.result(load_events(mon_dir))
+    phases = load_phases(mon_dir)
+    if phases:
+        summary["phases"] = phases
+    history = read_json(os.path.join(mon_dir, "proc_history.json"))
+    if history:
+        # The series stay in proc_history.json; the summary names who held CPU and memory
+        summary["top_processes"] = [{k: v for k, v in p.items() if k != "series"}
+                                    for p in history.get("processes", [])]
+    flight_dir = os.path.join(mon_dir, "flight")
+    if os.path.isdir(flight_dir):
+        summary["flight_dumps"] = sorted(n for n in os.listdir(flight_dir) if n.endswith(".jsonl"))
+    ckpt = read_json(os.path.join(mon_dir, "checkpoint.json"))
+    if ckpt:
+        summary["checkpoint"] = {k: ckpt.get(k) for k in ("status", "task_exit", "preempted", "end_ts", "wall_s", "phase",
+                                                           "phases_reached", "counters", "peaks")}
 
     out_json = args.out_json or os.path.join(mon_dir, "summary.metrics.json")
     with open(out_json, "w") as f:
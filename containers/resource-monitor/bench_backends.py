@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from statistics import mean
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import monitor  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Compare per-tick CPU time and RSS of the monitor's collector backends.")
+    p.add_argument("--backends", default="psutil,proc", help="Comma-separated backends to compare (default: psutil,proc)")
+    p.add_argument("--ticks", type=int, default=50, help="Ticks to time per backend (default: 50)")
+    p.add_argument("--interval", type=float, default=0.2, help="Seconds to sleep between ticks (default: 0.2)")
+    p.add_argument("--json", action="store_true", help="Print raw results as JSON instead of a table")
+    p.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    return p.parse_args()
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except Exception:
+        pass
+    import resource
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def pct(vals: List[float], q: float) -> float:
+    s = sorted(vals)
+    return s[min(len(s) - 1, int(q * len(s)))]
+
+
+def one_tick(backend, alt_tree) -> None:
+    # Mirrors the collection part of a monitor tick, without writing outputs
+    monitor.sample_system(backend)
+    backend.disk_io()
+    backend.net_io()
+    rows = backend.table.scan()
+    alt_tree.collect(rows, backend.table)
+    monitor.format_top(rows, "bench")
+
+
+def run_child(name: str, ticks: int, interval: float) -> Dict[str, Any]:
+    rss_start = rss_mb()
+    backend = monitor.make_backend(name)
+    if backend is None or backend.name != name:
+        return {"backend": name, "error": "unavailable"}
+    alt_tree = monitor.AltTree()
+    backend.percpu_percent()
+    backend.table.scan()
+    cpu_ms: List[float] = []
+    wall_ms: List[float] = []
+    for _ in range(ticks):
+        time.sleep(interval)
+        c0, w0 = time.process_time(), time.perf_counter()
+        one_tick(backend, alt_tree)
+        cpu_ms.append((time.process_time() - c0) * 1000)
+        wall_ms.append((time.perf_counter() - w0) * 1000)
+    return {
+        "backend": name,
+        "ticks": ticks,
+        "procs": len(backend.table.scan()),
+        "cpu_ms_avg": round(mean(cpu_ms), 2),
+        "cpu_ms_p95": round(pct(cpu_ms, 0.95), 2),
+        "wall_ms_avg": round(mean(wall_ms), 2),
+        "rss_mb": rss_mb(),
+        "rss_mb_delta": round(rss_mb() - rss_start, 1),
+        # share of one core at the default and fastest recommended intervals
+        "core_pct_at_15s": round(mean(cpu_ms) / 15000 * 100, 4),
+        "core_pct_at_1s": round(mean(cpu_ms) / 1000 * 100, 4),
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    if args.child:
+        print(json.dumps(run_child(args.child, args.ticks, args.interval)))
+        return
+
+    results = []
+    for name in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        # Separate interpreter per backend so RSS is not shared between them
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", name,
+             "--ticks", str(args.ticks), "--interval", str(args.interval)],
+            capture_output=True, text=True,
+        )
+        try:
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+        except Exception:
+            results.append({"backend": name, "error": proc.stderr.strip() or "no output"})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    cols = ["backend", "ticks", "procs", "cpu_ms_avg", "cpu_ms_p95", "wall_ms_avg", "rss_mb", "rss_mb_delta", "core_pct_at_15s", "core_pct_at_1s"]
+    print("\t".join(cols))
+    for r in results:
+        if "error" in r:
+            print(f"{r['backend']}\terror: {r['error']}")
+        else:
+            print("\t".join(str(r.get(c, "")) for c in cols))
+
+
+if __name__ == "__main__":
+    main()
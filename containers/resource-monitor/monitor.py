@@ -1,10 +1,20 @@
 #!/usr/bin/env python3
+import gzip
+import heapq
+from collections import deque
 import json
 import os
+import re
+import shutil
+import signal
+import subprocess
 import sys
 import time
 import socket
+import threading
+import urllib.request
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 # Optional psutil for richer metrics
 try:
@@ -12,6 +22,12 @@ try:
 except Exception:
     psutil = None
 
+# Optional binary sample store (samplestore.py next to this script)
+try:
+    from samplestore import SampleStore  # type: ignore
+except Exception:
+    SampleStore = None
+
 MON_DIR = os.environ.get("MON_DIR", "/cromwell_root/monitoring")
 INTERVAL = int(os.environ.get("MONITOR_INTERVAL_SECONDS", "15"))
 HEAVY_INTERVAL = int(os.environ.get("MONITOR_HEAVY_INTERVAL_SECONDS", "60"))
@@ -23,16 +39,100 @@ MAX_SAMPLES = int(os.environ.get("MON_MAX_SAMPLES", "0"))
 INCLUDE_PERCPU = int(os.environ.get("MON_INCLUDE_PERCPU", "1"))
 INCLUDE_IO = int(os.environ.get("MON_INCLUDE_IO", "1"))
 EXPORT_PROM = int(os.environ.get("MON_EXPORT_PROM", "0"))
+# In-process HTTP exporter serving the same metrics from memory (0 = off); localhost by default
+HTTP_PORT = int(os.environ.get("MON_HTTP_PORT", "0"))
+HTTP_ADDR = os.environ.get("MON_HTTP_ADDR", "127.0.0.1")
+# PSS of the AltAnalyze tree needs /proc/<pid>/smaps_rollup reads; set to 0 to skip
+INCLUDE_PSS = int(os.environ.get("MON_ALT_PSS", "1"))
+# Opt-in: restart the tree's VmHWM at phase changes by writing 5 to /proc/<pid>/clear_refs of
+# the monitored processes; off by default, the monitor otherwise only reads their state
+RESET_HWM = int(os.environ.get("MON_RESET_HWM", "0"))
+# Output buffering and rotation
+FLUSH_SECONDS = float(os.environ.get("MON_FLUSH_SECONDS", "60"))
+FLUSH_RECORDS = int(os.environ.get("MON_FLUSH_RECORDS", "0"))
+FSYNC = int(os.environ.get("MON_FSYNC", "1"))
+ROTATE_MB = float(os.environ.get("MON_ROTATE_MB", "64"))
+ROTATE_SECONDS = int(os.environ.get("MON_ROTATE_SECONDS", "0"))
+# Binary usage.bin store; text logs can be turned off and regenerated with samplestore.py
+BIN_ENABLED = int(os.environ.get("MON_BIN", "1"))
+BIN_CAPACITY = int(os.environ.get("MON_BIN_CAPACITY", str(1 << 20)))
+TEXT_LOGS = int(os.environ.get("MON_TEXT_LOGS", "1")) or not (BIN_ENABLED and SampleStore is not None)
+# Incremental largest-files scan (heavy ticks)
+SCAN_BUDGET_MS = int(os.environ.get("MON_SCAN_BUDGET_MS", "200"))
+SCAN_TOP_N = int(os.environ.get("MON_SCAN_TOP_N", "50"))
+SCAN_TRACK_MB = float(os.environ.get("MON_SCAN_TRACK_MB", "1"))
+SCAN_MAX_TRACKED = int(os.environ.get("MON_SCAN_MAX_TRACKED", "50000"))
+# Exhaustion forecasting: trend window, and how close an ETA must be to speed up sampling
+FORECAST_WINDOW_SECONDS = int(os.environ.get("MON_FORECAST_WINDOW_SECONDS", "600"))
+FORECAST_HORIZON_SECONDS = int(os.environ.get("MON_FORECAST_HORIZON_SECONDS", "1800"))
+MIN_INTERVAL = float(os.environ.get("MON_MIN_INTERVAL_SECONDS", "2"))
+# Adaptive sampling: dense around phase changes, memory pressure and IO spikes, sparse when idle,
+# never more than MON_MAX_SAMPLES_PER_HOUR ticks or MON_MAX_CPU_SECONDS_PER_HOUR of monitor CPU
+DENSE_INTERVAL = float(os.environ.get("MON_DENSE_INTERVAL_SECONDS", "5"))
+DENSE_HOLD_SECONDS = float(os.environ.get("MON_DENSE_HOLD_SECONDS", "60"))
+IDLE_INTERVAL = float(os.environ.get("MON_IDLE_INTERVAL_SECONDS", "60"))
+IDLE_AFTER_SECONDS = float(os.environ.get("MON_IDLE_AFTER_SECONDS", "120"))
+MEM_NEAR_FRACTION = float(os.environ.get("MON_MEM_NEAR_FRACTION", "0.9"))
+IO_SPIKE_FACTOR = float(os.environ.get("MON_IO_SPIKE_FACTOR", "3"))
+IO_SPIKE_MIN_MB_S = float(os.environ.get("MON_IO_SPIKE_MIN_MB_S", "10"))
+MAX_SAMPLES_PER_HOUR = int(os.environ.get("MON_MAX_SAMPLES_PER_HOUR", "1200"))
+# Overhead budget for the monitor itself, in percent of one core (0 = never degrade)
+CPU_BUDGET_PCT = float(os.environ.get("MON_CPU_BUDGET_PCT", "1"))
+BUDGET_WINDOW_SECONDS = float(os.environ.get("MON_BUDGET_WINDOW_SECONDS", "300"))
+MAX_CPU_SECONDS_PER_HOUR = float(os.environ.get("MON_MAX_CPU_SECONDS_PER_HOUR", str(CPU_BUDGET_PCT * 36)))
+# Input read progress from /proc/<pid>/fdinfo offsets of the AltAnalyze tree (Linux)
+PROGRESS_ENABLED = int(os.environ.get("MON_PROGRESS", "1"))
+PROGRESS_SUFFIXES = tuple(x.strip() for x in os.environ.get("MON_PROGRESS_SUFFIXES", ".bam,.bed").split(",") if x.strip())
+PROGRESS_STALL_SECONDS = float(os.environ.get("MON_PROGRESS_STALL_SECONDS", "600"))
+# events.jsonl: thresholds clear only once back past them by this fraction; throttling ends
+# after this many samples without new throttled periods
+EVENT_HYSTERESIS = float(os.environ.get("MON_EVENT_HYSTERESIS", "0.1"))
+EVENT_CLEAR_SAMPLES = int(os.environ.get("MON_EVENT_CLEAR_SAMPLES", "3"))
+# Python stack sampling of the AltAnalyze tree with py-spy, on the heavy cadence (off by default)
+STACKS_ENABLED = int(os.environ.get("MON_STACKS", "0"))
+STACKS_PYSPY = os.environ.get("MON_STACKS_PYSPY", "py-spy")
+STACKS_SECONDS = float(os.environ.get("MON_STACKS_SECONDS", "2"))
+STACKS_RATE = int(os.environ.get("MON_STACKS_RATE", "20"))
+STACKS_MAX_PROCS = int(os.environ.get("MON_STACKS_MAX_PROCS", "2"))
+# checkpoint.json cadence; on SIGTERM the GCE metadata server is asked whether the VM was preempted
+CHECKPOINT_SECONDS = float(os.environ.get("MON_CHECKPOINT_SECONDS", "60"))
+PREEMPT_URL = os.environ.get("MON_PREEMPT_URL", "http://169.254.169.254/computeMetadata/v1/instance/preempted")
+# Host mode: one monitor samples every task container on the VM, one series per task
+HOST_MODE = int(os.environ.get("MON_HOST", "0"))
+HOST_CGROUP_RE = os.environ.get("MON_HOST_CGROUP_RE", r"^(?:docker-|cri-containerd-|crio-|libpod-)?([0-9a-f]{64})(?:\.scope)?$")
+HOST_RESCAN_SECONDS = float(os.environ.get("MON_HOST_RESCAN_SECONDS", "30"))
+HOST_KEEP_EXITED = int(os.environ.get("MON_HOST_KEEP_EXITED", "1000"))
+# Collectors run on their own threads; per-tick ones are waited for at most this long
+COLLECTOR_TIMEOUT = float(os.environ.get("MON_COLLECTOR_TIMEOUT_SECONDS", "2"))
+TOP_INTERVAL = float(os.environ.get("MON_TOP_INTERVAL_SECONDS", "60"))
+# Flight recorder: 1 s ring buffer dumped to flight/ on an unexpected SIGTERM, oom_kill, a failed task or SIGUSR1
+FLIGHT_ENABLED = int(os.environ.get("MON_FLIGHT", "1"))
+FLIGHT_SECONDS = float(os.environ.get("MON_FLIGHT_SECONDS", "300"))
+FLIGHT_MAX_DUMPS = int(os.environ.get("MON_FLIGHT_MAX_DUMPS", "5"))
+# proc_history.json: series of the top-K processes per tick and of the run, each capped at HISTORY_POINTS
+HISTORY_TOP_K = int(os.environ.get("MON_HISTORY_TOP_K", "10"))
+HISTORY_POINTS = int(os.environ.get("MON_HISTORY_POINTS", "240"))
+# Collector backend: auto (native /proc on Linux, psutil elsewhere), proc, or psutil
+BACKEND = os.environ.get("MON_BACKEND", "auto")
 
-os.makedirs(MON_DIR, exist_ok=True)
 OUT_TSV = os.path.join(MON_DIR, "usage.tsv")
 OUT_JSONL = os.path.join(MON_DIR, "usage.jsonl")
+OUT_BIN = os.path.join(MON_DIR, "usage.bin")
 OUT_PROM = os.path.join(MON_DIR, "metrics.prom")
 TOP_TXT = os.path.join(MON_DIR, "top.txt")
+PROGRESS_TSV = os.path.join(MON_DIR, "progress.tsv")
 LARGEST_TXT = os.path.join(MON_DIR, "largest.txt")
 SUMMARY_TXT = os.path.join(MON_DIR, "summary.txt")
+PHASES_TSV = os.path.join(MON_DIR, "phases.tsv")
+STACKS_DIR = os.path.join(MON_DIR, "stacks")
+FLIGHT_DIR = os.path.join(MON_DIR, "flight")
+CHECKPOINT_JSON = os.path.join(MON_DIR, "checkpoint.json")
+PROC_HISTORY_JSON = os.path.join(MON_DIR, "proc_history.json")
+EVENTS_JSONL = os.path.join(MON_DIR, "events.jsonl")
 SAMPLE_NAME_FILE = os.path.join(MON_DIR, "sample_name.txt")
 META_JSON = os.path.join(MON_DIR, "metadata.json")
+# Written by the WDL's exit trap (the task's exit status) right before it stops the monitor
+STOP_FILE = os.path.join(MON_DIR, "stop")
 
 START_TIME = time.time()
 
@@ -43,80 +143,2633 @@ if not os.path.ismount(CR_ROOT):
     else:
         CR_ROOT = os.getcwd()
 
+# cgroup filesystem: the v2 unified hierarchy, or one directory per v1 controller
+CGROUP_ROOT = "/sys/fs/cgroup"
 
-def write_summary():
-    try:
-        with open(OUT_TSV, "r") as f:
-            lines = f.readlines()
-        latest = lines[-1].strip() if lines else ""
-    except Exception:
-        latest = ""
+TSV_HEADER = "\t".join([
+    "timestamp","load1","mem_used_mb","mem_free_mb",
+    "disk_used_gb","disk_free_gb","disk_used_gb_root","disk_free_gb_root",
+    "disk_used_gb_pwd","disk_free_gb_pwd"
+])
+
+# usage.bin schema: (field, struct code). d=float64, f=float32, i=int32; missing values are stored as null
+BIN_COLUMNS = [
+    ("t", "d"),
+    ("load1", "f"), ("mem_used_mb", "i"), ("mem_free_mb", "i"),
+    ("disk_used_gb", "f"), ("disk_free_gb", "f"),
+    ("disk_used_gb_root", "f"), ("disk_free_gb_root", "f"),
+    ("disk_used_gb_pwd", "f"), ("disk_free_gb_pwd", "f"),
+    ("alt_pid", "i"), ("alt_cpu", "f"), ("alt_pmem", "f"),
+    ("alt_rss_mb", "f"), ("alt_vsz_mb", "f"), ("alt_pss_mb", "f"),
+    ("alt_read_mb", "d"), ("alt_write_mb", "d"), ("alt_workers", "i"),
+    ("alt_hwm_sum_mb", "f"), ("alt_proc_hwm_mb", "f"), ("cg_mem_peak_mb", "f"),
+    ("cg_mem_current_mb", "f"), ("cg_mem_anon_mb", "f"), ("cg_mem_file_mb", "f"),
+    ("cg_mem_dirty_mb", "f"), ("cg_mem_writeback_mb", "f"),
+    ("psi_cpu_some", "f"), ("psi_cpu_full", "f"), ("psi_mem_some", "f"), ("psi_mem_full", "f"),
+    ("psi_io_some", "f"), ("psi_io_full", "f"),
+    ("disk_full_eta_s", "f"), ("mem_oom_eta_s", "f"), ("interval_s", "f"), ("phase", "i"),
+    ("tick_ms", "f"), ("procs_ms", "f"), ("df_ms", "f"), ("heavy_ms", "f"), ("stale", "i"),
+    ("mon_cpu_pct", "f"), ("mon_rss_mb", "f"), ("mon_level", "i"),
+    ("progress_pct", "f"), ("progress_mb_s", "f"), ("progress_eta_s", "f"), ("progress_stalled_s", "f"),
+    ("progress_inputs", "i"),
+    ("disk_iops", "f"), ("disk_await_ms", "f"), ("disk_queue", "f"), ("disk_util_pct", "f"),
+    ("disk_iops_root", "f"), ("disk_await_ms_root", "f"), ("disk_queue_root", "f"), ("disk_util_pct_root", "f"),
+    ("disk_iops_pwd", "f"), ("disk_await_ms_pwd", "f"), ("disk_queue_pwd", "f"), ("disk_util_pct_pwd", "f"),
+    ("disk_read_mb_s", "f"), ("disk_write_mb_s", "f"), ("net_recv_mb_s", "f"), ("net_sent_mb_s", "f"),
+    ("cg_oom", "i"), ("cg_oom_kill", "i"), ("cg_nr_throttled", "i"), ("cg_throttled_s", "f"),
+    ("cg_cpu_pct", "f"), ("cg_read_mb", "d"), ("cg_write_mb", "d"),
+    ("cg_cpu_cores", "f"), ("cg_cpu_limit_cores", "f"), ("cg_cpu_util_pct", "f"), ("cg_throttled_pct", "f"),
+    ("cg_mem_working_set_mb", "f"), ("cg_mem_limit_mb", "f"), ("cg_mem_util_pct", "f"),
+]
+# Static per-task fields kept once in the usage.bin header instead of in every record
+BIN_CONTEXT = ["task", "shard", "attempt", "cwd", "sample"]
+# Per-device IO of the disks behind the three df paths; suffixes follow disk_used_gb{,_root,_pwd}
+DEVICE_MOUNTS = [("", None), ("_root", "/"), ("_pwd", ".")]
+DEVICE_FIELDS = ["disk_iops", "disk_await_ms", "disk_queue", "disk_util_pct"]
+# Fields that usage.jsonl omits when unavailable
+BIN_OPTIONAL = ["percpu_percent", "disk_read_mb_s", "disk_write_mb_s", "net_recv_mb_s", "net_sent_mb_s"] + \
+    [f + sfx for sfx, _ in DEVICE_MOUNTS for f in DEVICE_FIELDS]
+
+
+def write_summary(latest: str = ""):
+    if not latest:
+        try:
+            with open(OUT_TSV, "r") as f:
+                lines = f.readlines()
+            latest = lines[-1].strip() if lines else ""
+        except Exception:
+            latest = ""
     try:
         with open(LARGEST_TXT, "r") as f:
             topdisk = "".join(f.readlines()[:50])
     except Exception:
         topdisk = ""
+    try:
+        with open(PHASES_TSV, "r") as f:
+            phases = f.read()
+    except Exception:
+        phases = ""
     with open(SUMMARY_TXT, "w") as f:
         print(f"Monitoring summary at {datetime.utcnow().isoformat()}Z", file=f)
         print("Latest usage line:", file=f)
         print(latest, file=f)
+        if phases:
+            print("Pipeline phases:", file=f)
+            f.write(phases)
         print("Top disk users (last sample):", file=f)
         f.write(topdisk)
 
 
-def detect_task_context():
-    cwd = os.getcwd()
+def write_atomic(path: str, text: str, sync: bool = False) -> None:
+    # Write to a temp file and rename so readers never see a half-written snapshot
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class LineLog:
+    """Append-only log that keeps its handle open and writes buffered lines in batches.
+
+    When ``rotate_bytes`` or ``rotate_secs`` is set, the live file is rolled to
+    ``<path>.<seq>.gz`` once it passes the size or age limit, and a fresh file
+    (with ``header`` repeated, if any) is started.
+    """
+
+    def __init__(self, path: str, header: str = "", rotate_bytes: int = 0, rotate_secs: int = 0):
+        self.path = path
+        self.header = header
+        self.rotate_bytes = rotate_bytes
+        self.rotate_secs = rotate_secs
+        self.last_line = ""
+        self._buf = []
+        self._fh = None
+        self._opened_at = 0.0
+        self._seq = None
+        self._compress_leftovers()
+        self._open()
+
+    def _open(self) -> None:
+        fresh = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._fh = open(self.path, "a")
+        if fresh and self.header:
+            self._fh.write(self.header + "\n")
+            self._fh.flush()
+        self._opened_at = time.time()
+
+    def _segments(self):
+        # Existing rolled segments as (seq, filename), compressed or not
+        d = os.path.dirname(self.path) or "."
+        prefix = os.path.basename(self.path) + "."
+        out = []
+        for fn in os.listdir(d):
+            if not fn.startswith(prefix):
+                continue
+            seq = fn[len(prefix):]
+            if seq.endswith(".gz"):
+                seq = seq[:-3]
+            if seq.isdigit():
+                out.append((int(seq), os.path.join(d, fn)))
+        return sorted(out)
+
+    def _compress(self, path: str) -> None:
+        tmp = f"{path}.gz.tmp"
+        with open(path, "rb") as src, gzip.open(tmp, "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp, f"{path}.gz")
+        os.remove(path)
+
+    def _compress_leftovers(self) -> None:
+        # A previous run may have been killed between rename and gzip
+        try:
+            for _, p in self._segments():
+                if not p.endswith(".gz"):
+                    self._compress(p)
+        except Exception:
+            pass
+
+    def append(self, line: str) -> None:
+        self._buf.append(line + "\n")
+        self.last_line = line
+
+    def pending(self) -> int:
+        return len(self._buf)
+
+    def flush(self, sync: bool = False) -> None:
+        if self._fh is None:
+            return
+        if self._buf:
+            self._fh.write("".join(self._buf))
+            self._buf = []
+        self._fh.flush()
+        if sync:
+            try:
+                os.fsync(self._fh.fileno())
+            except OSError:
+                pass
+        self._maybe_rotate()
+
+    def _maybe_rotate(self) -> None:
+        size = self._fh.tell()
+        if size <= len(self.header) + 1:
+            return
+        too_big = self.rotate_bytes > 0 and size >= self.rotate_bytes
+        too_old = self.rotate_secs > 0 and time.time() - self._opened_at >= self.rotate_secs
+        if not (too_big or too_old):
+            return
+        try:
+            if self._seq is None:
+                segs = self._segments()
+                self._seq = segs[-1][0] if segs else 0
+            self._seq += 1
+            self._fh.close()
+            rolled = f"{self.path}.{self._seq}"
+            os.replace(self.path, rolled)
+            self._open()
+            self._compress(rolled)
+        except Exception as e:
+            print(f"rotation of {self.path} failed: {e}", file=sys.stderr)
+            if self._fh is None or self._fh.closed:
+                self._open()
+
+    def close(self) -> None:
+        try:
+            self.flush(sync=True)
+        finally:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+class SnapshotFile:
+    """Latest-value file (metrics.prom, top.txt) rewritten atomically, only when changed."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._text = None
+        self._dirty = False
+
+    def set(self, text: str) -> None:
+        self._text = text
+        self._dirty = True
+
+    def flush(self) -> None:
+        if self._dirty and self._text is not None:
+            write_atomic(self.path, self._text)
+            self._dirty = False
+
+
+class Outputs:
+    """All per-tick outputs of the monitor, flushed together on a shared cadence.
+
+    Records are buffered in memory and written every ``FLUSH_SECONDS`` (or every
+    ``FLUSH_RECORDS`` records, when set); ``close()`` flushes and fsyncs everything,
+    so a SIGTERM only loses what the final flush could not write. The snapshot files
+    (metrics.prom, top.txt, progress.tsv) are rewritten on the tick they change. The binary
+    ``usage.bin`` store (when enabled) receives every record immediately through
+    its memory mapping and is synced on the same cadence.
+    """
+
+    def __init__(self):
+        rotate_bytes = int(ROTATE_MB * 1024 * 1024)
+        self.logs = []
+        self.tsv = self.jsonl = None
+        if TEXT_LOGS:
+            self.tsv = LineLog(OUT_TSV, header=TSV_HEADER, rotate_bytes=rotate_bytes, rotate_secs=ROTATE_SECONDS)
+            self.jsonl = LineLog(OUT_JSONL, rotate_bytes=rotate_bytes, rotate_secs=ROTATE_SECONDS)
+            self.logs = [self.tsv, self.jsonl]
+        # Rare and most useful right before a task dies: never rotated, flushed as written
+        self.events = LineLog(EVENTS_JSONL)
+        self.logs.append(self.events)
+        self.store = None
+        self._store_ok = bool(BIN_ENABLED and SampleStore is not None)
+        self.prom = SnapshotFile(OUT_PROM)
+        self.top = SnapshotFile(TOP_TXT)
+        self.progress = SnapshotFile(PROGRESS_TSV)
+        self.last_tsv_line = ""
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def _open_store(self, record) -> None:
+        columns = list(BIN_COLUMNS)
+        # One column per CPU, fixed for the life of the file
+        for idx in range(len(record.get("percpu_percent") or [])):
+            columns.append((f"percpu_percent.{idx}", "f"))
+        context = {k: record.get(k) for k in BIN_CONTEXT}
+        context["start_epoch"] = START_TIME
+        self.store = SampleStore(
+            OUT_BIN, columns, context, capacity=BIN_CAPACITY,
+            optional=BIN_OPTIONAL, jsonl_order=list(record), tsv_columns=TSV_HEADER.split("\t")[1:],
+            enums={"phase": PHASE_NAMES},
+        )
+
+    def write(self, t: float, tsv_row, record) -> None:
+        """Record one sample in every enabled sink."""
+        self.last_tsv_line = "\t".join(map(str, tsv_row))
+        self._pending += 1
+        if self.tsv is not None:
+            self.tsv.append(self.last_tsv_line)
+            self.jsonl.append(json.dumps(record))
+        if self._store_ok:
+            try:
+                if self.store is None:
+                    self._open_store(record)
+                self.store.set_context(sample=record.get("sample"))
+                self.store.append({**record, "t": t})
+            except Exception as e:
+                print(f"usage.bin write failed, disabling it: {e}", file=sys.stderr)
+                self._store_ok = False
+                self._close_store()
+
+    def _close_store(self) -> None:
+        store, self.store = self.store, None
+        try:
+            if store is not None:
+                store.close()
+        except Exception:
+            pass
+
+    def due(self) -> bool:
+        if FLUSH_RECORDS > 0 and self._pending >= FLUSH_RECORDS:
+            return True
+        return time.monotonic() - self._last_flush >= FLUSH_SECONDS
+
+    def flush(self, sync: bool = False) -> None:
+        for log in self.logs:
+            try:
+                log.flush(sync=sync)
+            except Exception as e:
+                print(f"flush of {log.path} failed: {e}", file=sys.stderr)
+        if self.store is not None:
+            try:
+                self.store.flush()
+            except Exception:
+                pass
+        self.flush_snapshots()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def flush_snapshots(self) -> None:
+        for snap in (self.prom, self.top, self.progress):
+            try:
+                snap.flush()
+            except Exception:
+                pass
+
+    def maybe_flush(self) -> None:
+        """Flush the logs when due; the snapshot files every tick, since scrapers read the latest value."""
+        if self.due():
+            self.flush(sync=bool(FSYNC))
+        else:
+            self.flush_snapshots()
+
+    def close(self) -> None:
+        self.flush(sync=True)
+        for log in self.logs:
+            try:
+                log.close()
+            except Exception:
+                pass
+        self._close_store()
+
+
+class ProcessTable:
+    """Long-lived psutil.Process objects keyed by pid and create time.
+
+    Each ``scan()`` adds only new pids and drops exited (or reused) ones. Because the
+    same Process object is asked again every tick, ``cpu_percent`` covers the time
+    since the previous scan instead of being 0.0 for a freshly built object.
+    """
+
+    def __init__(self):
+        self._procs = {}
+        try:
+            self._mem_total = psutil.virtual_memory().total
+        except Exception:
+            self._mem_total = 0
+
+    def _track(self, pid: int):
+        p = psutil.Process(pid)
+        entry = {"proc": p, "create_time": p.create_time(), "name": "", "cmdline": "", "primed": False}
+        # First call only sets the reference point for the next tick
+        p.cpu_percent(None)
+        self._procs[pid] = entry
+        return entry
+
+    def scan(self):
+        """Return one dict per live process: pid, ppid, create_time, name, cmdline, cpu_percent, memory_percent, rss, vms, read_bytes, write_bytes.
+
+        ``cpu_percent`` is None for a process seen for the first time.
+        """
+        try:
+            pids = set(psutil.pids())
+        except Exception:
+            return []
+        for pid in [pid for pid in self._procs if pid not in pids]:
+            del self._procs[pid]
+        rows = []
+        for pid in pids:
+            try:
+                entry = self._procs.get(pid) or self._track(pid)
+                p = entry["proc"]
+                with p.oneshot():
+                    if not p.is_running():
+                        # pid was reused by a new process
+                        entry = self._track(pid)
+                        p = entry["proc"]
+                    name = p.name()
+                    if name != entry["name"] or not entry["cmdline"]:
+                        # name changes after exec(); refresh the cached cmdline with it
+                        entry["name"] = name
+                        entry["cmdline"] = " ".join(p.cmdline())
+                    ppid = p.ppid()
+                    cpu = p.cpu_percent(None)
+                    mi = p.memory_info()
+                    try:
+                        io = p.io_counters()
+                    except (psutil.AccessDenied, AttributeError):
+                        io = None
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                self._procs.pop(pid, None)
+                continue
+            except psutil.AccessDenied:
+                continue
+            rows.append({
+                "pid": pid,
+                "ppid": ppid,
+                "create_time": entry["create_time"],
+                "name": entry["name"],
+                "cmdline": entry["cmdline"],
+                "cpu_percent": cpu if entry["primed"] else None,
+                "memory_percent": (mi.rss * 100.0 / self._mem_total) if self._mem_total else 0.0,
+                "rss": mi.rss,
+                "vms": mi.vms,
+                "read_bytes": io.read_bytes if io else None,
+                "write_bytes": io.write_bytes if io else None,
+            })
+            entry["primed"] = True
+        return rows
+
+    def pss(self, pid: int):
+        """Proportional set size in bytes, or None when unavailable (not Linux, no permission, exited)."""
+        entry = self._procs.get(pid)
+        if entry is None:
+            return None
+        try:
+            return getattr(entry["proc"].memory_full_info(), "pss", None)
+        except (psutil.Error, AttributeError):
+            return None
+
+    def hwm(self, pid: int):
+        """Peak RSS (VmHWM) in bytes over the life of the process; Linux only."""
+        try:
+            with open(f"/proc/{pid}/status", "rb") as f:
+                kv = parse_kv(f.read())
+        except OSError:
+            return None
+        return kv["VmHWM"] * 1024 if "VmHWM" in kv else None
+
+
+class PsutilBackend:
+    """System and process metrics through psutil (used off Linux, or with MON_BACKEND=psutil)."""
+
+    name = "psutil"
+
+    def __init__(self):
+        self.table = ProcessTable()
+
+    def cpu_count(self):
+        return psutil.cpu_count()
+
+    def load1(self) -> float:
+        return psutil.getloadavg()[0]
+
+    def memory(self):
+        """(total, available) in bytes."""
+        vm = psutil.virtual_memory()
+        return vm.total, vm.available
+
+    def percpu_percent(self):
+        return psutil.cpu_percent(percpu=True)
+
+    def disk_io(self):
+        """Cumulative (read_bytes, write_bytes) over all disks."""
+        d = psutil.disk_io_counters(perdisk=False)
+        return d.read_bytes, d.write_bytes
+
+    def net_io(self):
+        """Cumulative (bytes_recv, bytes_sent) over all interfaces."""
+        n = psutil.net_io_counters(pernic=False)
+        return n.bytes_recv, n.bytes_sent
+
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class ProcReader:
+    """Reads /proc files into one reusable buffer.
+
+    System-wide files (/proc/stat, /proc/meminfo, ...) are opened once and re-read
+    with pread from offset 0, which makes the kernel regenerate their content;
+    per-pid files are opened, read and closed with raw os calls. Not thread-safe:
+    each thread that reads /proc uses its own reader.
+    """
+
+    def __init__(self, size: int = 1 << 16):
+        self._buf = bytearray(size)
+        self._fds = {}
+
+    def _read_fd(self, fd: int) -> bytes:
+        total = 0
+        while True:
+            if total == len(self._buf):
+                self._buf.extend(bytes(len(self._buf)))
+            with memoryview(self._buf) as mv:
+                n = os.preadv(fd, [mv[total:]], total)
+            if n <= 0:
+                break
+            total += n
+        return bytes(self._buf[:total])
+
+    def read(self, path: str) -> bytes:
+        fd = self._fds.get(path)
+        if fd is None:
+            fd = self._fds[path] = os.open(path, os.O_RDONLY)
+        return self._read_fd(fd)
+
+    def read_once(self, path: str) -> bytes:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            return self._read_fd(fd)
+        finally:
+            os.close(fd)
+
+    def close(self) -> None:
+        for fd in self._fds.values():
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._fds = {}
+
+
+def parse_kv(data: bytes):
+    """'Key:   123 kB' style files (/proc/meminfo, /proc/<pid>/io, smaps_rollup) -> {key: first number}."""
+    out = {}
+    for line in data.split(b"\n"):
+        k, sep, v = line.partition(b":")
+        if sep:
+            parts = v.split()
+            if parts and parts[0].isdigit():
+                out[k.decode()] = int(parts[0])
+    return out
+
+
+class ProcBackend:
+    """Zero-dependency Linux backend reading /proc directly; same interface as PsutilBackend."""
+
+    name = "proc"
+
+    def __init__(self):
+        self.reader = ProcReader()
+        self._prev_cpu = None
+        self._block_devs = {}
+        self.boot_time = 0.0
+        for line in self.reader.read("/proc/stat").split(b"\n"):
+            if line.startswith(b"btime"):
+                self.boot_time = float(line.split()[1])
+        self.mem_total = self.memory()[0]
+        self.table = ProcTable(self)
+
+    def cpu_count(self):
+        return os.cpu_count()
+
+    def load1(self) -> float:
+        return float(self.reader.read("/proc/loadavg").split()[0])
+
+    def memory(self):
+        mi = parse_kv(self.reader.read("/proc/meminfo"))
+        total = mi.get("MemTotal", 0) * 1024
+        avail = mi.get("MemAvailable", mi.get("MemFree", 0) + mi.get("Cached", 0)) * 1024
+        return total, avail
+
+    def percpu_percent(self):
+        cur = []
+        for line in self.reader.read("/proc/stat").split(b"\n"):
+            if line.startswith(b"cpu") and line[3:4].isdigit():
+                f = [int(x) for x in line.split()[1:9]]
+                # user nice system idle iowait irq softirq steal; guest time is already in user
+                cur.append((sum(f), f[3] + f[4]))
+        prev, self._prev_cpu = self._prev_cpu, cur
+        if prev is None or len(prev) != len(cur):
+            return [0.0] * len(cur)
+        vals = []
+        for (tot, idle), (ptot, pidle) in zip(cur, prev):
+            dt = tot - ptot
+            vals.append(round(100.0 * (dt - (idle - pidle)) / dt, 1) if dt > 0 else 0.0)
+        return vals
+
+    def _is_block_dev(self, name: str) -> bool:
+        # Whole disks only (partitions are not under /sys/block), as psutil does
+        known = self._block_devs.get(name)
+        if known is None:
+            known = self._block_devs[name] = os.path.exists(f"/sys/block/{name.replace('/', '!')}")
+        return known
+
+    def disk_io(self):
+        rd = wr = 0
+        for line in self.reader.read("/proc/diskstats").split(b"\n"):
+            f = line.split()
+            if len(f) >= 10 and self._is_block_dev(f[2].decode()):
+                # diskstats always counts 512-byte sectors
+                rd += int(f[5]) * 512
+                wr += int(f[9]) * 512
+        return rd, wr
+
+    def net_io(self):
+        rx = tx = 0
+        for line in self.reader.read("/proc/net/dev").split(b"\n")[2:]:
+            _, sep, rest = line.partition(b":")
+            f = rest.split()
+            if sep and len(f) >= 9:
+                rx += int(f[0])
+                tx += int(f[8])
+        return rx, tx
+
+
+class ProcTable:
+    """Native counterpart of ProcessTable, producing the same rows from /proc/<pid>/{stat,cmdline,io}."""
+
+    def __init__(self, backend: "ProcBackend"):
+        self._b = backend
+        # Own buffer: the table may be scanned from a collector thread while the backend samples
+        self.reader = ProcReader()
+        self._procs = {}
+
+    def _cmdline(self, pid: int) -> str:
+        try:
+            raw = self.reader.read_once(f"/proc/{pid}/cmdline")
+        except OSError:
+            return ""
+        return raw.rstrip(b"\0").replace(b"\0", b" ").decode(errors="replace")
+
+    def scan(self):
+        reader = self.reader
+        now = time.monotonic()
+        mem_total = self._b.mem_total
+        seen = set()
+        rows = []
+        for d in os.listdir("/proc"):
+            if not d.isdigit():
+                continue
+            pid = int(d)
+            try:
+                stat = reader.read_once(f"/proc/{pid}/stat")
+            except OSError:
+                continue
+            # comm may contain spaces and parentheses; fields resume after the last ')'
+            rp = stat.rfind(b")")
+            comm = stat[stat.find(b"(") + 1:rp].decode(errors="replace")
+            f = stat[rp + 2:].split()
+            if len(f) < 22 or f[0] == b"Z":
+                continue
+            ticks = int(f[11]) + int(f[12])
+            start = int(f[19])
+            entry = self._procs.get(pid)
+            if entry is None or entry["start"] != start:
+                entry = {"start": start, "comm": comm, "cmdline": self._cmdline(pid), "ticks": ticks, "wall": now, "primed": False}
+                self._procs[pid] = entry
+            elif comm != entry["comm"]:
+                # exec() changed the program; refresh the cached cmdline
+                entry["comm"] = comm
+                entry["cmdline"] = self._cmdline(pid)
+            cpu = None
+            if entry["primed"]:
+                dt = now - entry["wall"]
+                cpu = round((ticks - entry["ticks"]) / _CLK_TCK / dt * 100.0, 1) if dt > 0 else 0.0
+            entry["ticks"], entry["wall"], entry["primed"] = ticks, now, True
+            seen.add(pid)
+            try:
+                io = parse_kv(reader.read_once(f"/proc/{pid}/io"))
+            except OSError:
+                io = {}
+            name = comm
+            if len(comm) >= 15 and entry["cmdline"]:
+                # comm is truncated to 15 chars; prefer the full executable name
+                base = os.path.basename(entry["cmdline"].split(" ", 1)[0])
+                if base.startswith(comm):
+                    name = base
+            rss = int(f[21]) * _PAGE_SIZE
+            rows.append({
+                "pid": pid,
+                "ppid": int(f[1]),
+                "create_time": self._b.boot_time + start / _CLK_TCK,
+                "name": name,
+                "cmdline": entry["cmdline"],
+                "cpu_percent": cpu,
+                "memory_percent": (rss * 100.0 / mem_total) if mem_total else 0.0,
+                "rss": rss,
+                "vms": int(f[20]),
+                "read_bytes": io.get("read_bytes"),
+                "write_bytes": io.get("write_bytes"),
+            })
+        for pid in [pid for pid in self._procs if pid not in seen]:
+            del self._procs[pid]
+        return rows
+
+    def pss(self, pid: int):
+        try:
+            kv = parse_kv(self.reader.read_once(f"/proc/{pid}/smaps_rollup"))
+        except OSError:
+            return None
+        return kv["Pss"] * 1024 if "Pss" in kv else None
+
+    def hwm(self, pid: int):
+        """Peak RSS (VmHWM) in bytes over the life of the process."""
+        try:
+            kv = parse_kv(self.reader.read_once(f"/proc/{pid}/status"))
+        except OSError:
+            return None
+        return kv["VmHWM"] * 1024 if "VmHWM" in kv else None
+
+
+def make_backend(name: str = BACKEND):
+    """Pick a collector backend; returns None when neither /proc nor psutil is usable."""
+    if name in ("auto", "proc") and os.path.exists("/proc/self/stat") and hasattr(os, "preadv"):
+        try:
+            return ProcBackend()
+        except Exception as e:
+            print(f"native /proc backend unavailable: {e}", file=sys.stderr)
+    if psutil is not None:
+        return PsutilBackend()
+    return None
+
+
+def sample_system(backend, percpu: bool = bool(INCLUDE_PERCPU)):
+    """Fast per-tick system metrics: (load1, mem_used_mb, mem_free_mb, percpu_percent or None)."""
+    load1 = 0.0
+    mem_used_mb = mem_free_mb = 0
+    percpu_vals = None
+    if backend is None:
+        return load1, mem_used_mb, mem_free_mb, percpu_vals
+    try:
+        load1 = backend.load1()
+        total, avail = backend.memory()
+        mem_used_mb = round((total - avail) / 1024 / 1024)
+        mem_free_mb = round(avail / 1024 / 1024)
+        if percpu:
+            percpu_vals = backend.percpu_percent()
+    except Exception:
+        pass
+    return load1, mem_used_mb, mem_free_mb, percpu_vals
+
+
+def is_altanalyze(row) -> bool:
+    cmd = row["cmdline"]
+    return "AltAnalyze.sh" in cmd or "AltAnalyze.py" in cmd or "bam_to_bed" in cmd or row["name"].startswith("AltAnalyze")
+
+
+# AltAnalyze.sh stages by script, latest first: when several run at once the later stage wins
+PHASES = [
+    ("go_elite", "GO_Elite.py"),
+    ("metadata_analysis", "metaDataAnalysis.py"),
+    ("prune", "prune.py"),
+    ("multipath_psi", "AltAnalyze.py"),
+    ("bam_to_exon_bed", "BAMtoExonBED.py"),
+    ("bam_to_junction_bed", "BAMtoJunctionBED.py"),
+]
+# Fixed order: usage.bin stores the phase as an index into this list
+PHASE_NAMES = ["idle", "altanalyze", "archive"] + [name for name, _ in PHASES]
+
+
+def is_archive(row) -> bool:
+    # The WDL tars altanalyze_output after AltAnalyze.sh exits, outside its process tree
+    cmd = row["cmdline"]
+    return (row["name"] == "tar" or cmd.startswith("tar ")) and "altanalyze_output" in cmd
+
+
+class AltTree:
+    """Aggregates the AltAnalyze process tree: every matching root plus all of its descendants.
+
+    Roots are matching processes whose parent does not match, so samtools, GNU parallel
+    workers and the Python children of AltAnalyze.sh are counted under their launcher.
+    The WDL's final tar of altanalyze_output is a root of its own.
+    Read/write bytes of members that have exited are retained, which keeps
+    ``read_mb``/``write_mb`` cumulative across short-lived workers. ``hwm_sum_mb`` sums the
+    members' VmHWM (peak RSS since start, or since the last ``reset_hwm()`` at a phase
+    change), so short spikes between samples are not lost; it is an upper bound, since the
+    members need not peak at the same time. ``proc_hwm_mb`` is the largest single-process
+    peak of the run.
+    """
+
+    def __init__(self):
+        self.last_roots = []
+        self.last_members = []
+        self.pss = bool(INCLUDE_PSS)
+        self.proc_hwm = None
+        self._reset_warned = False
+        self._last_io = {}
+        self._retired_read = 0
+        self._retired_write = 0
+
+    def reset_hwm(self, members) -> bool:
+        """Restart VmHWM of the given processes at their current RSS: writes ``5`` to their
+        ``/proc/<pid>/clear_refs``, which touches nothing else (only with ``MON_RESET_HWM=1``).
+        Returns True when every live process was reset."""
+        if not RESET_HWM:
+            return False
+        ok = True
+        for r in members:
+            try:
+                with open(f"/proc/{r['pid']}/clear_refs", "w") as f:
+                    f.write("5")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                # Typically EACCES for another user's processes
+                ok = False
+                if not self._reset_warned:
+                    self._reset_warned = True
+                    print(f"cannot reset VmHWM of pid {r['pid']} ({e}); phases without a reset keep only "
+                          "sampled RSS peaks", file=sys.stderr)
+        return ok
+
+    @staticmethod
+    def _mb(v):
+        return round(v / 1024 / 1024, 1) if v is not None else None
+
+    def members(self, rows):
+        by_pid = {r["pid"]: r for r in rows}
+        children = {}
+        for r in rows:
+            children.setdefault(r["ppid"], []).append(r)
+        roots = [r for r in rows if (is_altanalyze(r) and not (r["ppid"] in by_pid and is_altanalyze(by_pid[r["ppid"]])))
+                 or is_archive(r)]
+        roots.sort(key=lambda r: r["create_time"])
+        # Never count the monitor itself, even when it was launched from inside the tree
+        seen = {os.getpid()}
+        out = []
+        stack = list(reversed(roots))
+        while stack:
+            r = stack.pop()
+            if r["pid"] in seen:
+                continue
+            seen.add(r["pid"])
+            out.append(r)
+            stack.extend(children.get(r["pid"], []))
+        return roots, out
+
+    def collect(self, rows, ptable=None):
+        roots, members = self.members(rows)
+        self.last_roots = roots
+        self.last_members = members
+        live = {}
+        for r in members:
+            live[(r["pid"], r["create_time"])] = (r["read_bytes"] or 0, r["write_bytes"] or 0)
+        for key, (rd, wr) in self._last_io.items():
+            if key not in live:
+                self._retired_read += rd
+                self._retired_write += wr
+        self._last_io = live
+        if not roots:
+            return {"pid": None, "cpu": None, "pmem": None, "rss_mb": None, "vsz_mb": None, "pss_mb": None,
+                    "hwm_sum_mb": None, "proc_hwm_mb": self._mb(self.proc_hwm),
+                    "read_mb": None, "write_mb": None, "workers": 0}
+        pss = None
+        if self.pss and ptable is not None:
+            vals = [ptable.pss(r["pid"]) for r in members]
+            vals = [v for v in vals if v is not None]
+            if vals:
+                pss = round(sum(vals) / 1024 / 1024, 1)
+        # Peak RSS between ticks: VmHWM of each live member, summed (an upper bound for the
+        # tree, as members may peak at different times), and the largest single-process peak
+        hwm = None
+        if ptable is not None:
+            vals = [v for v in (ptable.hwm(r["pid"]) for r in members) if v is not None]
+            if vals:
+                hwm = sum(vals)
+                if self.proc_hwm is None or max(vals) > self.proc_hwm:
+                    self.proc_hwm = max(vals)
+        read_b = self._retired_read + sum(rd for rd, _ in live.values())
+        write_b = self._retired_write + sum(wr for _, wr in live.values())
+        return {
+            "pid": roots[0]["pid"],
+            "cpu": round(sum(r["cpu_percent"] or 0.0 for r in members), 1),
+            "pmem": round(sum(r["memory_percent"] for r in members), 3),
+            "rss_mb": round(sum(r["rss"] for r in members) / 1024 / 1024, 1),
+            "vsz_mb": round(sum(r["vms"] for r in members) / 1024 / 1024, 1),
+            "pss_mb": pss,
+            "hwm_sum_mb": self._mb(hwm),
+            "proc_hwm_mb": self._mb(self.proc_hwm),
+            "read_mb": round(read_b / 1024 / 1024, 1),
+            "write_mb": round(write_b / 1024 / 1024, 1),
+            "workers": len(members),
+        }
+
+
+class PhaseTracker:
+    """Tags samples with the active pipeline stage and accumulates a resource profile per stage.
+
+    The interval between two samples is charged to the phase of the earlier one (duration,
+    CPU, the growth of the tree's cumulative read/write bytes and the cgroup memory peak
+    reached in between); RSS/PSS, the tree's summed VmHWM and cgroup usage are taken per sample.
+    VmHWM counts only while ``hwm`` is set, i.e. when it was restarted at the phase change;
+    otherwise it still holds earlier phases' peaks and the phase keeps its sampled RSS peak.
+    """
+
+    def __init__(self, hwm: bool = bool(RESET_HWM)):
+        self.stats = {}
+        self.hwm = hwm
+        self.current = None
+        self._prev = None
+        self._io = (None, None)
+
+    def detect(self, members) -> str:
+        if any(is_archive(r) for r in members):
+            return "archive"
+        for name, script in PHASES:
+            if any(script in r["cmdline"] for r in members):
+                return name
+        return "altanalyze" if members else "idle"
+
+    PEAKS = ("peak_rss_mb", "peak_pss_mb", "peak_hwm_sum_mb", "peak_cg_mem_mb")
+
+    @staticmethod
+    def _peak(st, key, val):
+        if val is not None and (st[key] is None or val > st[key]):
+            st[key] = val
+
+    def update(self, t: float, phase: str, alt: dict, cg_mb=None, cg_peak_mb=None) -> bool:
+        """Account one sample; returns True when the phase changed.
+
+        ``cg_peak_mb`` is the cgroup memory high-water mark reached since the previous
+        sample; the caller restarts it (and the tree's VmHWM, setting ``hwm`` to whether that
+        worked) when the phase changes.
+        """
+        if self._prev is not None:
+            pt, pphase, pcpu = self._prev
+            ps = self.stats[pphase]
+            self._peak(ps, "peak_cg_mem_mb", cg_peak_mb)
+            dt = max(0.0, t - pt)
+            ps["duration_s"] += dt
+            ps["cpu_pct_s"] += (pcpu or 0.0) * dt
+            ps["end"] = t
+            for key, cur, last in (("read_mb", alt.get("read_mb"), self._io[0]), ("write_mb", alt.get("write_mb"), self._io[1])):
+                if cur is not None and last is not None and cur >= last:
+                    ps[key] += cur - last
+        if alt.get("read_mb") is not None:
+            self._io = (alt.get("read_mb"), alt.get("write_mb"))
+        changed = phase != self.current
+        st = self.stats.get(phase)
+        if st is None:
+            st = self.stats[phase] = {"entries": 0, "start": t, "end": t, "duration_s": 0.0, "samples": 0,
+                                      "cpu_pct_s": 0.0, "read_mb": 0.0, "write_mb": 0.0}
+            st.update(dict.fromkeys(self.PEAKS))
+        if changed:
+            st["entries"] += 1
+        st["samples"] += 1
+        self._peak(st, "peak_rss_mb", alt.get("rss_mb"))
+        self._peak(st, "peak_pss_mb", alt.get("pss_mb"))
+        # The first sample of a phase is taken before the caller's reset
+        if self.hwm and not changed:
+            self._peak(st, "peak_hwm_sum_mb", alt.get("hwm_sum_mb"))
+        self._peak(st, "peak_cg_mem_mb", cg_mb)
+        self.current = phase
+        self._prev = (t, phase, alt.get("cpu"))
+        return changed
+
+    def report(self) -> str:
+        cols = ["phase", "entries", "start", "end", "duration_s", "samples", "peak_rss_mb", "peak_pss_mb",
+                "peak_hwm_sum_mb", "peak_cg_mem_mb", "mean_cpu_pct", "cpu_core_s", "read_mb", "write_mb"]
+        lines = ["\t".join(cols)]
+        for name, st in self.stats.items():
+            dur = st["duration_s"]
+            lines.append("\t".join(map(str, [
+                name, st["entries"],
+                datetime.fromtimestamp(st["start"]).isoformat(timespec="seconds"),
+                datetime.fromtimestamp(st["end"]).isoformat(timespec="seconds"),
+                round(dur, 1), st["samples"], st["peak_rss_mb"], st["peak_pss_mb"],
+                st["peak_hwm_sum_mb"], st["peak_cg_mem_mb"],
+                round(st["cpu_pct_s"] / dur, 1) if dur > 0 else None,
+                round(st["cpu_pct_s"] / 100.0, 1),
+                round(st["read_mb"], 1), round(st["write_mb"], 1),
+            ])))
+        return "\n".join(lines) + "\n"
+
+
+def format_top(rows, ts: str, k: int = 30) -> str:
+    top_cpu = sorted(rows, key=lambda r: r["cpu_percent"] or 0.0, reverse=True)[:k]
+    top_rss = sorted(rows, key=lambda r: r["rss"], reverse=True)[:k]
+    lines = [f"[{ts}] top by CPU:"]
+    for r in top_cpu:
+        lines.append(f"{r['pid']} {r['cpu_percent']}% {r['memory_percent']:.2f}% {r['rss']/1024/1024:.1f}MB {r['name']} {r['cmdline']}")
+    lines.append("\n")
+    lines.append(f"[{ts}] top by RSS:")
+    for r in top_rss:
+        lines.append(f"{r['pid']} {r['rss']/1024/1024:.1f}MB {r['cpu_percent']}% {r['memory_percent']:.2f}% {r['name']} {r['cmdline']}")
+    return "\n".join(lines) + "\n"
+
+
+def cmd_signature(row, width: int = 120) -> str:
+    """Program and script of a process, e.g. ``python3 AltAnalyze.py``: stable across runs, unlike pids and paths."""
+    words = row["cmdline"].split()
+    if not words:
+        return row["name"]
+    sig = [os.path.basename(words[0])]
+    for w in words[1:]:
+        if w == "-c":
+            sig.append(w)
+            break
+        if not w.startswith("-"):
+            sig.append(os.path.basename(w.rstrip("/")))
+            break
+    return " ".join(sig)[:width]
+
+
+class ProcessHistory:
+    """Sparse CPU/RSS/IO series of the heaviest processes of the run, for ``proc_history.json``.
+
+    Each tick the top ``k`` processes by CPU and by RSS are tracked. A process stays
+    tracked while it is among them or among the top ``k`` of the run by peak RSS or by CPU
+    seconds, so at most ``4 * k`` series are kept and a process that exited long ago is
+    still there if it held the memory peak. Series hold at most ``points`` points: when full, neighbouring
+    points are merged (mean CPU, max RSS, last IO) and the series continues at half the
+    resolution, which keeps memory bounded on runs of any length.
+    """
+
+    def __init__(self, k: int, points: int):
+        self.k = max(1, k)
+        self.points = max(8, points)
+        self._procs = {}
+
+    def _track(self, r, t: float):
+        return {"pid": r["pid"], "create_time": r["create_time"], "name": r["name"],
+                "signature": cmd_signature(r), "cmdline": r["cmdline"][:500],
+                "first_t": t, "last_t": t, "alive": True, "cpu_s": 0.0,
+                "peak_rss": 0, "peak_t": t, "peak_phase": None,
+                "stride": 1, "pending": [], "series": []}
+
+    def _append(self, p, point) -> None:
+        p["pending"].append(point)
+        if len(p["pending"]) < p["stride"]:
+            return
+        pts, p["pending"] = p["pending"], []
+        p["series"].append(self._merge(pts))
+        if len(p["series"]) >= self.points:
+            s = p["series"]
+            p["series"] = [self._merge(s[i:i + 2]) for i in range(0, len(s), 2)]
+            p["stride"] *= 2
+
+    @staticmethod
+    def _merge(pts):
+        if len(pts) == 1:
+            return pts[0]
+        cpus = [q[1] for q in pts if q[1] is not None]
+        return [pts[0][0], round(sum(cpus) / len(cpus), 1) if cpus else None,
+                max(q[2] for q in pts), pts[-1][3], pts[-1][4]]
+
+    def observe(self, t: float, rows, phase=None) -> None:
+        live = {(r["pid"], r["create_time"]): r for r in rows}
+        for key in list(self._procs):
+            if key not in live:
+                self._procs[key]["alive"] = False
+        cand = heapq.nlargest(self.k, rows, key=lambda r: r["cpu_percent"] or 0.0) + \
+            heapq.nlargest(self.k, rows, key=lambda r: r["rss"])
+        cand_keys = set()
+        for r in cand:
+            key = (r["pid"], r["create_time"])
+            cand_keys.add(key)
+            if key not in self._procs:
+                self._procs[key] = self._track(r, t)
+        for key, p in self._procs.items():
+            r = live.get(key)
+            if r is None:
+                continue
+            if r["cpu_percent"] is not None:
+                p["cpu_s"] += r["cpu_percent"] / 100.0 * max(0.0, t - p["last_t"])
+            p["last_t"] = t
+            if r["rss"] > p["peak_rss"]:
+                p["peak_rss"], p["peak_t"], p["peak_phase"] = r["rss"], t, phase
+            mb = 1024 * 1024
+            self._append(p, [round(t, 1), r["cpu_percent"], round(r["rss"] / mb, 1),
+                             round(r["read_bytes"] / mb, 1) if r["read_bytes"] is not None else None,
+                             round(r["write_bytes"] / mb, 1) if r["write_bytes"] is not None else None])
+        if len(self._procs) > 2 * self.k:
+            keep = cand_keys | set(heapq.nlargest(self.k, self._procs, key=lambda q: self._procs[q]["peak_rss"]))
+            keep |= set(heapq.nlargest(self.k, self._procs, key=lambda q: self._procs[q]["cpu_s"]))
+            for key in [q for q in self._procs if q not in keep]:
+                del self._procs[key]
+
+    def report(self, context=None) -> str:
+        procs = []
+        for p in sorted(self._procs.values(), key=lambda q: q["peak_rss"], reverse=True):
+            procs.append({
+                "pid": p["pid"], "name": p["name"], "signature": p["signature"], "cmdline": p["cmdline"],
+                "start": datetime.fromtimestamp(p["create_time"]).isoformat(timespec="seconds"),
+                "first_seen": datetime.fromtimestamp(p["first_t"]).isoformat(timespec="seconds"),
+                "last_seen": datetime.fromtimestamp(p["last_t"]).isoformat(timespec="seconds"),
+                "alive": p["alive"], "cpu_core_s": round(p["cpu_s"], 1),
+                "peak_rss_mb": round(p["peak_rss"] / 1024 / 1024, 1),
+                "peak_ts": datetime.fromtimestamp(p["peak_t"]).isoformat(timespec="seconds"),
+                "peak_phase": p["peak_phase"], "step_ticks": p["stride"],
+                "series": p["series"] + ([self._merge(p["pending"])] if p["pending"] else []),
+            })
+        doc = {**(context or {}), "ts": datetime.now().isoformat(), "top_k": self.k,
+               "columns": ["t", "cpu_pct", "rss_mb", "read_mb", "write_mb"], "processes": procs}
+        return json.dumps(doc) + "\n"
+
+
+class LargestFiles:
+    """Incremental largest files/directories tracker for one filesystem tree.
+
+    A depth-first ``os.scandir`` walk is resumed across heavy ticks; each ``step()``
+    runs until its time budget is spent, so a large tree never stalls the sample
+    loop. When a pass completes, its top-N files and directories (recursive totals)
+    become the published snapshot. Growth rates come from remembered sizes: per file
+    between consecutive observations (files >= ``track_bytes``, at most
+    ``max_tracked`` of them), per directory between consecutive passes.
+    """
+
+    def __init__(self, root: str, top_n: int = 50, track_bytes: int = 1 << 20, max_tracked: int = 50000):
+        self.root = root
+        self.top_n = top_n
+        self.track_bytes = track_bytes
+        self.max_tracked = max_tracked
+        try:
+            self._dev = os.stat(root).st_dev
+        except OSError:
+            self._dev = None
+        self._stack = []
+        self._cur = None
+        self._in_pass = False
+        self._pass_start = 0.0
+        self._entries = 0
+        self._heap = []
+        self._dir_bytes = {}
+        self._seen = {}
+        self._visited = set()
+        self._rates = {}
+        self._prev_dirs = {}
+        self._prev_pass_end = None
+        # Published results of the last completed pass
+        self.passes = 0
+        self.pass_secs = None
+        self.top_files = []
+        self.top_dirs = []
+        self.growth = []
+
+    def _start_pass(self) -> None:
+        self._stack = [self.root]
+        self._in_pass = True
+        self._pass_start = time.monotonic()
+        self._entries = 0
+        self._heap = []
+        self._dir_bytes = {}
+        self._visited = set()
+        self._rates = {}
+
+    def _add_file(self, parent: str, path: str, size: int, now: float) -> None:
+        if len(self._heap) < self.top_n:
+            heapq.heappush(self._heap, (size, path))
+        elif size > self._heap[0][0]:
+            heapq.heapreplace(self._heap, (size, path))
+        self._dir_bytes[parent] = self._dir_bytes.get(parent, 0) + size
+        if size < self.track_bytes:
+            return
+        prev = self._seen.get(path)
+        if prev is not None:
+            psize, pt = prev
+            if now > pt:
+                self._rates[path] = (size - psize) / (now - pt)
+        elif len(self._seen) >= self.max_tracked:
+            return
+        self._seen[path] = (size, now)
+        self._visited.add(path)
+
+    def _finish_pass(self) -> None:
+        now = time.monotonic()
+        # Roll each directory's own file bytes up into all of its ancestors
+        totals = {}
+        for d, size in self._dir_bytes.items():
+            while True:
+                totals[d] = totals.get(d, 0) + size
+                parent = os.path.dirname(d)
+                if d == self.root or parent == d or not parent.startswith(self.root):
+                    break
+                d = parent
+        rates = dict(self._rates)
+        if self._prev_pass_end is not None and now > self._prev_pass_end:
+            dt = now - self._prev_pass_end
+            for d, total in totals.items():
+                if d in self._prev_dirs:
+                    rates[d + os.sep] = (total - self._prev_dirs[d]) / dt
+        self._seen = {p: v for p, v in self._seen.items() if p in self._visited}
+        self._prev_dirs = totals
+        self._prev_pass_end = now
+        self.top_files = sorted(self._heap, reverse=True)
+        self.top_dirs = sorted(((b, d) for d, b in totals.items()), reverse=True)[:self.top_n]
+        self.growth = sorted(((r, p) for p, r in rates.items() if r > 0), reverse=True)[:self.top_n]
+        self.pass_secs = round(now - self._pass_start, 1)
+        self.passes += 1
+        self._in_pass = False
+
+    def step(self, budget_s: float) -> bool:
+        """Advance the walk for up to ``budget_s`` seconds; True if a pass completed."""
+        if self._dev is None:
+            return False
+        deadline = time.monotonic() + budget_s
+        if not self._in_pass:
+            self._start_pass()
+        n = 0
+        while True:
+            n += 1
+            if n % 64 == 0 and time.monotonic() >= deadline:
+                return False
+            if self._cur is None:
+                if not self._stack:
+                    self._finish_pass()
+                    return True
+                d = self._stack.pop()
+                try:
+                    self._cur = (d, os.scandir(d))
+                except OSError:
+                    continue
+            d, it = self._cur
+            try:
+                entry = next(it)
+            except (StopIteration, OSError):
+                it.close()
+                self._cur = None
+                continue
+            self._entries += 1
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    # Stay on the same filesystem
+                    if entry.stat(follow_symlinks=False).st_dev == self._dev:
+                        self._stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    self._add_file(d, entry.path, entry.stat(follow_symlinks=False).st_size, time.monotonic())
+            except OSError:
+                pass
+
+    def report(self, ts: str):
+        """Lines for largest.txt: last completed pass, or the partial first pass while it runs."""
+        files = self.top_files if self.passes else sorted(self._heap, reverse=True)
+        if self.passes:
+            state = f"pass {self.passes} took {self.pass_secs}s"
+        else:
+            state = f"first pass in progress, {self._entries} entries so far"
+        lines = [f"[{ts}] largest files under {self.root} ({state}):\n"]
+        lines.extend(f"{sz/1024/1024:8.1f} MB {path}\n" for sz, path in files)
+        if self.top_dirs:
+            lines.append(f"[{ts}] largest directories under {self.root}:\n")
+            lines.extend(f"{sz/1024/1024:8.1f} MB {path}\n" for sz, path in self.top_dirs)
+        if self.growth:
+            lines.append(f"[{ts}] fastest growing (bytes/s; directories end with {os.sep}):\n")
+            lines.extend(f"{rate/1024/1024:8.3f} MB/s {path}\n" for rate, path in self.growth)
+        return lines
+
+
+class TrendForecaster:
+    """Least-squares linear trend over a sliding time window, updated in O(1) per sample."""
+
+    def __init__(self, window_s: float, min_points: int = 4, max_eta_s: float = 7 * 86400):
+        self.window_s = window_s
+        self.min_points = min_points
+        self.max_eta_s = max_eta_s
+        self._pts = deque()
+        self._t0 = None
+        self._sx = self._sy = self._sxx = self._sxy = 0.0
+
+    def _acc(self, x: float, y: float, sign: float) -> None:
+        self._sx += sign * x
+        self._sy += sign * y
+        self._sxx += sign * x * x
+        self._sxy += sign * x * y
+
+    def add(self, t: float, y: float) -> None:
+        if self._t0 is None:
+            self._t0 = t
+        x = t - self._t0
+        self._pts.append((x, y))
+        self._acc(x, y, 1.0)
+        while self._pts and x - self._pts[0][0] > self.window_s:
+            ox, oy = self._pts.popleft()
+            self._acc(ox, oy, -1.0)
+
+    def slope(self):
+        """Units per second, or None until enough points span the window."""
+        n = len(self._pts)
+        if n < self.min_points:
+            return None
+        den = n * self._sxx - self._sx * self._sx
+        if den <= 1e-9:
+            return None
+        return (n * self._sxy - self._sx * self._sy) / den
+
+    def eta(self, target: float):
+        """Seconds until the trend reaches ``target`` from the latest value; None if it is not heading there."""
+        s = self.slope()
+        if s is None or not self._pts:
+            return None
+        gap = target - self._pts[-1][1]
+        if gap == 0:
+            return 0.0
+        if s == 0 or (gap > 0) != (s > 0):
+            return None
+        eta = gap / s
+        # A nearly flat trend projects absurdly far out; treat beyond max_eta_s as "not approaching"
+        return round(eta, 1) if eta <= self.max_eta_s else None
+
+
+class SampleScheduler:
+    """Chooses the sleep before the next tick from resource state, within per-hour tick and CPU caps.
+
+    Dense (``dense_s``) for ``hold_s`` after a trigger: the AltAnalyze tree starting, exiting,
+    changing worker count or entering a new pipeline phase, cgroup memory above ``mem_near`` of its limit, or disk IO jumping
+    to ``spike_factor`` x its moving average. Sparse (``idle_s``) once nothing has run or moved
+    for ``idle_after_s`` (e.g. while inputs are localized).
+    """
+
+    URGENT = ("disk_critical", "forecast", "mem_near_limit")
+
+    def __init__(self, base_s: float, dense_s: float, idle_s: float,
+                 hold_s: float = 60.0, idle_after_s: float = 120.0, mem_near: float = 0.9,
+                 spike_factor: float = 3.0, spike_min_mb_s: float = 10.0,
+                 max_per_hour: int = 0, cpu_per_hour: float = 0.0):
+        # Dense never samples slower, nor idle faster, than the base interval
+        self.base_s, self.dense_s, self.idle_s = base_s, min(dense_s, base_s), max(idle_s, base_s)
+        self.hold_s, self.idle_after_s = hold_s, idle_after_s
+        self.mem_near, self.spike_factor, self.spike_min_mb_s = mem_near, spike_factor, spike_min_mb_s
+        self.max_per_hour, self.cpu_per_hour = max_per_hour, cpu_per_hour
+        self._ticks = deque()
+        self._cpu = deque()
+        self._cpu_sum = 0.0
+        self._dense_until = 0.0
+        self._dense_reason = ""
+        self._busy_at = None
+        self._sig = None
+        self._io_avg = None
+
+    def tick_done(self, now: float, cpu_s: float) -> None:
+        """Record a finished tick and the monitor CPU seconds (all threads) used since the previous one."""
+        self._ticks.append(now)
+        self._cpu.append((now, cpu_s))
+        self._cpu_sum += cpu_s
+        while self._ticks and now - self._ticks[0] >= 3600:
+            self._ticks.popleft()
+        while self._cpu and now - self._cpu[0][0] >= 3600:
+            self._cpu_sum -= self._cpu.popleft()[1]
+
+    def _trigger(self, now: float, reason: str) -> None:
+        self._dense_until = now + self.hold_s
+        self._dense_reason = reason
+
+    def next_interval(self, now: float, alt: dict, phase=None, io_mb_s=None, mem_frac=None,
+                      etas=(), eta_floor_s: float = 2.0, disk_critical: bool = False):
+        """(seconds to sleep, reason); reason is "base", "idle", "capped" or what made sampling dense."""
+        sig = (alt.get("pid"), alt.get("workers"), phase)
+        if self._sig is not None and sig != self._sig:
+            self._trigger(now, "phase_change")
+        self._sig = sig
+        if io_mb_s is not None:
+            if self._io_avg is not None and io_mb_s >= self.spike_min_mb_s and io_mb_s > self.spike_factor * self._io_avg:
+                self._trigger(now, "io_spike")
+            self._io_avg = io_mb_s if self._io_avg is None else 0.8 * self._io_avg + 0.2 * io_mb_s
+        busy = alt.get("pid") is not None and ((alt.get("cpu") or 0) >= 5 or (io_mb_s or 0) >= 1)
+        if busy or self._busy_at is None:
+            self._busy_at = now
+
+        interval, reason = self.base_s, "base"
+        if now < self._dense_until:
+            interval, reason = self.dense_s, self._dense_reason
+        elif now - self._busy_at >= self.idle_after_s and alt.get("pid") is None:
+            interval, reason = self.idle_s, "idle"
+        if mem_frac is not None and mem_frac >= self.mem_near:
+            interval, reason = min(interval, self.dense_s), "mem_near_limit"
+        if disk_critical:
+            interval, reason = min(interval, self.dense_s), "disk_critical"
+        # Sample faster as projected disk-full or OOM gets close: ETA/120, e.g. 30 min -> 15 s, 4 min -> 2 s
+        if etas:
+            eta_s = max(eta_floor_s, min(etas) / 120.0)
+            if eta_s < interval:
+                interval, reason = eta_s, "forecast"
+
+        # Caps: past the hourly CPU budget, or with most of the hourly tick budget used, no faster than base;
+        # with the tick budget exhausted, wait until the oldest tick of the hour expires
+        if interval < self.base_s and (
+                (self.cpu_per_hour > 0 and self._cpu_sum >= self.cpu_per_hour)
+                or (self.max_per_hour > 0 and len(self._ticks) >= 0.8 * self.max_per_hour)):
+            interval, reason = self.base_s, "capped"
+        if self.max_per_hour > 0 and len(self._ticks) >= self.max_per_hour:
+            wait = self._ticks[0] + 3600 - now
+            if wait > interval:
+                interval, reason = wait, "capped"
+        return interval, reason
+
+
+class InputProgress:
+    """Read progress of the input files (BAM/BED) the AltAnalyze tree has open.
+
+    Every read-only regular file with a tracked suffix found in /proc/<pid>/fd of a tree
+    member is followed through its fdinfo offset. Percent complete is offset / size; the
+    read rate is the trend of the offset over ``window_s``, which also gives the ETA. An
+    input whose offset has not moved for ``stall_s`` is reported as stalled. Inputs that
+    are closed move to a bounded list of finished reads.
+    """
+
+    def __init__(self, suffixes, window_s: float, stall_s: float, keep_done: int = 100):
+        self.suffixes = tuple(suffixes)
+        self.window_s = window_s
+        self.stall_s = stall_s
+        self.keep_done = keep_done
+        self.enabled = True
+        self.active = {}
+        self.done = deque(maxlen=keep_done)
+
+    def _open_inputs(self, members):
+        """{path: (offset, pid)} of read-only tracked files; the furthest offset wins."""
+        seen = {}
+        for r in members:
+            pid = r["pid"]
+            try:
+                fds = os.listdir(f"/proc/{pid}/fd")
+            except OSError:
+                continue
+            for fd in fds:
+                try:
+                    target = os.readlink(f"/proc/{pid}/fd/{fd}")
+                    if not target.endswith(self.suffixes):
+                        continue
+                    with open(f"/proc/{pid}/fdinfo/{fd}", "rb") as f:
+                        info = dict(line.split(b":", 1) for line in f.read().splitlines() if b":" in line)
+                    pos, flags = int(info[b"pos"]), int(info[b"flags"], 8)
+                except (OSError, KeyError, ValueError):
+                    continue
+                # Outputs (e.g. BEDs being written) are not inputs
+                if flags & os.O_ACCMODE != os.O_RDONLY:
+                    continue
+                if target not in seen or pos > seen[target][0]:
+                    seen[target] = (pos, pid)
+        return seen
+
+    def scan(self, members, now: float, wall: float) -> None:
+        seen = self._open_inputs(members)
+        for path, (pos, pid) in seen.items():
+            st = self.active.get(path)
+            if st is None or pos < st["pos"]:
+                # New input, or re-opened and read again from the start
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    continue
+                st = self.active[path] = {"size": size, "pos": pos, "pid": pid, "start": wall, "moved": now,
+                                          "warned": False, "trend": TrendForecaster(self.window_s, min_points=3)}
+            if pos != st["pos"]:
+                st["moved"] = now
+                st["warned"] = False
+            st["pos"], st["pid"] = pos, pid
+            st["trend"].add(now, float(pos))
+            stalled = now - st["moved"]
+            if stalled >= self.stall_s and not st["warned"]:
+                st["warned"] = True
+                print(f"[{datetime.fromtimestamp(wall).isoformat()}] WARNING: input read stalled for {int(stalled)}s "
+                      f"at {st['pos'] * 100.0 / max(1, st['size']):.1f}%: {path}", file=sys.stderr)
+        for path in [p for p in self.active if p not in seen]:
+            st = self.active.pop(path)
+            self.done.append((path, st["size"], st["pos"], st["start"], wall))
+
+    def _stats(self, st, now: float):
+        rate = st["trend"].slope()
+        rate = max(0.0, rate) if rate is not None else None
+        eta = st["trend"].eta(float(st["size"])) if rate else None
+        return st["pos"] * 100.0 / st["size"] if st["size"] else None, rate, eta, now - st["moved"]
+
+    def fields(self, now: float):
+        """Record fields over all active inputs: overall percent, summed MB/s, slowest ETA, longest stall."""
+        out = {"progress_pct": None, "progress_mb_s": None, "progress_eta_s": None,
+               "progress_stalled_s": None, "progress_inputs": len(self.active)}
+        if not self.active:
+            return out
+        size = sum(st["size"] for st in self.active.values())
+        stats = [self._stats(st, now) for st in self.active.values()]
+        rates = [s[1] for s in stats if s[1] is not None]
+        etas = [s[2] for s in stats if s[2] is not None]
+        out["progress_pct"] = round(sum(st["pos"] for st in self.active.values()) * 100.0 / size, 2) if size else None
+        out["progress_mb_s"] = round(sum(rates) / 1024 / 1024, 3) if rates else None
+        out["progress_eta_s"] = round(max(etas), 1) if etas else None
+        out["progress_stalled_s"] = round(max(s[3] for s in stats), 1)
+        return out
+
+    def report(self, now: float, wall: float) -> str:
+        lines = ["\t".join(["state", "path", "pid", "size_mb", "read_mb", "pct", "mb_s", "eta_s", "finish_at", "stalled_s", "started"])]
+        for path, st in self.active.items():
+            pct, rate, eta, stalled = self._stats(st, now)
+            lines.append("\t".join(map(str, [
+                "reading", path, st["pid"], round(st["size"] / 1024 / 1024, 1), round(st["pos"] / 1024 / 1024, 1),
+                round(pct, 2) if pct is not None else None,
+                round(rate / 1024 / 1024, 3) if rate is not None else None, eta,
+                datetime.fromtimestamp(wall + eta).isoformat(timespec="seconds") if eta is not None else None,
+                round(stalled, 1), datetime.fromtimestamp(st["start"]).isoformat(timespec="seconds"),
+            ])))
+        for path, size, pos, start, end in reversed(self.done):
+            lines.append("\t".join(map(str, [
+                "closed", path, None, round(size / 1024 / 1024, 1), round(pos / 1024 / 1024, 1),
+                round(pos * 100.0 / size, 2) if size else None,
+                round(pos / 1024 / 1024 / (end - start), 3) if end > start else None, None,
+                datetime.fromtimestamp(end).isoformat(timespec="seconds"), None,
+                datetime.fromtimestamp(start).isoformat(timespec="seconds"),
+            ])))
+        return "\n".join(lines) + "\n"
+
+
+def prom_value(v) -> str:
+    # None is unknown (no trend or progress yet, or not heading there): NaN, not an infinite ETA
+    return "NaN" if v is None else str(v)
+
+
+class Histogram:
+    """Cumulative Prometheus histogram over fixed upper bounds."""
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * len(self.bounds)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float) -> None:
+        for i, b in enumerate(self.bounds):
+            if v <= b:
+                self.counts[i] += 1
+                break
+        self.sum += v
+        self.count += 1
+
+    def lines(self, name: str, labels: str):
+        out = [f"# TYPE {name} histogram"]
+        acc = 0
+        for b, c in zip(self.bounds, self.counts):
+            acc += c
+            out.append(f'{name}_bucket{{le="{int(b) if float(b).is_integer() else b}",{labels}}} {acc}')
+        out.append(f'{name}_bucket{{le="+Inf",{labels}}} {self.count}')
+        out.append(f"{name}_sum{{{labels}}} {round(self.sum, 3)}")
+        out.append(f"{name}_count{{{labels}}} {self.count}")
+        return out
+
+
+class MetricsServer:
+    """Serves the latest metrics text at http://<addr>:<port>/metrics from a daemon thread.
+
+    The main loop hands over a finished exposition with ``set()``; scrapes never touch
+    the filesystem or wait for a tick.
+    """
+
+    def __init__(self, addr: str, port: int):
+        self._body = b""
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = server.body()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((addr, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+
+    def set(self, text: str) -> None:
+        body = text.encode()
+        with self._lock:
+            self._body = body
+
+    def body(self) -> bytes:
+        with self._lock:
+            return self._body
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class Collector:
+    """Runs one collection function on its own daemon thread.
+
+    Periodic collectors (``period_s`` > 0) run on an absolute monotonic deadline and skip
+    missed slots instead of bunching up. ``request()`` asks for a run now; ``wait()`` blocks
+    for that run at most ``timeout_s`` and otherwise returns the previous result, so a slow
+    or hung collector (statvfs on a stuck mount, a huge process table) never holds up a tick.
+    """
+
+    def __init__(self, name: str, fn, period_s: float = 0.0):
+        self.name = name
+        self.fn = fn
+        self.period_s = period_s
+        self.result = None
+        self.latency_s = None
+        self.runs = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.cpu_s = 0.0
+        self.paused = False
+        self._done = 0
+        self._running = False
+        self._pending = False
+        self._stop = False
+        self._cv = threading.Condition()
+        self._thread = threading.Thread(target=self._loop, name=f"collector-{name}", daemon=True)
+        self._thread.start()
+
+    def _loop(self) -> None:
+        next_at = time.monotonic()
+        while True:
+            with self._cv:
+                while True:
+                    if self._stop:
+                        return
+                    due = self.period_s > 0 and time.monotonic() >= next_at
+                    if not self.paused and (self._pending or due):
+                        break
+                    self._cv.wait(None if self.paused or self.period_s <= 0 else max(0.0, next_at - time.monotonic()))
+                self._pending = False
+                self._running = True
+            t0, c0 = time.monotonic(), time.thread_time()
+            try:
+                result, ok = self.fn(), True
+            except Exception:
+                result, ok = None, False
+            latency = time.monotonic() - t0
+            self.cpu_s += time.thread_time() - c0
+            with self._cv:
+                if ok:
+                    self.result = result
+                else:
+                    self.errors += 1
+                self.latency_s = latency
+                self.runs += 1
+                self._done += 1
+                self._running = False
+                self._cv.notify_all()
+            if self.period_s > 0:
+                now = time.monotonic()
+                while next_at <= now:
+                    next_at += self.period_s
+
+    def request(self) -> int:
+        """Ask for a run as soon as the thread is free; returns a ticket for ``wait()``."""
+        with self._cv:
+            self._pending = True
+            self._cv.notify_all()
+            # A run already in progress started before this request; wait for the one after it
+            return self._done + (2 if self._running else 1)
+
+    def wait(self, ticket: int, timeout_s: float):
+        """(latest result, fresh); fresh is False when the requested run did not finish in time."""
+        with self._cv:
+            fresh = self._cv.wait_for(lambda: self._done >= ticket, timeout_s)
+            if not fresh:
+                self.timeouts += 1
+            return self.result, fresh
+
+    def configure(self, period_s: float = None, paused: bool = None) -> None:
+        """Change the cadence or pause/resume; a paused collector ignores its schedule and requests."""
+        with self._cv:
+            if period_s is not None:
+                self.period_s = period_s
+            if paused is not None:
+                self.paused = paused
+            self._cv.notify_all()
+
+    def stop(self, join_s: float = 1.0) -> None:
+        with self._cv:
+            self._stop = True
+            self._cv.notify_all()
+        self._thread.join(join_s)
+
+
+class OverheadGovernor:
+    """Keeps the monitor's own CPU under ``budget_pct`` of one core by shedding optional work.
+
+    Usage is process CPU time (all threads) over a rolling window. Above the budget the
+    degrade level rises by one once at least ``window_s / 5`` of data has been seen at the
+    current level; below half the budget it falls by one after a full ``window_s``, so the
+    monitor sheds work quickly and restores it cautiously.
+    """
+
+    MAX_LEVEL = 3
+
+    def __init__(self, budget_pct: float, window_s: float = 300.0):
+        self.budget_pct = budget_pct
+        self.window_s = window_s
+        self.level = 0
+        self.usage_pct = None
+        self._pts = deque()
+
+    def update(self, now: float, cpu_s: float) -> bool:
+        """Add a (monotonic time, process CPU seconds) point; returns True when the level changed."""
+        self._pts.append((now, cpu_s))
+        while len(self._pts) > 2 and now - self._pts[1][0] >= self.window_s:
+            self._pts.popleft()
+        t0, c0 = self._pts[0]
+        span = now - t0
+        if span <= 0:
+            return False
+        self.usage_pct = round((cpu_s - c0) / span * 100, 3)
+        if self.budget_pct <= 0:
+            return False
+        level = self.level
+        if self.usage_pct > self.budget_pct and span >= self.window_s / 5:
+            level = min(self.MAX_LEVEL, level + 1)
+        elif self.usage_pct < self.budget_pct / 2 and span >= self.window_s:
+            level = max(0, level - 1)
+        if level == self.level:
+            return False
+        self.level = level
+        # Judge the new level on its own samples only
+        self._pts = deque([(now, cpu_s)])
+        return True
+
+
+def process_label(row) -> str:
+    """Short name of an AltAnalyze tree root for events: the matching script, else the process name."""
+    for script in ("AltAnalyze.sh", "AltAnalyze.py", "bam_to_bed"):
+        if script in row["cmdline"]:
+            return script
+    if is_archive(row):
+        return "tar"
+    return row["name"]
+
+
+class EventLog:
+    """Deduplicated events written to ``events.jsonl``, each carrying the sample that triggered it.
+
+    Threshold conditions begin when a value crosses its limit and end only once it is back
+    past the limit by the ``hysteresis`` fraction, so a value hovering at the limit gives one
+    begin/end pair instead of an event per tick. Throttling begins when ``nr_throttled``
+    rises and ends after ``clear_samples`` samples without a rise. OOM counters yield one
+    event per increase, and AltAnalyze tree roots are reported as they start, exit and
+    start again under the same name.
+    """
+
+    def __init__(self, log: "LineLog", hysteresis: float = 0.1, clear_samples: int = 3, sync: bool = False):
+        self.log = log
+        self.hysteresis = max(0.0, hysteresis)
+        self.clear_samples = max(1, clear_samples)
+        self.sync = sync
+        self.active = {}
+        self.counts = {}
+        self._last = {}
+        self._roots = None
+        self._exited = {}
+        self._dirty = False
+
+    def emit(self, name: str, state: str, t: float, record, severity: str = "info", **detail) -> None:
+        ts = datetime.fromtimestamp(t).isoformat(timespec="seconds")
+        self.log.append(json.dumps({"ts": ts, "event": name, "state": state, "severity": severity,
+                                    **detail, "sample": record}))
+        if state != "end":
+            self.counts[name] = self.counts.get(name, 0) + 1
+        self._dirty = True
+        if severity != "info":
+            what = ", ".join(f"{k}={v}" for k, v in detail.items())
+            print(f"[{ts}] {severity.upper()}: {name} {state} ({what})", file=sys.stderr)
+
+    def threshold(self, name: str, t: float, value, limit: float, record, below: bool = False,
+                  severity: str = "warning") -> None:
+        if value is None:
+            return
+        st = self.active.get(name)
+        if st is None:
+            if (value <= limit) if below else (value >= limit):
+                self.active[name] = {"since": t, "worst": value}
+                self.emit(name, "begin", t, record, severity, value=value, threshold=limit)
+            return
+        st["worst"] = min(st["worst"], value) if below else max(st["worst"], value)
+        if (value > limit * (1 + self.hysteresis)) if below else (value < limit * (1 - self.hysteresis)):
+            del self.active[name]
+            self.emit(name, "end", t, record, value=value, threshold=limit, worst=st["worst"],
+                      duration_s=round(t - st["since"], 1))
+
+    def _delta(self, name: str, value):
+        last, self._last[name] = self._last.get(name), value
+        if value is None or last is None or value < last:
+            return None
+        return value - last
+
+    def counter(self, name: str, t: float, value, record, severity: str = "critical") -> None:
+        """One event per increase of a cumulative counter (the first sample is the baseline)."""
+        delta = self._delta(name, value)
+        if delta:
+            self.emit(name, "occurred", t, record, severity, count=delta, total=value)
+
+    def rising(self, name: str, t: float, value, record, severity: str = "warning") -> None:
+        """Begin on an increase of a cumulative counter; end after ``clear_samples`` quiet samples."""
+        delta = self._delta(name, value)
+        if delta is None:
+            return
+        st = self.active.get(name)
+        if delta > 0:
+            if st is None:
+                self.active[name] = {"since": t, "total": delta, "quiet": 0}
+                self.emit(name, "begin", t, record, severity, count=delta)
+            else:
+                st["total"] += delta
+                st["quiet"] = 0
+        elif st is not None:
+            st["quiet"] += 1
+            if st["quiet"] >= self.clear_samples:
+                del self.active[name]
+                self.emit(name, "end", t, record, count=st["total"], duration_s=round(t - st["since"], 1))
+
+    def processes(self, t: float, roots, record) -> None:
+        """Start/exit/restart of AltAnalyze tree roots; ``roots`` is None when the scan is stale."""
+        if roots is None:
+            return
+        cur = {(r["pid"], r["create_time"]): r for r in roots}
+        first = self._roots is None
+        prev = self._roots or {}
+        for key, label in prev.items():
+            if key not in cur:
+                self._exited[label] = t
+                self.emit("process_exit", "occurred", t, record, pid=key[0], process=label,
+                          runtime_s=round(t - key[1], 1))
+        nxt = {}
+        for key, r in cur.items():
+            nxt[key] = label = prev.get(key) or process_label(r)
+            if key in prev:
+                continue
+            if label in self._exited:
+                self.emit("process_restart", "occurred", t, record, pid=r["pid"], process=label,
+                          down_s=round(t - self._exited.pop(label), 1))
+            else:
+                self.emit("process_start", "occurred", t, record, pid=r["pid"], process=label,
+                          cmdline=r["cmdline"][:200], already_running=first)
+        self._roots = nxt
+
+    def flush(self) -> None:
+        if self._dirty:
+            self._dirty = False
+            try:
+                self.log.flush(sync=self.sync)
+            except Exception as e:
+                print(f"flush of {self.log.path} failed: {e}", file=sys.stderr)
+
+
+class StackSampler:
+    """Low-rate Python stack samples of the AltAnalyze tree, folded per pipeline phase.
+
+    Each ``capture()`` runs ``py-spy record --nonblocking`` (the targets are never paused)
+    for ``duration_s`` on the busiest Python processes of the tree at once, and merges the
+    folded stacks into ``<out_dir>/<phase>.folded`` (``frame;frame;... count``, function
+    level), ready for ``flamegraph.pl`` or speedscope. Counts accumulate across captures
+    and monitor restarts. Sampling stops after three failed captures in a row (typically
+    a missing ``SYS_PTRACE`` capability).
+    """
+
+    def __init__(self, exe: str, out_dir: str, duration_s: float = 2.0, rate_hz: int = 20, max_procs: int = 2):
+        self.exe = exe
+        self.out_dir = out_dir
+        self.duration_s = max(1.0, duration_s)
+        self.rate_hz = max(1, rate_hz)
+        self.max_procs = max(1, max_procs)
+        self.enabled = True
+        self.samples = 0
+        self.failures = 0
+        self.stacks = {}
+
+    @staticmethod
+    def targets(members, k: int):
+        """Pids of the ``k`` busiest Python processes among ``members``."""
+        py = [r for r in members
+              if r["name"].startswith("python") or os.path.basename(r["cmdline"].split(" ", 1)[0]).startswith("python")]
+        py.sort(key=lambda r: r["cpu_percent"] or 0.0, reverse=True)
+        return [r["pid"] for r in py[:k]]
+
+    def _load(self, phase: str):
+        counts = {}
+        try:
+            with open(os.path.join(self.out_dir, f"{phase}.folded")) as f:
+                for line in f:
+                    stack, _, n = line.rstrip("\n").rpartition(" ")
+                    if stack and n.isdigit():
+                        counts[stack] = int(n)
+        except OSError:
+            pass
+        return counts
+
+    def capture(self, members, phase: str) -> int:
+        """Sample the tree's Python processes for ``duration_s``; returns the samples merged."""
+        pids = self.targets(members, self.max_procs)
+        if not self.enabled or not pids or not phase:
+            return 0
+        os.makedirs(self.out_dir, exist_ok=True)
+        jobs = []
+        for pid in pids:
+            out = os.path.join(self.out_dir, f".capture.{pid}.txt")
+            cmd = [self.exe, "record", "--pid", str(pid), "--duration", str(int(self.duration_s)),
+                   "--rate", str(self.rate_hz), "--format", "raw", "--nolineno", "--nonblocking", "--output", out]
+            try:
+                jobs.append((pid, out, subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE), None))
+            except OSError as e:
+                jobs.append((pid, out, None, str(e)))
+        got = 0
+        errors = []
+        for pid, out, proc, err in jobs:
+            if proc is None:
+                errors.append(err)
+                continue
+            try:
+                _, stderr = proc.communicate(timeout=self.duration_s + 30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                _, stderr = proc.communicate()
+            try:
+                with open(out) as f:
+                    text = f.read()
+                os.remove(out)
+            except OSError:
+                text = ""
+            if proc.returncode != 0 and not text:
+                # A target that exited during the capture is not a failure
+                if os.path.exists(f"/proc/{pid}"):
+                    lines = (stderr or b"").decode(errors="replace").strip().splitlines()
+                    errors.append(next((ln for ln in lines if "rror" in ln), lines[0] if lines else f"exit {proc.returncode}"))
+                continue
+            counts = self.stacks.get(phase)
+            if counts is None:
+                counts = self.stacks[phase] = self._load(phase)
+            for line in text.splitlines():
+                stack, _, n = line.rpartition(" ")
+                if stack and n.isdigit():
+                    counts[stack] = counts.get(stack, 0) + int(n)
+                    got += int(n)
+        if got:
+            self.failures = 0
+            self.samples += got
+            counts = self.stacks[phase]
+            write_atomic(os.path.join(self.out_dir, f"{phase}.folded"),
+                         "".join(f"{k} {v}\n" for k, v in sorted(counts.items(), key=lambda kv: -kv[1])))
+        elif errors:
+            self.failures += 1
+            if self.failures == 1 or self.failures >= 3:
+                print(f"stack sampling failed: {errors[0]}", file=sys.stderr)
+            if self.failures >= 3:
+                print("stack sampling disabled after repeated failures", file=sys.stderr)
+                self.enabled = False
+        return got
+
+
+def gce_preempted(url: str = PREEMPT_URL, timeout: float = 0.5):
+    """True/False from the GCE metadata server; None off GCE or when it does not answer in time."""
+    if not url:
+        return None
+    try:
+        req = urllib.request.Request(url, headers={"Metadata-Flavor": "Google"})
+        with urllib.request.urlopen(req, timeout=timeout) as r:
+            return r.read().decode().strip().upper() == "TRUE"
+    except Exception:
+        return None
+
+
+class FlightRecorder:
+    """Ring buffer of the last minutes at 1 s resolution, dumped to ``flight/`` when something goes wrong.
+
+    ``sample()`` runs once a second on its own collector thread and reads only cheap files:
+    /proc/loadavg, /proc/meminfo, /proc/stat, this container's cgroup and the
+    /proc/<pid>/stat of the AltAnalyze tree: the roots and members found by the last
+    process scan plus, through /proc/<pid>/task/<pid>/children, workers started since.
+    An increase of the cgroup ``oom_kill`` counter dumps right away; ``request()`` (SIGUSR1)
+    dumps on the next sample and the main loop dumps on an unexpected SIGTERM or when the
+    task reports a non-zero exit status through the stop file. Each dump is one JSONL
+    file written atomically; at most ``max_dumps`` are written besides the one at exit.
+    """
+
+    CG_KEYS = ("cg_mem_current_mb", "cg_mem_working_set_mb", "cg_mem_anon_mb", "cg_cpu_cores", "cg_throttled_pct",
+               "cg_oom_kill", "cg_nr_throttled",
+               "psi_cpu_some", "psi_mem_some", "psi_mem_full", "psi_io_some")
+
+    def __init__(self, out_dir: str, seconds: float, max_dumps: int):
+        self.out_dir = out_dir
+        self.max_dumps = max_dumps
+        self.dumps = 0
+        self.roots = []
+        self.members = []
+        self.reader = ProcReader()
+        self.cgroup = CgroupSampler(self.reader)
+        self._buf = deque(maxlen=max(10, int(seconds)))
+        self._lock = threading.Lock()
+        self._requested = None
+        self._prev_cpu = None
+        self._ticks = {}
+        self._last_oom = None
+
+    def request(self, reason: str) -> None:
+        self._requested = reason
+
+    def _host(self, rec) -> None:
+        try:
+            rec["load1"] = float(self.reader.read("/proc/loadavg").split()[0])
+        except (OSError, ValueError, IndexError):
+            pass
+        try:
+            mi = parse_kv(self.reader.read("/proc/meminfo"))
+            rec["mem_used_mb"] = round((mi["MemTotal"] - mi["MemAvailable"]) / 1024, 1)
+        except (OSError, KeyError):
+            pass
+        try:
+            f = [int(x) for x in self.reader.read("/proc/stat").split(b"\n", 1)[0].split()[1:]]
+            total, idle = sum(f[:8]), f[3] + f[4]
+            if self._prev_cpu is not None and total > self._prev_cpu[0]:
+                rec["cpu_pct"] = round(100.0 * (1 - (idle - self._prev_cpu[1]) / (total - self._prev_cpu[0])), 1)
+            self._prev_cpu = (total, idle)
+        except (OSError, ValueError, IndexError):
+            pass
+
+    def _pids(self):
+        pids = set(self.members)
+        stack = list(self.roots)
+        while stack:
+            pid = stack.pop()
+            pids.add(pid)
+            try:
+                kids = self.reader.read_once(f"/proc/{pid}/task/{pid}/children").split()
+            except OSError:
+                continue
+            stack.extend(int(k) for k in kids if int(k) not in pids)
+        pids.discard(os.getpid())
+        return pids
+
+    def _tree(self, rec, now: float) -> None:
+        cpu, rss, alive = 0.0, 0, 0
+        ticks = {}
+        for pid in self._pids():
+            try:
+                stat = self.reader.read_once(f"/proc/{pid}/stat")
+            except OSError:
+                continue
+            f = stat[stat.rfind(b")") + 2:].split()
+            if len(f) < 22:
+                continue
+            key = (pid, int(f[19]))
+            ticks[key] = (int(f[11]) + int(f[12]), now)
+            prev = self._ticks.get(key)
+            if prev is not None and now > prev[1]:
+                cpu += (ticks[key][0] - prev[0]) / _CLK_TCK / (now - prev[1]) * 100.0
+            rss += int(f[21]) * _PAGE_SIZE
+            alive += 1
+        self._ticks = ticks
+        rec.update(alt_cpu=round(cpu, 1), alt_rss_mb=round(rss / 1024 / 1024, 1), alt_procs=alive)
+
+    def sample(self):
+        now = time.monotonic()
+        rec = {"ts": datetime.now().isoformat(timespec="milliseconds")}
+        self._host(rec)
+        try:
+            cg = self.cgroup.sample()[0]
+            rec.update((k, cg.get(k)) for k in self.CG_KEYS)
+        except Exception:
+            cg = {}
+        self._tree(rec, now)
+        with self._lock:
+            self._buf.append(rec)
+        reason, self._requested = self._requested, None
+        oom = cg.get("cg_oom_kill")
+        if oom is not None and self._last_oom is not None and oom > self._last_oom:
+            reason = "oom_kill"
+        if oom is not None:
+            self._last_oom = oom
+        if reason:
+            self.dump(reason)
+        return len(self._buf)
+
+    def dump(self, reason: str, final: bool = False):
+        """Write the buffer to ``flight/<time>-<reason>.jsonl``; returns the path, or None past ``max_dumps``."""
+        with self._lock:
+            if not final and self.dumps >= self.max_dumps:
+                return None
+            recs = list(self._buf)
+            self.dumps += 1
+        if not recs:
+            return None
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, f"{datetime.now():%Y%m%dT%H%M%S}-{reason}.jsonl")
+        if os.path.exists(path):
+            path = path[:-len(".jsonl")] + f"-{self.dumps}.jsonl"
+        write_atomic(path, "".join(json.dumps(r) + "\n" for r in recs), sync=True)
+        print(f"[{datetime.now().isoformat()}] flight recorder: {len(recs)} s written to {path} ({reason})",
+              file=sys.stderr)
+        return path
+
+
+class Checkpoint:
+    """``checkpoint.json``: the run's state so far, small enough to rewrite every minute.
+
+    Holds the last sample, cumulative counters, the phases reached and peaks, plus a
+    ``status``: ``running`` while sampling, then ``finished`` (sample limit reached, or
+    stopped by the task through the stop file, whose exit status goes to ``task_exit``),
+    ``terminated`` (any other SIGTERM: abort or preemption; ``preempted`` says which when
+    the GCE metadata server answers), ``interrupted`` or ``failed``. Written atomically,
+    so a VM that disappears mid-write still leaves the previous checkpoint.
+    """
+
+    def __init__(self, path: str, context: dict):
+        self.path = path
+        self.state = {"status": "running", "start_ts": datetime.fromtimestamp(START_TIME).isoformat(), **context}
+        self._last_write = None
+
+    def update(self, record, **fields) -> None:
+        self.state.update(fields)
+        self.state["ts"] = record.get("ts")
+        self.state["wall_s"] = round(time.time() - START_TIME, 1)
+        self.state["last_sample"] = record
+
+    def due(self, now_m: float, period_s: float) -> bool:
+        return self._last_write is None or now_m - self._last_write >= period_s
+
+    def write(self, status: str = None, sync: bool = False, **fields) -> None:
+        if status is not None:
+            self.state["status"] = status
+            self.state["end_ts"] = datetime.now().isoformat()
+            self.state["wall_s"] = round(time.time() - START_TIME, 1)
+        self.state.update(fields)
+        write_atomic(self.path, json.dumps(self.state) + "\n", sync=sync)
+        self._last_write = time.monotonic()
+
+
+def self_rss_mb():
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return round(int(f.read().split()[1]) * _PAGE_SIZE / 1024 / 1024, 1)
+    except Exception:
+        pass
+    try:
+        import resource
+        # ru_maxrss is the peak, in KiB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+    except Exception:
+        return None
+
+
+def df_gb(path: str):
+    """(used GB, free GB) of the filesystem holding ``path``; Nones when it cannot be read."""
+    try:
+        st = os.statvfs(path)
+        used = (st.f_blocks - st.f_bfree) * st.f_frsize
+        free = st.f_bavail * st.f_frsize
+        return round(used / 1024 / 1024 / 1024, 1), round(free / 1024 / 1024 / 1024, 1)
+    except Exception:
+        return None, None
+
+
+def write_largest(largest: "LargestFiles") -> None:
+    """Heavy sampling: key-directory usage plus one budgeted step of the largest-files walk."""
+    ts = datetime.now().isoformat()
+    # limited and simple to avoid large overheads
+    key_dirs = [CR_ROOT, os.environ.get("TMPDIR", "/tmp"), "/mnt/bam", "/mnt/altanalyze_output", "/cromwell_root"]
+    lines = [f"[{ts}] du -sk key dirs (MB):\n"]
+    for d in key_dirs:
+        try:
+            st = os.statvfs(d)
+            used_mb = int(((st.f_blocks - st.f_bfree) * st.f_frsize) / 1024 / 1024)
+            lines.append(f"{used_mb:10d} MB\t{d}\n")
+        except Exception:
+            pass
+    # Resume the incremental walk within a fixed time budget
+    largest.step(SCAN_BUDGET_MS / 1000.0)
+    lines.extend(largest.report(ts))
+    write_atomic(LARGEST_TXT, "".join(lines))
+
+
+class Shutdown(Exception):
+    pass
+
+
+_stop_requested = False
+_sleeping = False
+
+
+def _on_term(signum, frame):
+    # Interrupt only the sleep; a tick in progress finishes and the loop exits after it
+    global _stop_requested
+    _stop_requested = True
+    if _sleeping:
+        raise Shutdown()
+
+
+def _on_usr1(signum, frame):
+    # Replaced by the flight recorder's handler when it runs; unhandled, SIGUSR1 would kill the
+    # monitor before it flushes its logs and writes the final checkpoint
+    pass
+
+
+def read_stop_file():
+    """The exit status the task left in ``stop`` before stopping the monitor (0 for an empty
+    file), or None when the SIGTERM did not come from the task itself."""
+    try:
+        with open(STOP_FILE) as f:
+            text = f.read().strip()
+        return int(text) if text else 0
+    except (OSError, ValueError):
+        return None
+
+
+def sleep_or_stop(secs: float) -> None:
+    global _sleeping
+    if _stop_requested:
+        raise Shutdown()
+    _sleeping = True
+    try:
+        time.sleep(secs)
+    finally:
+        _sleeping = False
+
+
+def task_context_from_path(path: str):
+    """(call, shard, attempt) from the Cromwell execution path components in ``path``."""
     call = shard = attempt = ""
-    parts = cwd.split("/")
-    for i, p in enumerate(parts):
+    for p in path.split("/"):
         if p.startswith("call-"):
             call = p[len("call-"):]
         elif p.startswith("shard-"):
             shard = p[len("shard-"):]
         elif p.startswith("attempt-"):
             attempt = p[len("attempt-"):]
+    return call, shard, attempt
+
+
+def detect_task_context():
+    cwd = os.getcwd()
+    call, shard, attempt = task_context_from_path(cwd)
     return call, shard, attempt, cwd
 
 
-def read_cgroup_limits():
+class CgroupSampler:
+    """Per-tick cgroup sampling: memory.current/max, memory.stat, OOM and CPU throttling counters
+    and pressure-stall (PSI) files.
+
+    Files are located once (cgroup v2 first, then v1; PSI falls back to the
+    system-wide /proc/pressure) and re-read every tick through a ProcReader.
+    PSI is reported as the percent of wall time stalled since the previous tick,
+    computed from the cumulative ``total=`` microsecond counters.
+
+    These are the task's own numbers on a shared VM, unlike load average and host memory:
+    CPU cores used (``cpu.stat`` usage deltas) against the ``cpu.max`` quota (else the
+    cpuset, else the host CPUs), the working set (``memory.current`` minus inactive page
+    cache, what the kernel cannot reclaim before an OOM kill) against ``memory.max``, and
+    the share of CFS periods throttled since the previous tick.
+    """
+
+    PSI_NAMES = {"cpu": "cpu", "memory": "mem", "io": "io"}
+
+    def __init__(self, reader: "ProcReader" = None, path: str = ""):
+        """``path`` is a cgroup relative to the hierarchy root (e.g. ``/docker/<id>``, for
+        host mode); the default reads the cgroup files mounted for this container."""
+        self.reader = reader or ProcReader()
+        self.path = path
+        v2 = CGROUP_ROOT + path
+        v1 = {ctrl: f"{CGROUP_ROOT}/{ctrl}{path}" for ctrl in ("memory", "cpu", "cpuacct", "cpu,cpuacct", "blkio")}
+        self.mem_current = self.mem_max = self.mem_stat = self.mem_peak = None
+        self.stat_keys = {}
+        self.cpu_usage = self.io_stat = None
+        self.cpu_max = None
+        self.cpuset = None
+        if os.path.exists(f"{v2}/memory.current") or os.path.exists(f"{v2}/cgroup.controllers"):
+            self.mem_current = f"{v2}/memory.current"
+            self.mem_max = f"{v2}/memory.max"
+            self.mem_peak = f"{v2}/memory.peak"
+            self.mem_stat = f"{v2}/memory.stat"
+            self.stat_keys = {"anon": "anon", "file": "file", "file_dirty": "dirty", "file_writeback": "writeback",
+                              "inactive_file": "inactive_file"}
+            self.cpu_usage = (f"{v2}/cpu.stat", "usage_usec", 1e6)
+            self.io_stat = f"{v2}/io.stat"
+            self.cpu_max = (f"{v2}/cpu.max",)
+            self.cpuset = f"{v2}/cpuset.cpus.effective"
+        elif os.path.exists(f"{v1['memory']}/memory.usage_in_bytes"):
+            self.mem_current = f"{v1['memory']}/memory.usage_in_bytes"
+            self.mem_max = f"{v1['memory']}/memory.limit_in_bytes"
+            self.mem_peak = f"{v1['memory']}/memory.max_usage_in_bytes"
+            self.mem_stat = f"{v1['memory']}/memory.stat"
+            self.stat_keys = {"rss": "anon", "cache": "file", "dirty": "dirty", "writeback": "writeback",
+                              "total_inactive_file": "inactive_file"}
+            for ctrl in ("cpuacct", "cpu,cpuacct"):
+                if os.path.exists(f"{v1[ctrl]}/cpuacct.usage"):
+                    self.cpu_usage = (f"{v1[ctrl]}/cpuacct.usage", None, 1e9)
+                    break
+            self.io_stat = f"{v1['blkio']}/blkio.throttle.io_service_bytes"
+            for ctrl in ("cpu", "cpu,cpuacct"):
+                if os.path.exists(f"{v1[ctrl]}/cpu.cfs_quota_us"):
+                    self.cpu_max = (f"{v1[ctrl]}/cpu.cfs_quota_us", f"{v1[ctrl]}/cpu.cfs_period_us")
+                    break
+            self.cpuset = f"{CGROUP_ROOT}/cpuset{path}/cpuset.effective_cpus"
+        for name in ("mem_current", "mem_max", "mem_stat", "io_stat"):
+            if getattr(self, name) and not os.path.exists(getattr(self, name)):
+                setattr(self, name, None)
+        if self.cpu_usage and not os.path.exists(self.cpu_usage[0]):
+            self.cpu_usage = None
+        if self.cpu_max and not all(os.path.exists(x) for x in self.cpu_max):
+            self.cpu_max = None
+        if self.cpuset and not os.path.exists(self.cpuset):
+            self.cpuset = None
+        # OOM and CPU throttling counters: (path, {file key: field}), cumulative since cgroup creation
+        self.counters = []
+        for cpath, keys in ((f"{v2}/memory.events", {"oom": "cg_oom", "oom_kill": "cg_oom_kill"}),
+                            (f"{v1['memory']}/memory.oom_control", {"oom_kill": "cg_oom_kill"}),
+                            (f"{v2}/cpu.stat", {"nr_periods": "cg_nr_periods", "nr_throttled": "cg_nr_throttled",
+                                                "throttled_usec": "cg_throttled_s"}),
+                            (f"{v1['cpu']}/cpu.stat", {"nr_periods": "cg_nr_periods", "nr_throttled": "cg_nr_throttled",
+                                                       "throttled_time": "cg_throttled_s"}),
+                            (f"{v1['cpu,cpuacct']}/cpu.stat", {"nr_periods": "cg_nr_periods", "nr_throttled": "cg_nr_throttled",
+                                                               "throttled_time": "cg_throttled_s"})):
+            if os.path.exists(cpath) and not any(set(keys.values()) & set(k.values()) for _, k in self.counters):
+                self.counters.append((cpath, keys))
+        self.psi = {}
+        for res in self.PSI_NAMES:
+            # The system-wide fallback would misattribute pressure to a task cgroup in host mode
+            for ppath in (f"{v2}/{res}.pressure",) + (() if path else (f"/proc/pressure/{res}",)):
+                if os.path.exists(ppath):
+                    self.psi[res] = ppath
+                    break
+        self._prev_cpu = None
+        self._prev_periods = None
+        if self.mem_peak and not os.path.exists(self.mem_peak):
+            self.mem_peak = None
+        self._peak_fd = None
+        self._peak_reset_ok = bool(self.mem_peak and self.mem_peak.endswith("memory.peak"))
+        self._prev_psi = {}
+        self._prev_t = None
+
+    def reset_peak(self) -> bool:
+        """Start a local peak window (cgroup v2 per-fd ``memory.peak`` reset, Linux 6.12+).
+
+        Only the peak seen through this monitor's own fd is reset; the cgroup-wide value
+        is untouched. Returns False (and stops trying) when the kernel does not support it;
+        the v1 ``max_usage_in_bytes`` reset is global and is never used.
+        """
+        if not self._peak_reset_ok:
+            return False
+        try:
+            if self._peak_fd is None:
+                self._peak_fd = os.open(self.mem_peak, os.O_RDWR)
+            os.write(self._peak_fd, b"reset\n")
+            return True
+        except OSError:
+            self._peak_reset_ok = False
+            if self._peak_fd is not None:
+                os.close(self._peak_fd)
+                self._peak_fd = None
+            return False
+
+    def local_peak(self):
+        """Peak bytes since the last ``reset_peak()``, or None without a local window."""
+        if self._peak_fd is None:
+            return None
+        try:
+            v = os.pread(self._peak_fd, 64, 0).strip()
+        except OSError:
+            return None
+        return int(v) if v.isdigit() else None
+
+    def _int(self, path):
+        try:
+            v = self.reader.read(path).strip()
+        except OSError:
+            return None
+        return int(v) if v.isdigit() else None
+
+    def cpu_limit(self):
+        """CPUs the cgroup may use: the ``cpu.max`` quota, else its cpuset, else the host's; None when unknown."""
+        try:
+            if self.cpu_max:
+                vals = [self.reader.read(x).split() for x in self.cpu_max]
+                quota, period = (vals[0] + [b""])[:2] if len(vals) == 1 else (vals[0][0], vals[1][0])
+                if quota.lstrip(b"-").isdigit() and period.isdigit() and int(quota) > 0 and int(period) > 0:
+                    return round(int(quota) / int(period), 2)
+        except (OSError, IndexError):
+            pass
+        try:
+            if self.cpuset:
+                n = 0
+                for part in self.reader.read(self.cpuset).decode().strip().split(","):
+                    lo, _, hi = part.partition("-")
+                    if lo.isdigit():
+                        n += int(hi) - int(lo) + 1 if hi.isdigit() else 1
+                if n:
+                    return float(n)
+        except OSError:
+            pass
+        return float(os.cpu_count()) if os.cpu_count() else None
+
+    def _psi(self, now: float):
+        out = {}
+        cur = {}
+        for res, path in self.psi.items():
+            try:
+                data = self.reader.read(path)
+            except OSError:
+                continue
+            for line in data.split(b"\n"):
+                f = line.split()
+                if not f:
+                    continue
+                kv = dict(x.split(b"=", 1) for x in f[1:] if b"=" in x)
+                key = f"psi_{self.PSI_NAMES[res]}_{f[0].decode()}"
+                try:
+                    cur[key] = int(kv[b"total"])
+                    out[key] = float(kv[b"avg10"])
+                except (KeyError, ValueError):
+                    continue
+        if self._prev_t is not None and now > self._prev_t:
+            dt_us = (now - self._prev_t) * 1e6
+            for key, total in cur.items():
+                if key in self._prev_psi:
+                    out[key] = round(min(100.0, max(0.0, (total - self._prev_psi[key]) * 100.0 / dt_us)), 2)
+        self._prev_psi, self._prev_t = cur, now
+        return out
+
+    def _cpu_io(self, now: float):
+        """cg_cpu_pct (percent of one core since the previous call) and cumulative cg_read_mb/cg_write_mb."""
+        out = {"cg_cpu_pct": None, "cg_read_mb": None, "cg_write_mb": None}
+        if self.cpu_usage:
+            path, key, scale = self.cpu_usage
+            try:
+                data = self.reader.read(path).decode()
+                used = None
+                if key is None:
+                    used = int(data.strip()) / scale
+                else:
+                    for line in data.splitlines():
+                        k, _, v = line.partition(" ")
+                        if k == key:
+                            used = int(v) / scale
+                if used is not None:
+                    if self._prev_cpu is not None and now > self._prev_cpu[0] and used >= self._prev_cpu[1]:
+                        out["cg_cpu_pct"] = round((used - self._prev_cpu[1]) * 100.0 / (now - self._prev_cpu[0]), 1)
+                    self._prev_cpu = (now, used)
+            except (OSError, ValueError):
+                pass
+        if self.io_stat:
+            try:
+                rd = wr = 0
+                for line in self.reader.read(self.io_stat).decode().splitlines():
+                    f = line.split()
+                    if self.io_stat.endswith("io.stat"):
+                        # "8:0 rbytes=.. wbytes=.. rios=.. ..."
+                        kv = dict(x.split("=", 1) for x in f[1:] if "=" in x)
+                        rd += int(kv.get("rbytes", 0))
+                        wr += int(kv.get("wbytes", 0))
+                    elif len(f) == 3 and f[1] in ("Read", "Write"):
+                        # v1: "8:0 Read 1234"
+                        if f[1] == "Read":
+                            rd += int(f[2])
+                        else:
+                            wr += int(f[2])
+                out["cg_read_mb"] = round(rd / 1024 / 1024, 1)
+                out["cg_write_mb"] = round(wr / 1024 / 1024, 1)
+            except (OSError, ValueError):
+                pass
+        return out
+
+    def sample(self):
+        """(record fields, memory.current bytes, memory limit bytes). Missing values are None."""
+        fields = {}
+        cur = self._int(self.mem_current) if self.mem_current else None
+        limit = self._int(self.mem_max) if self.mem_max else None
+        # cgroup v1 reports "unlimited" as a huge page-aligned number
+        if limit is not None and limit >= (1 << 60):
+            limit = None
+        fields["cg_mem_current_mb"] = round(cur / 1024 / 1024, 1) if cur is not None else None
+        peak = self._int(self.mem_peak) if self.mem_peak else None
+        fields["cg_mem_peak_mb"] = round(peak / 1024 / 1024, 1) if peak is not None else None
+        stat = {}
+        if self.mem_stat:
+            try:
+                for line in self.reader.read(self.mem_stat).split(b"\n"):
+                    k, _, v = line.partition(b" ")
+                    name = self.stat_keys.get(k.decode())
+                    if name and v.strip().isdigit():
+                        stat[name] = int(v)
+            except OSError:
+                pass
+        for name in ("anon", "file", "dirty", "writeback"):
+            fields[f"cg_mem_{name}_mb"] = round(stat[name] / 1024 / 1024, 1) if name in stat else None
+        # Working set: usage minus page cache the kernel can drop before it has to OOM-kill
+        ws = max(0, cur - stat.get("inactive_file", 0)) if cur is not None else None
+        fields["cg_mem_working_set_mb"] = round(ws / 1024 / 1024, 1) if ws is not None else None
+        fields["cg_mem_limit_mb"] = round(limit / 1024 / 1024, 1) if limit is not None else None
+        fields["cg_mem_util_pct"] = round(ws * 100.0 / limit, 1) if ws is not None and limit else None
+        fields.update(dict.fromkeys(("cg_oom", "cg_oom_kill", "cg_nr_throttled", "cg_throttled_s", "cg_nr_periods")))
+        for path, keys in self.counters:
+            try:
+                kv = dict(line.split(None, 1) for line in self.reader.read(path).decode().splitlines() if " " in line)
+            except (OSError, ValueError):
+                continue
+            for key, name in keys.items():
+                v = kv.get(key, "").strip()
+                if not v.isdigit():
+                    continue
+                # throttled_usec (v2) and throttled_time (v1, ns) are reported in seconds
+                fields[name] = round(int(v) / (1e6 if key == "throttled_usec" else 1e9), 3) if name == "cg_throttled_s" else int(v)
+        # Share of CFS periods since the previous tick in which the quota ran out
+        periods, throttled = fields.pop("cg_nr_periods"), fields.get("cg_nr_throttled")
+        fields["cg_throttled_pct"] = None
+        if periods is not None and throttled is not None:
+            prev, self._prev_periods = self._prev_periods, (periods, throttled)
+            if prev is not None and periods > prev[0] and throttled >= prev[1]:
+                fields["cg_throttled_pct"] = round((throttled - prev[1]) * 100.0 / (periods - prev[0]), 1)
+            elif prev is not None and periods == prev[0]:
+                fields["cg_throttled_pct"] = 0.0
+        fields.update(self._cpu_io(time.monotonic()))
+        limit_cores = self.cpu_limit()
+        fields["cg_cpu_limit_cores"] = limit_cores
+        fields["cg_cpu_cores"] = round(fields["cg_cpu_pct"] / 100.0, 2) if fields["cg_cpu_pct"] is not None else None
+        fields["cg_cpu_util_pct"] = round(fields["cg_cpu_pct"] / limit_cores, 1) \
+            if fields["cg_cpu_pct"] is not None and limit_cores else None
+        psi = self._psi(time.monotonic())
+        for res in self.PSI_NAMES.values():
+            for kind in ("some", "full"):
+                fields[f"psi_{res}_{kind}"] = psi.get(f"psi_{res}_{kind}")
+        return fields, cur, limit
+
+
+def block_device(path: str):
+    """Whole-disk name (e.g. ``sdb``, ``nvme0n1``, ``dm-0``) holding ``path``; None if unknown.
+
+    Container roots are overlayfs with no block device of their own; Docker bind-mounts
+    /etc/hostname from the host's docker directory, so its disk stands in for the boot disk.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    for dev in (st.st_dev, None):
+        if dev is None:
+            try:
+                dev = os.stat("/etc/hostname").st_dev
+            except OSError:
+                return None
+        sys_path = f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}"
+        if os.path.exists(sys_path):
+            real = os.path.realpath(sys_path)
+            if os.path.exists(os.path.join(real, "partition")):
+                real = os.path.dirname(real)
+            return os.path.basename(real)
+    return None
+
+
+class DeviceIO:
+    """IOPS, average await, queue depth and %util of the disks behind a set of paths.
+
+    Computed like iostat from /proc/diskstats deltas between ticks: completed IOs,
+    ms spent on reads+writes, weighted ms in queue and ms the device was busy.
+    Paths that do not resolve to a disk yet (e.g. a mount that appears later) are
+    retried every ``retry_s`` seconds.
+    """
+
+    def __init__(self, paths, retry_s: float = 60.0):
+        self.paths = dict(paths)
+        self.retry_s = retry_s
+        self.devices = {}
+        self.reader = ProcReader()
+        self._resolved_at = None
+        self._prev = {}
+        self._prev_t = None
+
+    def resolve(self, now: float) -> None:
+        if self._resolved_at is not None and (now - self._resolved_at < self.retry_s or all(self.devices.values())):
+            return
+        self._resolved_at = now
+        for label, path in self.paths.items():
+            if not self.devices.get(label):
+                self.devices[label] = block_device(path)
+
+    def sample(self):
+        """{label: {"disk_iops", "disk_await_ms", "disk_queue", "disk_util_pct"}}; values are None on the first call."""
+        now = time.monotonic()
+        self.resolve(now)
+        wanted = {d for d in self.devices.values() if d}
+        cur = {}
+        for line in self.reader.read("/proc/diskstats").split(b"\n"):
+            f = line.split()
+            if len(f) >= 14 and f[2].decode() in wanted:
+                # ios, ms reading + writing, ms busy, weighted ms in queue
+                cur[f[2].decode()] = (int(f[3]) + int(f[7]), int(f[6]) + int(f[10]), int(f[12]), int(f[13]))
+        stats = {}
+        dt = now - self._prev_t if self._prev_t is not None else 0.0
+        for dev, c in cur.items():
+            p = self._prev.get(dev)
+            if p is None or dt <= 0:
+                stats[dev] = dict.fromkeys(DEVICE_FIELDS)
+                continue
+            ios = c[0] - p[0]
+            stats[dev] = {
+                "disk_iops": round(ios / dt, 1),
+                "disk_await_ms": round((c[1] - p[1]) / ios, 2) if ios > 0 else 0.0,
+                "disk_queue": round((c[3] - p[3]) / (dt * 1000), 2),
+                "disk_util_pct": round(min(100.0, (c[2] - p[2]) / (dt * 10)), 1),
+            }
+        self._prev, self._prev_t = cur, now
+        empty = dict.fromkeys(DEVICE_FIELDS)
+        return {label: stats.get(dev, empty) for label, dev in self.devices.items()}
+
+
+def read_cgroup_limits(path: str = ""):
+    """(CPU limit cores, memory limit MB, memory usage MB) of this container, or of the cgroup
+    ``path`` relative to the hierarchy root (host mode)."""
     cpu_limit = None
     mem_limit = None
     mem_current = None
     try:
         # cgroup v2
-        if os.path.exists("/sys/fs/cgroup/cpu.max"):
-            with open("/sys/fs/cgroup/cpu.max", "r") as f:
+        if os.path.exists(f"{CGROUP_ROOT}{path}/cpu.max"):
+            with open(f"{CGROUP_ROOT}{path}/cpu.max", "r") as f:
                 parts = f.read().strip().split()
             if len(parts) == 2 and parts[0].isdigit() and parts[1].isdigit():
                 quota = float(parts[0])
                 period = float(parts[1])
                 if period > 0:
                     cpu_limit = round(quota / period, 2)
-        elif os.path.exists("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") and os.path.exists("/sys/fs/cgroup/cpu/cpu.cfs_period_us"):
-            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "r") as f:
+        elif os.path.exists(f"{CGROUP_ROOT}/cpu{path}/cpu.cfs_quota_us") and os.path.exists(f"{CGROUP_ROOT}/cpu{path}/cpu.cfs_period_us"):
+            with open(f"{CGROUP_ROOT}/cpu{path}/cpu.cfs_quota_us", "r") as f:
                 quota = float(f.read().strip())
-            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us", "r") as f:
+            with open(f"{CGROUP_ROOT}/cpu{path}/cpu.cfs_period_us", "r") as f:
                 period = float(f.read().strip())
             if quota > 0 and period > 0:
                 cpu_limit = round(quota / period, 2)
     except Exception:
         pass
     try:
-        if os.path.exists("/sys/fs/cgroup/memory.max"):
-            with open("/sys/fs/cgroup/memory.max", "r") as f:
+        if os.path.exists(f"{CGROUP_ROOT}{path}/memory.max"):
+            with open(f"{CGROUP_ROOT}{path}/memory.max", "r") as f:
                 mx = f.read().strip()
-            with open("/sys/fs/cgroup/memory.current", "r") as f:
+            with open(f"{CGROUP_ROOT}{path}/memory.current", "r") as f:
                 cur = f.read().strip()
             if mx != "max" and mx.isdigit():
                 mem_limit = round(int(mx) / 1024 / 1024, 1)
             if cur.isdigit():
                 mem_current = round(int(cur) / 1024 / 1024, 1)
-        elif os.path.exists("/sys/fs/cgroup/memory/memory.limit_in_bytes"):
-            with open("/sys/fs/cgroup/memory/memory.limit_in_bytes", "r") as f:
+        elif os.path.exists(f"{CGROUP_ROOT}/memory{path}/memory.limit_in_bytes"):
+            with open(f"{CGROUP_ROOT}/memory{path}/memory.limit_in_bytes", "r") as f:
                 mx = f.read().strip()
-            with open("/sys/fs/cgroup/memory/memory.usage_in_bytes", "r") as f:
+            with open(f"{CGROUP_ROOT}/memory{path}/memory.usage_in_bytes", "r") as f:
                 cur = f.read().strip()
-            if mx.isdigit():
+            # cgroup v1 reports "unlimited" as a huge page-aligned number
+            if mx.isdigit() and int(mx) < (1 << 60):
                 mem_limit = round(int(mx) / 1024 / 1024, 1)
             if cur.isdigit():
                 mem_current = round(int(cur) / 1024 / 1024, 1)
@@ -125,296 +2778,937 @@ def read_cgroup_limits():
     return cpu_limit, mem_limit, mem_current
 
 
-# Initialize TSV header
-if not os.path.exists(OUT_TSV):
-    with open(OUT_TSV, "w") as f:
-        f.write("\t".join([
-            "timestamp","load1","mem_used_mb","mem_free_mb",
-            "disk_used_gb","disk_free_gb","disk_used_gb_root","disk_free_gb_root",
-            "disk_used_gb_pwd","disk_free_gb_pwd"
-        ]) + "\n")
-
-# Write metadata once
-call, shard, attempt, cwd = detect_task_context()
-cl_cpu, cl_mem, cl_mem_cur = read_cgroup_limits()
-meta = {
-    "ts": datetime.now().isoformat(),
-    "hostname": socket.gethostname(),
-    "task": call, "shard": shard, "attempt": attempt, "cwd": cwd,
-    "cpu_limit_cores": cl_cpu, "mem_limit_mb": cl_mem, "mem_current_mb": cl_mem_cur,
-    "cpu_count": psutil.cpu_count() if psutil else None,
-    "env_sample": f"MON_DIR={MON_DIR};INTERVAL={INTERVAL};HEAVY_INTERVAL={HEAVY_INTERVAL};LOW_DISK_GB_WARN={LOW_DISK_GB_WARN};LOW_DISK_GB_CRIT={LOW_DISK_GB_CRIT};LIGHT_MODE={LIGHT_MODE};INCLUDE_PERCPU={INCLUDE_PERCPU};INCLUDE_IO={INCLUDE_IO};EXPORT_PROM={EXPORT_PROM}",
-}
-try:
-    with open(META_JSON, "w") as f:
-        f.write(json.dumps(meta) + "\n")
-except Exception:
-    pass
+def cgroup_base() -> str:
+    """Directory holding the cgroup tree: the unified v2 hierarchy, else the v1 memory controller."""
+    if os.path.exists(f"{CGROUP_ROOT}/cgroup.controllers"):
+        return CGROUP_ROOT
+    return f"{CGROUP_ROOT}/memory"
 
-sample = 0
-prev_disk = None
-prev_net = None
-prev_time = None
-if psutil and INCLUDE_IO:
+
+def own_cgroup() -> str:
+    """This process's cgroup path (v2, else v1 memory), relative to the hierarchy root."""
     try:
-        prev_disk = psutil.disk_io_counters(perdisk=False)
-        prev_net = psutil.net_io_counters(pernic=False)
-        prev_time = time.time()
+        with open("/proc/self/cgroup") as f:
+            lines = [ln.rstrip("\n").split(":", 2) for ln in f]
+    except OSError:
+        return ""
+    for want in ("", "memory"):
+        for _, ctrls, path in (ln for ln in lines if len(ln) == 3):
+            if (ctrls == want) if not want else want in ctrls.split(","):
+                return "" if path == "/" else path
+    return ""
+
+
+def find_task_cgroups(pattern: str, max_depth: int = 6):
+    """{cgroup path: container id} for every cgroup whose name matches ``pattern``.
+
+    Matching cgroups are not descended into; the monitor's own cgroup is skipped.
+    """
+    base = cgroup_base()
+    rx = re.compile(pattern)
+    mine = own_cgroup()
+    found = {}
+    for root, dirs, _ in os.walk(base):
+        rel = root[len(base):]
+        if rel.count("/") >= max_depth:
+            dirs[:] = []
+            continue
+        for d in list(dirs):
+            m = rx.search(d)
+            if m:
+                dirs.remove(d)
+                path = f"{rel}/{d}"
+                if path != mine:
+                    found[path] = m.group(1) if m.groups() and m.group(1) else d
+    return found
+
+
+class HostTask:
+    """One task container in host mode: its cgroup, process tree and output series.
+
+    The task context (call, shard, attempt) is read from Cromwell execution paths in the
+    working directory or command line of the container's processes; when none shows up
+    within ``HOST_RESCAN_SECONDS`` the series is named after the container id instead.
+    Each task writes ``tasks/<name>/`` with ``usage.jsonl``, ``events.jsonl``,
+    ``phases.tsv`` and ``metadata.json``, so ``aggregate.py`` runs on it unchanged.
+    """
+
+    def __init__(self, path: str, cid: str):
+        self.path = path
+        self.cid = cid
+        # Own reader: its cached fds are released with the task
+        self.reader = ProcReader()
+        self.cgroup = CgroupSampler(self.reader, path=path)
+        self.alt_tree = AltTree()
+        self.phases = PhaseTracker()
+        self.call = self.shard = self.attempt = self.cwd = ""
+        self.name = None
+        self.dir = None
+        self.log = None
+        self.events = None
+        self.first_seen = self.last_seen = time.time()
+        self.samples = 0
+        self._cg_peak = None
+
+    def pids(self) -> set:
+        """Pids in the cgroup and its descendants."""
+        out = set()
+        for root, _, files in os.walk(cgroup_base() + self.path):
+            if "cgroup.procs" not in files:
+                continue
+            try:
+                out.update(int(x) for x in self.reader.read_once(os.path.join(root, "cgroup.procs")).split())
+            except (OSError, ValueError):
+                continue
+        return out
+
+    def resolve(self, rows) -> bool:
+        """Look for the task context; True once the output series can be opened."""
+        for r in rows:
+            try:
+                cwd = os.readlink(f"/proc/{r['pid']}/cwd")
+            except OSError:
+                cwd = ""
+            for src in (cwd, r["cmdline"]):
+                call, shard, attempt = task_context_from_path(src)
+                if call:
+                    self.call, self.shard, self.attempt = call, shard, attempt
+                    self.cwd = cwd if "call-" in cwd else ""
+                    return True
+        return time.time() - self.first_seen >= HOST_RESCAN_SECONDS
+
+    def open(self, taken) -> None:
+        name = ".".join(x for x in (self.call, self.shard and f"shard-{self.shard}",
+                                    self.attempt and f"attempt-{self.attempt}") if x) or self.cid[:12]
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+        if name in taken:
+            name = f"{name}.{self.cid[:12]}"
+        self.name = name
+        self.dir = os.path.join(MON_DIR, "tasks", name)
+        os.makedirs(self.dir, exist_ok=True)
+        rotate_bytes = int(ROTATE_MB * 1024 * 1024)
+        self.log = LineLog(os.path.join(self.dir, "usage.jsonl"), rotate_bytes=rotate_bytes, rotate_secs=ROTATE_SECONDS)
+        self.events = EventLog(LineLog(os.path.join(self.dir, "events.jsonl")), EVENT_HYSTERESIS,
+                               EVENT_CLEAR_SAMPLES, sync=bool(FSYNC))
+        cl_cpu, cl_mem, cl_mem_cur = read_cgroup_limits(self.path)
+        meta = {
+            "ts": datetime.now().isoformat(),
+            "hostname": socket.gethostname(),
+            "task": self.call, "shard": self.shard, "attempt": self.attempt, "cwd": self.cwd,
+            "container": self.cid, "cgroup": self.path, "host_mode": True,
+            "cpu_limit_cores": cl_cpu, "mem_limit_mb": cl_mem, "mem_current_mb": cl_mem_cur,
+        }
+        try:
+            write_atomic(os.path.join(self.dir, "metadata.json"), json.dumps(meta) + "\n")
+        except Exception:
+            pass
+
+    def sample(self, now_epoch: float, ts: str, rows, pids, ptable, host: dict, interval_s: float):
+        """Sample the task's cgroup and process tree (``pids`` from ``pids()`` this tick);
+        returns the record written (None before open)."""
+        if self.log is None:
+            return None
+        trows = [r for r in rows if r["pid"] in pids]
+        alt = self.alt_tree.collect(trows, ptable)
+        cg_fields, cg_cur, cg_max = self.cgroup.sample()
+        phase = self.phases.detect(self.alt_tree.last_members)
+        cg_peak, last_peak, self._cg_peak = cg_fields.get("cg_mem_peak_mb"), self._cg_peak, cg_fields.get("cg_mem_peak_mb")
+        rise = cg_peak if cg_peak is not None and last_peak is not None and cg_peak > last_peak else None
+        if self.phases.update(now_epoch, phase, alt, cg_fields.get("cg_mem_current_mb"), rise):
+            self.phases.hwm = self.alt_tree.reset_hwm(self.alt_tree.last_members)
+            write_atomic(os.path.join(self.dir, "phases.tsv"), self.phases.report())
+        record = {
+            "ts": ts, "mon_secs": int(time.time() - START_TIME),
+            "task": self.call, "shard": self.shard, "attempt": self.attempt, "cwd": self.cwd,
+            "container": self.cid, "phase": phase, **host,
+            "alt_pid": alt["pid"], "alt_cpu": alt["cpu"], "alt_pmem": alt["pmem"],
+            "alt_rss_mb": alt["rss_mb"], "alt_vsz_mb": alt["vsz_mb"], "alt_pss_mb": alt["pss_mb"],
+            "alt_hwm_sum_mb": alt["hwm_sum_mb"], "alt_proc_hwm_mb": alt["proc_hwm_mb"],
+            "alt_read_mb": alt["read_mb"], "alt_write_mb": alt["write_mb"], "alt_workers": alt["workers"],
+            "cg_procs": len(trows),
+            **cg_fields,
+            "interval_s": round(float(interval_s), 1),
+        }
+        self.log.append(json.dumps(record))
+        self.samples += 1
+        self.last_seen = now_epoch
+        mem_frac = cg_cur / cg_max if cg_cur is not None and cg_max else None
+        try:
+            self.events.threshold("mem_near_limit", now_epoch, mem_frac, MEM_NEAR_FRACTION, record)
+            self.events.counter("oom", now_epoch, cg_fields.get("cg_oom"), record, severity="warning")
+            self.events.counter("oom_kill", now_epoch, cg_fields.get("cg_oom_kill"), record)
+            self.events.rising("cpu_throttled", now_epoch, cg_fields.get("cg_nr_throttled"), record)
+            self.events.processes(now_epoch, self.alt_tree.last_roots, record)
+        except Exception:
+            pass
+        self.events.flush()
+        return record
+
+    def flush(self, sync: bool = False) -> None:
+        if self.log is not None:
+            self.log.flush(sync=sync)
+
+    def close(self) -> None:
+        self.reader.close()
+        if self.log is None:
+            return
+        self.log.close()
+        self.events.log.close()
+        if self.phases.stats:
+            write_atomic(os.path.join(self.dir, "phases.tsv"), self.phases.report())
+
+
+HOST_INDEX_COLUMNS = ["name", "task", "shard", "attempt", "container", "cgroup", "first_seen", "last_seen", "samples",
+                      "state"]
+
+
+def host_index_row(t: "HostTask", state: str) -> str:
+    return "\t".join(map(str, [
+        t.name, t.call, t.shard, t.attempt, t.cid, t.path,
+        datetime.fromtimestamp(t.first_seen).isoformat(timespec="seconds"),
+        datetime.fromtimestamp(t.last_seen).isoformat(timespec="seconds"),
+        t.samples, state,
+    ]))
+
+
+def host_index(tasks, ended) -> str:
+    """``tasks.tsv``: running tasks, then the rows kept for exited ones (``ended``)."""
+    lines = ["\t".join(HOST_INDEX_COLUMNS)]
+    lines.extend(host_index_row(t, "running") for t in tasks.values() if t.name is not None)
+    lines.extend(ended)
+    return "\n".join(lines) + "\n"
+
+
+def host_main():
+    """Host mode: sample every task container on the VM in one pass per tick."""
+    os.makedirs(os.path.join(MON_DIR, "tasks"), exist_ok=True)
+    signal.signal(signal.SIGTERM, _on_term)
+    signal.signal(signal.SIGUSR1, _on_usr1)
+    backend = make_backend()
+    ptable = backend.table if backend else None
+    meta = {
+        "ts": datetime.now().isoformat(),
+        "hostname": socket.gethostname(),
+        "host_mode": True, "cgroup_pattern": HOST_CGROUP_RE,
+        "cpu_count": backend.cpu_count() if backend else None,
+        "backend": backend.name if backend else None,
+    }
+    try:
+        # Also the WDL's guard: tasks do not start their own monitor while this file exists
+        with open(META_JSON, "w") as f:
+            f.write(json.dumps(meta) + "\n")
     except Exception:
-        prev_disk = None
-        prev_net = None
-        prev_time = None
-percpu_vals = None
-if psutil and INCLUDE_PERCPU:
+        pass
+    server = None
+    if HTTP_PORT > 0:
+        try:
+            server = MetricsServer(HTTP_ADDR, HTTP_PORT)
+        except Exception as e:
+            print(f"metrics HTTP endpoint unavailable on {HTTP_ADDR}:{HTTP_PORT}: {e}", file=sys.stderr)
+    prom = SnapshotFile(OUT_PROM)
+    index_path = os.path.join(MON_DIR, "tasks.tsv")
+    tasks = {}
+    # Exited tasks keep only their tasks.tsv row, and only the latest ones: each task's
+    # metadata.json still maps its directory to the container
+    ended = deque(maxlen=HOST_KEEP_EXITED)
+
+    def retire(task) -> None:
+        task.close()
+        if task.name is not None:
+            ended.append(host_index_row(task, "exited"))
+    sample = 0
+    last_scan = None
+    last_flush = time.monotonic()
+    next_tick = time.monotonic()
+    try:
+        while True:
+            now_epoch = time.time()
+            ts = datetime.fromtimestamp(now_epoch).isoformat()
+            now_m = time.monotonic()
+            changed = False
+            if last_scan is None or now_m - last_scan >= HOST_RESCAN_SECONDS:
+                last_scan = now_m
+                try:
+                    found = find_task_cgroups(HOST_CGROUP_RE)
+                except Exception:
+                    found = None
+                if found is not None:
+                    for path, cid in found.items():
+                        if path not in tasks:
+                            tasks[path] = HostTask(path, cid)
+                    for path in [p for p in tasks if p not in found]:
+                        retire(tasks.pop(path))
+                        changed = True
+            # One process scan for the whole host; each task takes its cgroup's share
+            rows = ptable.scan() if ptable is not None else []
+            load1, mem_used_mb, mem_free_mb, _ = sample_system(backend, percpu=False)
+            disk_used_gb, disk_free_gb = df_gb(CR_ROOT)
+            host = {"load1": load1, "mem_used_mb": mem_used_mb, "mem_free_mb": mem_free_mb,
+                    "disk_used_gb": disk_used_gb, "disk_free_gb": disk_free_gb}
+            lines = []
+            for path, task in list(tasks.items()):
+                if not os.path.isdir(cgroup_base() + path):
+                    # Container gone between rescans
+                    retire(tasks.pop(path))
+                    changed = True
+                    continue
+                try:
+                    pids = task.pids()
+                    if task.log is None:
+                        if task.resolve([r for r in rows if r["pid"] in pids]):
+                            task.open({t.name for t in tasks.values() if t.name})
+                            changed = True
+                    record = task.sample(now_epoch, ts, rows, pids, ptable, host, INTERVAL)
+                except Exception as e:
+                    print(f"[{ts}] host mode: sampling {path} failed: {e}", file=sys.stderr)
+                    continue
+                if record is not None and (EXPORT_PROM or server is not None):
+                    labels = f'task="{task.call}",shard="{task.shard}",attempt="{task.attempt}",container="{task.cid[:12]}"'
+                    for metric, key, scale in (("resource_task_cpu_percent", "cg_cpu_pct", 1),
+                                               ("resource_task_mem_bytes", "cg_mem_current_mb", 1024 * 1024),
+                                               ("resource_alt_rss_bytes", "alt_rss_mb", 1024 * 1024)):
+                        if record.get(key) is not None:
+                            lines.append(f"{metric}{{{labels}}} {int(record[key] * scale) if scale > 1 else record[key]}")
+            if changed:
+                write_atomic(index_path, host_index(tasks, ended))
+            if EXPORT_PROM or server is not None:
+                lines.append(f"resource_tasks_monitored {sum(1 for t in tasks.values() if t.log is not None)}")
+                text = "\n".join(lines) + "\n"
+                if EXPORT_PROM:
+                    prom.set(text)
+                    prom.flush()
+                if server is not None:
+                    server.set(text)
+            if time.monotonic() - last_flush >= FLUSH_SECONDS:
+                for task in tasks.values():
+                    task.flush(sync=bool(FSYNC))
+                last_flush = time.monotonic()
+
+            sample += 1
+            if MAX_SAMPLES > 0 and sample >= MAX_SAMPLES:
+                break
+            next_tick += INTERVAL
+            now_m = time.monotonic()
+            if next_tick < now_m:
+                next_tick = now_m
+            sleep_or_stop(next_tick - now_m)
+    except (KeyboardInterrupt, Shutdown):
+        pass
+    finally:
+        for task in tasks.values():
+            try:
+                task.close()
+            except Exception:
+                pass
+        if server is not None:
+            server.close()
+        write_atomic(index_path, host_index(tasks, ended))
+
+
+def main():
+    if HOST_MODE:
+        return host_main()
+    os.makedirs(MON_DIR, exist_ok=True)
+    signal.signal(signal.SIGTERM, _on_term)
+    signal.signal(signal.SIGUSR1, _on_usr1)
+    # Clear a stop file left in this directory by an earlier run: it would pass for this task's
+    try:
+        os.remove(STOP_FILE)
+    except OSError:
+        pass
+    out = Outputs()
+    events = EventLog(out.events, EVENT_HYSTERESIS, EVENT_CLEAR_SAMPLES, sync=bool(FSYNC))
+    server = None
+    if HTTP_PORT > 0:
+        try:
+            server = MetricsServer(HTTP_ADDR, HTTP_PORT)
+        except Exception as e:
+            print(f"metrics HTTP endpoint unavailable on {HTTP_ADDR}:{HTTP_PORT}: {e}", file=sys.stderr)
+
+    backend = make_backend()
+
+    devio = None
+    if INCLUDE_IO and os.path.exists("/proc/diskstats"):
+        devio = DeviceIO({sfx: path or CR_ROOT for sfx, path in DEVICE_MOUNTS})
+        try:
+            devio.sample()
+        except Exception:
+            devio = None
+
+    # Write metadata once
+    call, shard, attempt, cwd = detect_task_context()
+    cl_cpu, cl_mem, cl_mem_cur = read_cgroup_limits()
+    meta = {
+        "ts": datetime.now().isoformat(),
+        "hostname": socket.gethostname(),
+        "task": call, "shard": shard, "attempt": attempt, "cwd": cwd,
+        "cpu_limit_cores": cl_cpu, "mem_limit_mb": cl_mem, "mem_current_mb": cl_mem_cur,
+        "cpu_count": backend.cpu_count() if backend else None,
+        "backend": backend.name if backend else None,
+        "io_devices": {(path or CR_ROOT): devio.devices.get(sfx) for sfx, path in DEVICE_MOUNTS} if devio else None,
+        "env_sample": f"MON_DIR={MON_DIR};INTERVAL={INTERVAL};HEAVY_INTERVAL={HEAVY_INTERVAL};LOW_DISK_GB_WARN={LOW_DISK_GB_WARN};LOW_DISK_GB_CRIT={LOW_DISK_GB_CRIT};LIGHT_MODE={LIGHT_MODE};INCLUDE_PERCPU={INCLUDE_PERCPU};INCLUDE_IO={INCLUDE_IO};EXPORT_PROM={EXPORT_PROM};FLUSH_SECONDS={FLUSH_SECONDS};ROTATE_MB={ROTATE_MB}",
+    }
     try:
-        # Prime cpu_percent so next call returns a value relative to now
-        psutil.cpu_percent(percpu=True)
+        with open(META_JSON, "w") as f:
+            f.write(json.dumps(meta) + "\n")
     except Exception:
         pass
-try:
-    while True:
-        ts = datetime.now().isoformat()
-        # CPU load and memory
-        load1 = 0.0
-        mem_used_mb = mem_free_mb = 0
-        try:
-            if psutil:
-                load1 = psutil.getloadavg()[0]
-                vm = psutil.virtual_memory()
-                mem_used_mb = round((vm.total - vm.available) / 1024 / 1024)
-                mem_free_mb = round(vm.available / 1024 / 1024)
-                if INCLUDE_PERCPU:
-                    percpu_vals = psutil.cpu_percent(percpu=True)
+    ckpt = Checkpoint(CHECKPOINT_JSON, {k: meta[k] for k in ("hostname", "task", "shard", "attempt", "cwd",
+                                                             "cpu_limit_cores", "cpu_count")})
+    ckpt_counters = {"alt_cpu_core_s": 0.0, "cg_cpu_core_s": 0.0, "alt_read_mb": None, "alt_write_mb": None,
+                     "cg_read_mb": None, "cg_write_mb": None, "mon_cpu_s": 0.0}
+    # Who held the CPU and memory over the run, written with the checkpoint and at exit
+    history = ProcessHistory(HISTORY_TOP_K, HISTORY_POINTS) if HISTORY_TOP_K > 0 else None
+    history_context = {k: meta[k] for k in ("hostname", "task", "shard", "attempt")}
+
+    sample = 0
+    prev_disk = None
+    prev_net = None
+    prev_time = None
+    if backend and INCLUDE_IO:
+        try:
+            prev_disk = backend.disk_io()
+            prev_net = backend.net_io()
+            prev_time = time.time()
         except Exception:
-            pass
-        # Disks
-        def df_path(path: str):
+            prev_disk = None
+            prev_net = None
+            prev_time = None
+    ptable = backend.table if backend else None
+    alt_tree = AltTree()
+    phases = PhaseTracker()
+    cgroup = CgroupSampler()
+    last_cg_peak = None
+    disk_trend = TrendForecaster(FORECAST_WINDOW_SECONDS)
+    mem_trend = TrendForecaster(FORECAST_WINDOW_SECONDS)
+    sched = SampleScheduler(INTERVAL, DENSE_INTERVAL, IDLE_INTERVAL,
+                            hold_s=DENSE_HOLD_SECONDS, idle_after_s=IDLE_AFTER_SECONDS,
+                            mem_near=MEM_NEAR_FRACTION, spike_factor=IO_SPIKE_FACTOR,
+                            spike_min_mb_s=IO_SPIKE_MIN_MB_S, max_per_hour=MAX_SAMPLES_PER_HOUR,
+                            cpu_per_hour=MAX_CPU_SECONDS_PER_HOUR)
+    next_sleep = float(INTERVAL)
+    # Exporter state: counters integrate across ticks, histograms observe one value per tick
+    alt_cpu_seconds = 0.0
+    last_tick = None
+    io_totals = None
+    hist_alt_cpu = Histogram([10, 25, 50, 100, 200, 400, 800, 1600, 3200, 6400])
+    hist_alt_rss = Histogram([float(1 << n) for n in range(28, 38)])  # 256 MiB .. 128 GiB
+    largest = LargestFiles(CR_ROOT, SCAN_TOP_N, int(SCAN_TRACK_MB * 1024 * 1024), SCAN_MAX_TRACKED)
+
+    # Collectors: process tree and df are requested every tick and waited for with a timeout;
+    # top.txt and the heavy disk walk run on their own cadences and are never waited for
+    progress = InputProgress(PROGRESS_SUFFIXES, FORECAST_WINDOW_SECONDS, PROGRESS_STALL_SECONDS) \
+        if PROGRESS_ENABLED and os.path.isdir("/proc/self/fdinfo") else None
+
+    def collect_procs():
+        rows = ptable.scan() if ptable is not None else []
+        alt = alt_tree.collect(rows, ptable)
+        members = list(alt_tree.last_members)
+        roots = list(alt_tree.last_roots)
+        prog = None
+        if progress is not None and progress.enabled:
+            now_m, wall = time.monotonic(), time.time()
             try:
-                st = os.statvfs(path)
-                used = (st.f_blocks - st.f_bfree) * st.f_frsize
-                free = st.f_bavail * st.f_frsize
-                return round(used / 1024 / 1024 / 1024, 1), round(free / 1024 / 1024 / 1024, 1)
+                progress.scan(members, now_m, wall)
+                prog = (progress.fields(now_m), progress.report(now_m, wall))
             except Exception:
-                return 0.0, 0.0
-        disk_used_gb, disk_free_gb = df_path(CR_ROOT)
-        disk_used_gb_root, disk_free_gb_root = df_path("/")
-        disk_used_gb_pwd, disk_free_gb_pwd = df_path(".")
-
-        # Optional sample_name
-        if not os.path.exists(SAMPLE_NAME_FILE):
-            try:
-                bamdir = "/mnt/bam"
-                if os.path.isdir(bamdir):
-                    for fn in os.listdir(bamdir):
-                        if fn.endswith(".bam"):
-                            with open(SAMPLE_NAME_FILE, "w") as f:
-                                f.write(fn)
-                            break
-            except Exception:
-                pass
+                prog = None
+        return rows, alt, members, roots, prog
+
+    def collect_top():
+        res = procs.result
+        if res and res[0]:
+            out.top.set(format_top(res[0], datetime.now().isoformat()))
+
+    procs = Collector("procs", collect_procs)
+    dfs = Collector("df", lambda: (df_gb(CR_ROOT), df_gb("/"), df_gb(".")))
+    top = Collector("top", collect_top, period_s=TOP_INTERVAL)
+    collectors = [procs, dfs, top]
+    heavy = None
+    if LIGHT_MODE == 0:
+        heavy = Collector("heavy", lambda: write_largest(largest), period_s=HEAVY_INTERVAL)
+        collectors.append(heavy)
+    # Optional py-spy stack samples, taken on the heavy cadence from the latest tree and phase
+    stack_sampler = stacks = None
+    stack_target = {"members": [], "phase": None}
+    if STACKS_ENABLED:
+        exe = shutil.which(STACKS_PYSPY)
+        if exe:
+            stack_sampler = StackSampler(exe, STACKS_DIR, STACKS_SECONDS, STACKS_RATE, STACKS_MAX_PROCS)
+            stacks = Collector("stacks", lambda: stack_sampler.capture(stack_target["members"], stack_target["phase"]),
+                               period_s=HEAVY_INTERVAL)
+            collectors.append(stacks)
+        else:
+            print(f"MON_STACKS=1 but {STACKS_PYSPY} was not found; stack sampling is off", file=sys.stderr)
+    # 1 s flight recorder next to the coarse samples; SIGUSR1 asks for a dump
+    flight = recorder = None
+    if FLIGHT_ENABLED and os.path.isdir("/proc/self"):
+        recorder = FlightRecorder(FLIGHT_DIR, FLIGHT_SECONDS, FLIGHT_MAX_DUMPS)
+        flight = Collector("flight", recorder.sample, period_s=1.0)
+        collectors.append(flight)
+        signal.signal(signal.SIGUSR1, lambda signum, frame: recorder.request("requested"))
+
+    # Overhead budget: each level sheds more optional work (per-CPU, top.txt, PSS, heavy walk)
+    governor = OverheadGovernor(CPU_BUDGET_PCT, BUDGET_WINDOW_SECONDS)
+    want_percpu = bool(INCLUDE_PERCPU)
+
+    def apply_level(level: int) -> None:
+        nonlocal want_percpu
+        want_percpu = bool(INCLUDE_PERCPU) and level < 1
+        top.configure(period_s=TOP_INTERVAL * (4 if level >= 1 else 1), paused=level >= 3)
+        alt_tree.pss = bool(INCLUDE_PSS) and level < 2
+        if progress is not None:
+            progress.enabled = level < 2
+        if heavy is not None:
+            heavy.configure(period_s=HEAVY_INTERVAL * (4 if level >= 2 else 1), paused=level >= 3)
+        if stacks is not None:
+            stacks.configure(paused=level >= 2)
+        if flight is not None:
+            flight.configure(paused=level >= 3)
+    no_alt = {"pid": None, "cpu": None, "pmem": None, "rss_mb": None, "vsz_mb": None, "pss_mb": None,
+              "hwm_sum_mb": None, "proc_hwm_mb": None, "read_mb": None, "write_mb": None, "workers": 0}
+    next_tick = time.monotonic()
+    cpu_mark = time.process_time()
+    exit_status = "failed"
+    task_exit = None
+    if backend and INCLUDE_PERCPU:
         try:
-            with open(SAMPLE_NAME_FILE, "r") as f:
-                sample_name = f.read().strip()
+            # Prime cpu_percent so next call returns a value relative to now
+            backend.percpu_percent()
         except Exception:
-            sample_name = ""
-
-        # AltAnalyze process metrics (best-effort)
-        alt = {"pid": None, "cpu": None, "pmem": None, "rss_mb": None, "vsz_mb": None, "read_mb": None, "write_mb": None}
-        if psutil:
-            try:
-                procs = []
-                for p in psutil.process_iter(attrs=["pid","name","cmdline","cpu_percent","memory_percent","memory_info","io_counters"]):
-                    cmd = " ".join(p.info.get("cmdline") or [])
-                    name = p.info.get("name") or ""
-                    if "AltAnalyze.sh" in cmd or "AltAnalyze.py" in cmd or "bam_to_bed" in cmd or name.startswith("AltAnalyze"):
-                        procs.append(p)
-                if procs:
-                    # Pick highest CPU
-                    procs.sort(key=lambda x: x.info.get("cpu_percent") or 0.0, reverse=True)
-                    p = procs[0]
-                    mi = p.info.get("memory_info")
-                    io = p.info.get("io_counters")
-                    alt = {
-                        "pid": p.info.get("pid"),
-                        "cpu": p.info.get("cpu_percent"),
-                        "pmem": p.info.get("memory_percent"),
-                        "rss_mb": round((mi.rss if mi else 0)/1024/1024, 1),
-                        "vsz_mb": round((mi.vms if mi else 0)/1024/1024, 1),
-                        "read_mb": round((io.read_bytes if io else 0)/1024/1024, 1),
-                        "write_mb": round((io.write_bytes if io else 0)/1024/1024, 1),
-                    }
+            pass
+    try:
+        while True:
+            tick_t0 = time.monotonic()
+            now_epoch = time.time()
+            ts = datetime.fromtimestamp(now_epoch).isoformat()
+            # Start the threaded collectors first so they overlap with the inline sampling
+            procs_ticket = procs.request()
+            dfs_ticket = dfs.request()
+            # CPU load and memory
+            load1, mem_used_mb, mem_free_mb, percpu_vals = sample_system(backend, percpu=want_percpu)
+            # Disks
+            stale = 0
+            res, df_fresh = dfs.wait(dfs_ticket, COLLECTOR_TIMEOUT)
+            stale += not df_fresh
+            # A late df keeps the last good values; before the first one they are unknown, not 0 GB free
+            (disk_used_gb, disk_free_gb), (disk_used_gb_root, disk_free_gb_root), (disk_used_gb_pwd, disk_free_gb_pwd) = \
+                res or ((None, None),) * 3
+
+            # Optional sample_name
+            if not os.path.exists(SAMPLE_NAME_FILE):
+                try:
+                    bamdir = "/mnt/bam"
+                    if os.path.isdir(bamdir):
+                        for fn in os.listdir(bamdir):
+                            if fn.endswith(".bam"):
+                                with open(SAMPLE_NAME_FILE, "w") as f:
+                                    f.write(fn)
+                                break
+                except Exception:
+                    pass
+            try:
+                with open(SAMPLE_NAME_FILE, "r") as f:
+                    sample_name = f.read().strip()
             except Exception:
-                pass
+                sample_name = ""
+
+            # One process scan per tick feeds the AltAnalyze metrics, the phase and top.txt;
+            # on timeout the previous scan is reused
+            res, fresh = procs.wait(procs_ticket, COLLECTOR_TIMEOUT)
+            stale += not fresh
+            _, alt, members, roots, prog = res or ([], no_alt, [], None, None)
+            prog_fields = dict.fromkeys(["progress_pct", "progress_mb_s", "progress_eta_s", "progress_stalled_s", "progress_inputs"])
+            if prog is not None:
+                prog_fields = prog[0]
+                out.progress.set(prog[1])
 
-        # Emit TSV line
-        with open(OUT_TSV, "a") as f:
-            f.write("\t".join(map(str, [
+            # TSV row; written together with the JSON record below
+            tsv_row = [
                 ts, load1, mem_used_mb, mem_free_mb,
                 disk_used_gb, disk_free_gb, disk_used_gb_root, disk_free_gb_root,
                 disk_used_gb_pwd, disk_free_gb_pwd
-            ])) + "\n")
-
-        # IO counters and rates
-        disk_read_mb_s = disk_write_mb_s = net_recv_mb_s = net_sent_mb_s = None
-        if psutil and INCLUDE_IO:
-            try:
-                now = time.time()
-                dio = psutil.disk_io_counters(perdisk=False)
-                nio = psutil.net_io_counters(pernic=False)
-                if prev_disk and prev_net and prev_time:
-                    dt = max(0.001, now - prev_time)
-                    disk_read_mb_s = round((dio.read_bytes - prev_disk.read_bytes) / 1024 / 1024 / dt, 3)
-                    disk_write_mb_s = round((dio.write_bytes - prev_disk.write_bytes) / 1024 / 1024 / dt, 3)
-                    net_recv_mb_s = round((nio.bytes_recv - prev_net.bytes_recv) / 1024 / 1024 / dt, 3)
-                    net_sent_mb_s = round((nio.bytes_sent - prev_net.bytes_sent) / 1024 / 1024 / dt, 3)
-                prev_disk, prev_net, prev_time = dio, nio, now
+            ]
+
+            # IO counters and rates
+            disk_read_mb_s = disk_write_mb_s = net_recv_mb_s = net_sent_mb_s = None
+            if backend and INCLUDE_IO:
+                try:
+                    now = time.time()
+                    dio = backend.disk_io()
+                    nio = backend.net_io()
+                    io_totals = (dio, nio)
+                    if prev_disk and prev_net and prev_time:
+                        dt = max(0.001, now - prev_time)
+                        disk_read_mb_s = round((dio[0] - prev_disk[0]) / 1024 / 1024 / dt, 3)
+                        disk_write_mb_s = round((dio[1] - prev_disk[1]) / 1024 / 1024 / dt, 3)
+                        net_recv_mb_s = round((nio[0] - prev_net[0]) / 1024 / 1024 / dt, 3)
+                        net_sent_mb_s = round((nio[1] - prev_net[1]) / 1024 / 1024 / dt, 3)
+                    prev_disk, prev_net, prev_time = dio, nio, now
+                except Exception:
+                    pass
+            dev_stats = None
+            if devio is not None:
+                try:
+                    dev_stats = devio.sample()
+                except Exception:
+                    dev_stats = None
+
+            # Exhaustion forecasts: disk free space of CR_ROOT, and cgroup memory (host memory without a cgroup)
+            disk_full_eta_s = mem_oom_eta_s = None
+            try:
+                cg_fields, cg_mem_cur, cg_mem_max = cgroup.sample()
+            except Exception:
+                cg_fields, cg_mem_cur, cg_mem_max = {}, None, None
+
+            # Pipeline phase; the per-phase table is rewritten whenever the phase changes.
+            # Between-tick peaks (VmHWM, cgroup memory peak) are restarted on a change so
+            # that each phase gets its own high-water mark.
+            try:
+                phase = phases.detect(members)
+                stack_target.update(members=members, phase=phase)
+                if recorder is not None:
+                    recorder.members = [r["pid"] for r in members]
+                    recorder.roots = [r["pid"] for r in roots or []]
+                cg_peak = cg_fields.get("cg_mem_peak_mb")
+                local_peak = cgroup.local_peak()
+                if local_peak is not None:
+                    cg_interval_peak = round(local_peak / 1024 / 1024, 1)
+                elif cg_peak is not None and last_cg_peak is not None and cg_peak > last_cg_peak:
+                    cg_interval_peak = cg_peak
+                else:
+                    cg_interval_peak = None
+                last_cg_peak = cg_peak
+                if phases.update(now_epoch, phase, alt, cg_fields.get("cg_mem_current_mb"), cg_interval_peak):
+                    cgroup.reset_peak()
+                    phases.hwm = alt_tree.reset_hwm(members)
+                    write_atomic(PHASES_TSV, phases.report())
+            except Exception:
+                phase = None
+            if history is not None and fresh and res:
+                try:
+                    history.observe(now_epoch, res[0], phase)
+                except Exception:
+                    pass
+            try:
+                now_m = time.monotonic()
+                # Repeating a stale value would flatten the trend
+                if disk_free_gb is not None and df_fresh:
+                    disk_trend.add(now_m, float(disk_free_gb))
+                disk_full_eta_s = disk_trend.eta(0.0)
+                if cg_mem_cur is not None and cg_mem_max:
+                    mem_trend.add(now_m, cg_mem_cur / 1024 / 1024)
+                    mem_oom_eta_s = mem_trend.eta(cg_mem_max / 1024 / 1024)
+                elif mem_used_mb or mem_free_mb:
+                    mem_trend.add(now_m, float(mem_used_mb))
+                    mem_oom_eta_s = mem_trend.eta(float(mem_used_mb + mem_free_mb))
             except Exception:
                 pass
 
-        # Emit JSON line
-        record = {
-            "ts": ts, "mon_secs": int(time.time() - START_TIME),
-            "task": call, "shard": shard, "attempt": attempt, "cwd": cwd,
-            "sample": sample_name,
-            "load1": load1, "mem_used_mb": mem_used_mb, "mem_free_mb": mem_free_mb,
-            "disk_used_gb": disk_used_gb, "disk_free_gb": disk_free_gb,
-            "disk_used_gb_root": disk_used_gb_root, "disk_free_gb_root": disk_free_gb_root,
-            "disk_used_gb_pwd": disk_used_gb_pwd, "disk_free_gb_pwd": disk_free_gb_pwd,
-            "alt_pid": alt["pid"], "alt_cpu": alt["cpu"], "alt_pmem": alt["pmem"],
-            "alt_rss_mb": alt["rss_mb"], "alt_vsz_mb": alt["vsz_mb"],
-            "alt_read_mb": alt["read_mb"], "alt_write_mb": alt["write_mb"],
-        }
-        if percpu_vals is not None:
-            record["percpu_percent"] = percpu_vals
-        if disk_read_mb_s is not None:
-            record.update({
-                "disk_read_mb_s": disk_read_mb_s,
-                "disk_write_mb_s": disk_write_mb_s,
-                "net_recv_mb_s": net_recv_mb_s,
-                "net_sent_mb_s": net_sent_mb_s,
-            })
-        with open(OUT_JSONL, "a") as f:
-            f.write(json.dumps(record) + "\n")
-
-        # Prometheus textfile export (optional)
-        if EXPORT_PROM:
-            try:
-                labels = f'task="{call}",shard="{shard}",attempt="{attempt}"'
-                lines = [
-                    f'resource_cpu_load1{{{labels}}} {load1}',
-                    f'resource_mem_used_bytes{{{labels}}} {mem_used_mb * 1024 * 1024}',
-                    f'resource_mem_free_bytes{{{labels}}} {mem_free_mb * 1024 * 1024}',
-                    f'resource_disk_used_gb{{mount="{CR_ROOT}",{labels}}} {disk_used_gb}',
-                    f'resource_disk_free_gb{{mount="{CR_ROOT}",{labels}}} {disk_free_gb}',
-                    f'resource_disk_used_gb{{mount="/",{labels}}} {disk_used_gb_root}',
-                    f'resource_disk_free_gb{{mount="/",{labels}}} {disk_free_gb_root}',
-                    f'resource_disk_used_gb{{mount=".",{labels}}} {disk_used_gb_pwd}',
-                    f'resource_disk_free_gb{{mount=".",{labels}}} {disk_free_gb_pwd}',
-                ]
-                if percpu_vals is not None:
-                    for idx, val in enumerate(percpu_vals):
-                        lines.append(f'resource_cpu_percent{{cpu="{idx}",{labels}}} {val}')
-                if disk_read_mb_s is not None:
-                    lines.extend([
-                        f'resource_disk_read_mb_s{{{labels}}} {disk_read_mb_s}',
-                        f'resource_disk_write_mb_s{{{labels}}} {disk_write_mb_s}',
-                        f'resource_net_recv_mb_s{{{labels}}} {net_recv_mb_s}',
-                        f'resource_net_sent_mb_s{{{labels}}} {net_sent_mb_s}',
-                    ])
-                with open(OUT_PROM, "w") as f:
-                    f.write("\n".join(lines) + "\n")
+            # Emit JSON line
+            record = {
+                "ts": ts, "mon_secs": int(time.time() - START_TIME),
+                "task": call, "shard": shard, "attempt": attempt, "cwd": cwd,
+                "sample": sample_name, "phase": phase,
+                "load1": load1, "mem_used_mb": mem_used_mb, "mem_free_mb": mem_free_mb,
+                "disk_used_gb": disk_used_gb, "disk_free_gb": disk_free_gb,
+                "disk_used_gb_root": disk_used_gb_root, "disk_free_gb_root": disk_free_gb_root,
+                "disk_used_gb_pwd": disk_used_gb_pwd, "disk_free_gb_pwd": disk_free_gb_pwd,
+                "alt_pid": alt["pid"], "alt_cpu": alt["cpu"], "alt_pmem": alt["pmem"],
+                "alt_rss_mb": alt["rss_mb"], "alt_vsz_mb": alt["vsz_mb"],
+                "alt_pss_mb": alt["pss_mb"],
+                "alt_hwm_sum_mb": alt["hwm_sum_mb"], "alt_proc_hwm_mb": alt["proc_hwm_mb"],
+                "alt_read_mb": alt["read_mb"], "alt_write_mb": alt["write_mb"],
+                "alt_workers": alt["workers"],
+                **cg_fields,
+                "disk_full_eta_s": disk_full_eta_s, "mem_oom_eta_s": mem_oom_eta_s,
+                "interval_s": round(float(next_sleep), 1),
+                "tick_ms": round((time.monotonic() - tick_t0) * 1000, 1),
+                "procs_ms": round(procs.latency_s * 1000, 1) if procs.latency_s is not None else None,
+                "df_ms": round(dfs.latency_s * 1000, 1) if dfs.latency_s is not None else None,
+                "heavy_ms": round(heavy.latency_s * 1000, 1) if heavy is not None and heavy.latency_s is not None else None,
+                "stale": stale,
+                "mon_cpu_pct": governor.usage_pct, "mon_rss_mb": self_rss_mb(), "mon_level": governor.level,
+                **prog_fields,
+            }
+            if percpu_vals is not None:
+                record["percpu_percent"] = percpu_vals
+            if disk_read_mb_s is not None:
+                record.update({
+                    "disk_read_mb_s": disk_read_mb_s,
+                    "disk_write_mb_s": disk_write_mb_s,
+                    "net_recv_mb_s": net_recv_mb_s,
+                    "net_sent_mb_s": net_sent_mb_s,
+                })
+            if dev_stats is not None:
+                for sfx, vals in dev_stats.items():
+                    record.update({f + sfx: vals[f] for f in DEVICE_FIELDS})
+            out.write(now_epoch, tsv_row, record)
+
+            # Events: one line per condition change instead of a warning on every tick
+            mem_frac = cg_mem_cur / cg_mem_max if cg_mem_cur is not None and cg_mem_max else None
+            try:
+                events.threshold("low_disk_warn", now_epoch, disk_free_gb, LOW_DISK_GB_WARN, record, below=True)
+                events.threshold("low_disk_crit", now_epoch, disk_free_gb, LOW_DISK_GB_CRIT, record, below=True,
+                                 severity="critical")
+                events.threshold("mem_near_limit", now_epoch, mem_frac, MEM_NEAR_FRACTION, record)
+                events.counter("oom", now_epoch, cg_fields.get("cg_oom"), record, severity="warning")
+                events.counter("oom_kill", now_epoch, cg_fields.get("cg_oom_kill"), record)
+                events.rising("cpu_throttled", now_epoch, cg_fields.get("cg_nr_throttled"), record)
+                events.processes(now_epoch, roots, record)
             except Exception:
                 pass
+            events.flush()
+
+            # Prometheus export (optional): textfile and/or in-process HTTP endpoint
+            if last_tick is not None and alt["cpu"] is not None:
+                alt_cpu_seconds += alt["cpu"] / 100.0 * max(0.0, now_epoch - last_tick)
+            if last_tick is not None and cg_fields.get("cg_cpu_pct") is not None:
+                ckpt_counters["cg_cpu_core_s"] += cg_fields["cg_cpu_pct"] / 100.0 * max(0.0, now_epoch - last_tick)
+            last_tick = now_epoch
+            if alt["pid"] is not None:
+                hist_alt_cpu.observe(alt["cpu"] or 0.0)
+                hist_alt_rss.observe(alt["rss_mb"] * 1024 * 1024)
+            if EXPORT_PROM or server is not None:
+                try:
+                    labels = f'task="{call}",shard="{shard}",attempt="{attempt}"'
+                    lines = [
+                        f'resource_cpu_load1{{{labels}}} {load1}',
+                        f'resource_mem_used_bytes{{{labels}}} {mem_used_mb * 1024 * 1024}',
+                        f'resource_mem_free_bytes{{{labels}}} {mem_free_mb * 1024 * 1024}',
+                    ]
+                    for mount, used_gb, free_gb in ((CR_ROOT, disk_used_gb, disk_free_gb),
+                                                    ("/", disk_used_gb_root, disk_free_gb_root),
+                                                    (".", disk_used_gb_pwd, disk_free_gb_pwd)):
+                        if free_gb is not None:
+                            lines.append(f'resource_disk_used_gb{{mount="{mount}",{labels}}} {used_gb}')
+                            lines.append(f'resource_disk_free_gb{{mount="{mount}",{labels}}} {free_gb}')
+                    lines += [
+                        f'resource_disk_full_eta_seconds{{mount="{CR_ROOT}",{labels}}} {prom_value(disk_full_eta_s)}',
+                        f'resource_mem_oom_eta_seconds{{{labels}}} {prom_value(mem_oom_eta_s)}',
+                        f'resource_pipeline_phase{{phase="{phase}",{labels}}} 1',
+                    ]
+                    if cg_mem_cur is not None:
+                        lines.append(f'resource_cgroup_mem_current_bytes{{{labels}}} {cg_mem_cur}')
+                    if cg_fields.get("cg_mem_peak_mb") is not None:
+                        lines.append(f'resource_cgroup_mem_peak_bytes{{{labels}}} {int(cg_fields["cg_mem_peak_mb"] * 1024 * 1024)}')
+                    for name in ("anon", "file", "dirty", "writeback"):
+                        v = cg_fields.get(f"cg_mem_{name}_mb")
+                        if v is not None:
+                            lines.append(f'resource_cgroup_mem_stat_bytes{{stat="{name}",{labels}}} {int(v * 1024 * 1024)}')
+                    for name, field, scale in (("resource_cgroup_mem_working_set_bytes", "cg_mem_working_set_mb", 1024 * 1024),
+                                               ("resource_cgroup_mem_limit_bytes", "cg_mem_limit_mb", 1024 * 1024),
+                                               ("resource_cgroup_cpu_cores", "cg_cpu_cores", 1),
+                                               ("resource_cgroup_cpu_limit_cores", "cg_cpu_limit_cores", 1),
+                                               ("resource_cgroup_cpu_throttled_percent", "cg_throttled_pct", 1)):
+                        v = cg_fields.get(field)
+                        if v is not None:
+                            lines.append(f'{name}{{{labels}}} {int(v * scale) if scale > 1 else v}')
+                    for res in ("cpu", "mem", "io"):
+                        for kind in ("some", "full"):
+                            v = cg_fields.get(f"psi_{res}_{kind}")
+                            if v is not None:
+                                lines.append(f'resource_pressure_stall_percent{{resource="{res}",kind="{kind}",{labels}}} {v}')
+                    if percpu_vals is not None:
+                        for idx, val in enumerate(percpu_vals):
+                            lines.append(f'resource_cpu_percent{{cpu="{idx}",{labels}}} {val}')
+                    if disk_read_mb_s is not None:
+                        lines.extend([
+                            f'resource_disk_read_mb_s{{{labels}}} {disk_read_mb_s}',
+                            f'resource_disk_write_mb_s{{{labels}}} {disk_write_mb_s}',
+                            f'resource_net_recv_mb_s{{{labels}}} {net_recv_mb_s}',
+                            f'resource_net_sent_mb_s{{{labels}}} {net_sent_mb_s}',
+                        ])
+                    if dev_stats is not None:
+                        for sfx, path in DEVICE_MOUNTS:
+                            vals = dev_stats.get(sfx) or {}
+                            dev_labels = f'mount="{path or CR_ROOT}",device="{devio.devices.get(sfx) or ""}",{labels}'
+                            for f, metric in (("disk_iops", "resource_disk_iops"), ("disk_await_ms", "resource_disk_await_ms"),
+                                              ("disk_queue", "resource_disk_queue_depth"), ("disk_util_pct", "resource_disk_util_percent")):
+                                if vals.get(f) is not None:
+                                    lines.append(f'{metric}{{{dev_labels}}} {vals[f]}')
+                    if alt["pid"] is not None:
+                        lines.extend([
+                            f'resource_alt_cpu_percent{{{labels}}} {alt["cpu"]}',
+                            f'resource_alt_rss_bytes{{{labels}}} {int(alt["rss_mb"] * 1024 * 1024)}',
+                            f'resource_alt_vsz_bytes{{{labels}}} {int(alt["vsz_mb"] * 1024 * 1024)}',
+                        ])
+                        if alt["pss_mb"] is not None:
+                            lines.append(f'resource_alt_pss_bytes{{{labels}}} {int(alt["pss_mb"] * 1024 * 1024)}')
+                        if alt["hwm_sum_mb"] is not None:
+                            lines.append(f'resource_alt_rss_peak_sum_bytes{{{labels}}} {int(alt["hwm_sum_mb"] * 1024 * 1024)}')
+                    lines.append(f'resource_alt_workers{{{labels}}} {alt["workers"]}')
+                    if prog_fields.get("progress_pct") is not None:
+                        lines.append(f'resource_input_progress_percent{{{labels}}} {prog_fields["progress_pct"]}')
+                        lines.append(f'resource_input_eta_seconds{{{labels}}} {prom_value(prog_fields["progress_eta_s"])}')
+                        lines.append(f'resource_input_stalled_seconds{{{labels}}} {prog_fields["progress_stalled_s"]}')
+                        if prog_fields.get("progress_mb_s") is not None:
+                            lines.append(f'resource_input_read_bytes_per_second{{{labels}}} {int(prog_fields["progress_mb_s"] * 1024 * 1024)}')
+                    # Counters: cumulative since the monitor (or, for host IO, the machine) started
+                    counters = [
+                        ("resource_alt_cpu_seconds_total", "", round(alt_cpu_seconds, 3)),
+                        ("resource_monitor_cpu_seconds_total", "", round(time.process_time(), 3)),
+                        ("resource_monitor_samples_total", "", sample + 1),
+                    ]
+                    if alt["read_mb"] is not None:
+                        counters.append(("resource_alt_io_bytes_total", 'direction="read",', int(alt["read_mb"] * 1024 * 1024)))
+                        counters.append(("resource_alt_io_bytes_total", 'direction="write",', int(alt["write_mb"] * 1024 * 1024)))
+                    if io_totals is not None:
+                        (drd, dwr), (nrx, ntx) = io_totals
+                        counters.extend([
+                            ("resource_disk_io_bytes_total", 'direction="read",', drd),
+                            ("resource_disk_io_bytes_total", 'direction="write",', dwr),
+                            ("resource_net_io_bytes_total", 'direction="recv",', nrx),
+                            ("resource_net_io_bytes_total", 'direction="sent",', ntx),
+                        ])
+                    for name, field in (("resource_cgroup_oom_kills_total", "cg_oom_kill"),
+                                        ("resource_cgroup_throttled_periods_total", "cg_nr_throttled"),
+                                        ("resource_cgroup_throttled_seconds_total", "cg_throttled_s")):
+                        if cg_fields.get(field) is not None:
+                            counters.append((name, "", cg_fields[field]))
+                    if stack_sampler is not None:
+                        counters.append(("resource_stack_samples_total", "", stack_sampler.samples))
+                    if recorder is not None:
+                        counters.append(("resource_flight_dumps_total", "", recorder.dumps))
+                    counters.extend(("resource_events_total", f'event="{name}",', n) for name, n in sorted(events.counts.items()))
+                    typed = set()
+                    for name, extra, val in counters:
+                        if name not in typed:
+                            lines.append(f"# TYPE {name} counter")
+                            typed.add(name)
+                        lines.append(f"{name}{{{extra}{labels}}} {val}")
+                    for c in collectors:
+                        if c.latency_s is not None:
+                            lines.append(f'resource_collector_latency_seconds{{collector="{c.name}",{labels}}} {round(c.latency_s, 4)}')
+                    lines.extend([
+                        f'resource_monitor_cpu_percent{{{labels}}} {governor.usage_pct or 0}',
+                        f'resource_monitor_rss_bytes{{{labels}}} {int((record["mon_rss_mb"] or 0) * 1024 * 1024)}',
+                        f'resource_monitor_degrade_level{{{labels}}} {governor.level}',
+                        "# TYPE resource_monitor_collector_cpu_seconds_total counter",
+                        f'resource_monitor_collector_cpu_seconds_total{{collector="main",{labels}}} {round(time.thread_time(), 3)}',
+                    ])
+                    lines.extend(f'resource_monitor_collector_cpu_seconds_total{{collector="{c.name}",{labels}}} {round(c.cpu_s, 3)}'
+                                 for c in collectors)
+                    lines.append("# TYPE resource_collector_runs_total counter")
+                    lines.extend(f'resource_collector_runs_total{{collector="{c.name}",{labels}}} {c.runs}' for c in collectors)
+                    lines.append("# TYPE resource_collector_timeouts_total counter")
+                    lines.extend(f'resource_collector_timeouts_total{{collector="{c.name}",{labels}}} {c.timeouts}' for c in collectors)
+                    lines.extend(hist_alt_cpu.lines("resource_alt_cpu_percent_per_tick", labels))
+                    lines.extend(hist_alt_rss.lines("resource_alt_rss_bytes_per_tick", labels))
+                    text = "\n".join(lines) + "\n"
+                    if EXPORT_PROM:
+                        out.prom.set(text)
+                    if server is not None:
+                        server.set(text)
+                except Exception:
+                    pass
 
-        # top snapshots (limited)
-        if psutil:
-            try:
-                procs = list(psutil.process_iter(attrs=["pid","cpu_percent","memory_percent","name","cmdline","memory_info"]))
-                top_cpu = sorted(procs, key=lambda p: p.info.get("cpu_percent") or 0.0, reverse=True)[:30]
-                top_rss = sorted(procs, key=lambda p: (p.info.get("memory_info").rss if p.info.get("memory_info") else 0), reverse=True)[:30]
-                with open(TOP_TXT, "w") as f:
-                    print(f"[{ts}] top by CPU:", file=f)
-                    for p in top_cpu:
-                        cmd = " ".join(p.info.get("cmdline") or [])
-                        mi = p.info.get("memory_info")
-                        print(f"{p.info.get('pid')} {p.info.get('cpu_percent')}% {p.info.get('memory_percent'):.2f}% {mi.rss/1024/1024 if mi else 0:.1f}MB {p.info.get('name')} {cmd}", file=f)
-                    print("\n", file=f)
-                    print(f"[{ts}] top by RSS:", file=f)
-                    for p in top_rss:
-                        cmd = " ".join(p.info.get("cmdline") or [])
-                        mi = p.info.get("memory_info")
-                        print(f"{p.info.get('pid')} {mi.rss/1024/1024 if mi else 0:.1f}MB {p.info.get('cpu_percent')}% {p.info.get('memory_percent'):.2f}% {p.info.get('name')} {cmd}", file=f)
+            # Low disk: walk now instead of waiting for the heavy cadence (requests coalesce)
+            try:
+                if heavy is not None and disk_free_gb is not None and disk_free_gb <= LOW_DISK_GB_WARN:
+                    heavy.request()
             except Exception:
                 pass
-        # heavy sampling
-        do_heavy = False
-        if LIGHT_MODE == 0:
-            # time-based cadence
+
+            # adaptive sleep
+            disk_critical = "low_disk_crit" in events.active
+            etas = [e for e in (disk_full_eta_s, mem_oom_eta_s) if e is not None and e < FORECAST_HORIZON_SECONDS]
+            io_mb_s = disk_read_mb_s + disk_write_mb_s if disk_read_mb_s is not None else None
+            now_m = time.monotonic()
+            cpu_now = time.process_time()
+            sched.tick_done(now_m, cpu_now - cpu_mark)
+            cpu_mark = cpu_now
+            if governor.update(now_m, cpu_now):
+                apply_level(governor.level)
+                print(f"[{ts}] monitor CPU {governor.usage_pct}% of a core vs budget {CPU_BUDGET_PCT}%: "
+                      f"degrade level {governor.level}", file=sys.stderr)
+            next_sleep, sleep_reason = sched.next_interval(
+                now_m, alt, phase=phase, io_mb_s=io_mb_s, mem_frac=mem_frac, etas=etas,
+                eta_floor_s=MIN_INTERVAL, disk_critical=disk_critical)
+
+            # Flush on cadence, or right away when disk is critical and the task may die soon
+            if sleep_reason in SampleScheduler.URGENT:
+                out.flush(sync=bool(FSYNC))
+            else:
+                out.maybe_flush()
+
+            # Checkpoint: what this attempt has done so far, for stitching attempts after a preemption
+            ckpt_counters["alt_cpu_core_s"] = round(alt_cpu_seconds, 1)
+            ckpt_counters["mon_cpu_s"] = round(time.process_time(), 1)
+            for key, val in (("alt_read_mb", alt["read_mb"]), ("alt_write_mb", alt["write_mb"]),
+                             ("cg_read_mb", cg_fields.get("cg_read_mb")), ("cg_write_mb", cg_fields.get("cg_write_mb"))):
+                if val is not None:
+                    ckpt_counters[key] = val
+            # Sampled tree RSS or the largest single process; the summed VmHWM only bounds it
+            peaks = [st["peak_rss_mb"] for st in phases.stats.values() if st["peak_rss_mb"] is not None]
+            if alt["proc_hwm_mb"] is not None:
+                peaks.append(alt["proc_hwm_mb"])
+            ckpt.update(record, samples=sample + 1, phase=phase, phases_reached=list(phases.stats),
+                        counters={**ckpt_counters, "cg_cpu_core_s": round(ckpt_counters["cg_cpu_core_s"], 1)},
+                        peaks={"alt_rss_mb": max(peaks) if peaks else None, "cg_mem_peak_mb": cg_fields.get("cg_mem_peak_mb")})
+            if ckpt.due(now_m, CHECKPOINT_SECONDS) or sleep_reason in SampleScheduler.URGENT:
+                try:
+                    ckpt.write(sync=bool(FSYNC))
+                    if history is not None:
+                        write_atomic(PROC_HISTORY_JSON, history.report(history_context))
+                except Exception:
+                    pass
+
+            sample += 1
+            if MAX_SAMPLES > 0 and sample >= MAX_SAMPLES:
+                exit_status = "finished"
+                break
+            # Absolute deadlines: collection time does not stretch the period; after an overrun
+            # the schedule restarts from now instead of firing catch-up ticks
+            next_tick += next_sleep
+            now_m = time.monotonic()
+            if next_tick < now_m:
+                next_tick = now_m
+            sleep_or_stop(next_tick - now_m)
+    except Shutdown:
+        # The WDL's exit trap leaves the task's exit status in the stop file before its SIGTERM;
+        # any other SIGTERM is unexpected: an abort, a preemption or the VM shutting down
+        task_exit = read_stop_file()
+        exit_status = "terminated" if task_exit is None else "finished"
+    except KeyboardInterrupt:
+        exit_status = "interrupted"
+    finally:
+        # The checkpoint goes first: after a SIGTERM the VM may only have seconds left
+        try:
+            extra = {"preempted": gce_preempted()} if exit_status == "terminated" else {}
+            if task_exit is not None:
+                extra["task_exit"] = task_exit
+            ckpt.write(exit_status, sync=True, **extra)
+        except Exception:
+            pass
+        dump_reason = {"terminated": "sigterm", "failed": "failed"}.get(exit_status)
+        if task_exit:
+            dump_reason = "task_failed"
+        if recorder is not None and dump_reason:
             try:
-                if int(time.time()) % HEAVY_INTERVAL < INTERVAL:
-                    do_heavy = True
+                recorder.dump(dump_reason, final=True)
             except Exception:
                 pass
-            # low disk
+        if history is not None:
             try:
-                if float(disk_free_gb) <= LOW_DISK_GB_WARN:
-                    do_heavy = True
+                write_atomic(PROC_HISTORY_JSON, history.report(history_context))
             except Exception:
                 pass
-        if do_heavy:
+        for c in collectors:
+            c.stop(join_s=0.2)
+        out.close()
+        if server is not None:
             try:
-                # limited and simple to avoid large overheads
-                key_dirs = [CR_ROOT, os.environ.get("TMPDIR", "/tmp"), "/mnt/bam", "/mnt/altanalyze_output", "/cromwell_root"]
-                lines = [f"[{ts}] du -sk key dirs (MB):\n"]
-                for d in key_dirs:
-                    try:
-                        st = os.statvfs(d)
-                        used_mb = int(((st.f_blocks - st.f_bfree) * st.f_frsize) / 1024 / 1024)
-                        lines.append(f"{used_mb:10d} MB\t{d}\n")
-                    except Exception:
-                        pass
-                lines.append(f"[{ts}] largest files under {CR_ROOT}:\n")
-                # Avoid expensive recursive walks: cap files and depth
-                largest = []
-                for root, dirs, files in os.walk(CR_ROOT):
-                    # do not cross filesystem boundaries and limit traversal
-                    if len(root.split(os.sep)) - len(CR_ROOT.split(os.sep)) > 3:
-                        dirs[:] = []
-                        continue
-                    for fn in files:
-                        try:
-                            p = os.path.join(root, fn)
-                            st = os.stat(p)
-                            largest.append((st.st_size, p))
-                        except Exception:
-                            pass
-                    if len(largest) > 5000:
-                        break
-                largest.sort(reverse=True)
-                lines.extend([f"{sz/1024/1024:8.1f} MB {path}\n" for sz, path in largest[:50]])
-                with open(LARGEST_TXT, "w") as f:
-                    f.writelines(lines)
+                server.close()
             except Exception:
                 pass
-
-        # adaptive sleep
-        next_sleep = INTERVAL
         try:
-            if float(disk_free_gb) <= LOW_DISK_GB_CRIT:
-                print(f"[{ts}] CRITICAL: low disk ({disk_free_gb} GB free)", file=sys.stderr)
-                next_sleep = 5
-            elif float(disk_free_gb) <= LOW_DISK_GB_WARN:
-                print(f"[{ts}] WARNING: low disk ({disk_free_gb} GB free)", file=sys.stderr)
-                next_sleep = INTERVAL
+            if phases.stats:
+                write_atomic(PHASES_TSV, phases.report())
         except Exception:
             pass
+        write_summary(out.last_tsv_line)
 
-        sample += 1
-        if MAX_SAMPLES > 0 and sample >= MAX_SAMPLES:
-            write_summary()
-            break
-        time.sleep(next_sleep)
-except KeyboardInterrupt:
-    pass
-finally:
-    write_summary()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""Fixed-schema binary sample file (``usage.bin``) written by monitor.py.
+
+Layout:
+  - bytes [0, 32): struct ``<8sQQI4x`` = magic, records written (ever), ring capacity, header JSON length
+  - bytes [32, HEADER_SIZE): JSON header: columns, struct format, static context (task, shard,
+    attempt, cwd, sample, ...), JSONL key order and TSV columns used by the exporter
+  - bytes [HEADER_SIZE, ...): fixed-size little-endian records; record ``i`` lives in slot
+    ``i % capacity``, so once ``capacity`` records are written the oldest are overwritten
+
+Column codes: ``d`` float64, ``f`` float32 (NaN = null), ``i`` int32 (INT_NULL = null).
+Columns named ``<field>.<n>`` are reassembled into the list ``<field>`` on export.
+``i`` columns listed under the header's ``enums`` hold an index into that list of strings.
+The file grows in chunks as records arrive and is memory-mapped; a record is
+counted only after it has been written, so a crash never exposes a torn record.
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None
+
+MAGIC = b"MONBIN1\n"
+PREFIX = struct.Struct("<8sQQI4x")
+HEADER_SIZE = 8192
+GROW_RECORDS = 256
+INT_NULL = -(2 ** 31)
+
+
+def _pack_value(code: str, v: Any):
+    if code == "i":
+        return INT_NULL if v is None else int(v)
+    try:
+        return float("nan") if v is None else float(v)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _unpack_value(code: str, v: Any):
+    if code == "i":
+        return None if v == INT_NULL else v
+    if v != v:
+        return None
+    # float32 columns carry ~7 significant digits; do not print noise digits
+    return float(f"{v:.7g}") if code == "f" else v
+
+
+def _round_f32(col):
+    """``_unpack_value`` for a float64 array widened from float32: 7 significant digits."""
+    out = col.copy()
+    ok = np.isfinite(col) & (col != 0)
+    x = col[ok]
+    if not x.size:
+        return out
+    ax = np.abs(x)
+    mag = np.floor(np.log10(ax))
+    # log10 can land one off next to powers of ten
+    mag -= ax < 10.0 ** mag
+    mag += ax >= 10.0 ** (mag + 1)
+    e = 6 - mag
+    # Scale by exact powers of ten (multiply for e >= 0, divide otherwise) so the result is the
+    # float nearest the 7-digit decimal, as float(f"{v:.7g}") gives
+    p = 10.0 ** np.abs(e)
+    out[ok] = np.where(e >= 0, np.round(x * p) / p, np.round(x / p) * p)
+    return out
+
+
+class SampleStore:
+    """Append-only ring of fixed-size records in a memory-mapped file."""
+
+    def __init__(self, path: str, columns: Sequence[Tuple[str, str]], context: Dict[str, Any],
+                 capacity: int = 1 << 20, optional: Sequence[str] = (), jsonl_order: Sequence[str] = (),
+                 tsv_columns: Sequence[str] = (), enums: Optional[Dict[str, Sequence[str]]] = None):
+        self.path = path
+        self.columns = [tuple(c) for c in columns]
+        self.names = [c[0] for c in self.columns]
+        self.codes = [c[1] for c in self.columns]
+        self.rec = struct.Struct("<" + "".join(self.codes))
+        # "<field>.<n>" columns are filled from element n of the list in <field>
+        self._getters = []
+        for n in self.names:
+            base, dot, idx = n.rpartition(".")
+            self._getters.append((base, int(idx)) if dot and idx.isdigit() else (n, None))
+        self._enums = {k: {name: i for i, name in enumerate(v)} for k, v in (enums or {}).items()}
+        self.header = {
+            "version": 1,
+            "columns": [list(c) for c in self.columns],
+            "format": "<" + "".join(self.codes),
+            "record_size": self.rec.size,
+            "context": dict(context),
+            "optional": list(optional),
+            "jsonl_order": list(jsonl_order),
+            "tsv_columns": list(tsv_columns),
+            "enums": {k: list(v) for k, v in (enums or {}).items()},
+        }
+        self.capacity = capacity
+        self.count = 0
+        self._fh = None
+        self._mm = None
+        self._open()
+
+    def _open(self) -> None:
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= HEADER_SIZE:
+            try:
+                hdr, count, capacity = read_header(self.path)
+                if (hdr.get("format") == self.header["format"] and hdr.get("columns") == self.header["columns"]
+                        and hdr.get("enums", {}) == self.header["enums"]):
+                    # Same schema (e.g. monitor restarted in the same attempt): keep appending
+                    self.header["context"] = {**hdr.get("context", {}), **self.header["context"]}
+                    self.count, self.capacity = count, capacity
+                else:
+                    os.replace(self.path, f"{self.path}.{int(os.path.getmtime(self.path))}")
+            except Exception:
+                os.replace(self.path, f"{self.path}.corrupt")
+        self._fh = open(self.path, "r+b" if os.path.exists(self.path) else "w+b")
+        self._map(max(self._slots_for(self.count), GROW_RECORDS))
+        self._write_header()
+
+    def _slots_for(self, n: int) -> int:
+        return min(self.capacity, ((n + GROW_RECORDS - 1) // GROW_RECORDS) * GROW_RECORDS)
+
+    def _map(self, slots: int) -> None:
+        size = HEADER_SIZE + slots * self.rec.size
+        if self._mm is not None:
+            self._mm.close()
+        if os.fstat(self._fh.fileno()).st_size < size:
+            self._fh.truncate(size)
+        self._mm = mmap.mmap(self._fh.fileno(), size)
+        self._slots = slots
+
+    def _write_header(self) -> None:
+        blob = json.dumps(self.header).encode()
+        if PREFIX.size + len(blob) > HEADER_SIZE:
+            raise ValueError("samplestore header too large")
+        self._mm[PREFIX.size:PREFIX.size + len(blob)] = blob
+        self._mm[PREFIX.size + len(blob):HEADER_SIZE] = bytes(HEADER_SIZE - PREFIX.size - len(blob))
+        self._mm[:PREFIX.size] = PREFIX.pack(MAGIC, self.count, self.capacity, len(blob))
+
+    def set_context(self, **kv: Any) -> None:
+        """Update static context (e.g. the sample name once it is known) in place."""
+        if all(self.header["context"].get(k) == v for k, v in kv.items()):
+            return
+        self.header["context"].update(kv)
+        self._write_header()
+
+    def append(self, record: Dict[str, Any]) -> None:
+        slot = self.count % self.capacity
+        if slot >= self._slots:
+            self._map(min(self.capacity, self._slots + GROW_RECORDS))
+        off = HEADER_SIZE + slot * self.rec.size
+        vals = []
+        for (key, idx), code in zip(self._getters, self.codes):
+            v = record.get(key)
+            if idx is not None:
+                v = v[idx] if isinstance(v, (list, tuple)) and idx < len(v) else None
+            elif key in self._enums:
+                v = self._enums[key].get(v)
+            vals.append(_pack_value(code, v))
+        self.rec.pack_into(self._mm, off, *vals)
+        # Publish the record only after its bytes are in place
+        self.count += 1
+        struct.pack_into("<Q", self._mm, 8, self.count)
+
+    def flush(self) -> None:
+        if self._mm is not None:
+            self._mm.flush()
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm.close()
+            self._mm = None
+        if self._fh is not None:
+            # Drop the unused tail of the last growth chunk so the final file is compact
+            self._fh.truncate(HEADER_SIZE + min(self.count, self.capacity) * self.rec.size)
+            self._fh.close()
+            self._fh = None
+
+
+def read_header(path: str) -> Tuple[Dict[str, Any], int, int]:
+    """(header JSON, records written, capacity) of a usage.bin file."""
+    with open(path, "rb") as f:
+        pre = f.read(PREFIX.size)
+        magic, count, capacity, hlen = PREFIX.unpack(pre)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a samplestore file")
+        return json.loads(f.read(hlen)), count, capacity
+
+
+class StoreReader:
+    """Read-only view of a usage.bin file. Records are returned oldest first."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.header, self.count, self.capacity = read_header(path)
+        self.columns = [tuple(c) for c in self.header["columns"]]
+        self.rec = struct.Struct(self.header["format"])
+        self.context = self.header.get("context", {})
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        avail = (len(self._mm) - HEADER_SIZE) // self.rec.size
+        self.n = min(self.count, self.capacity, avail)
+        # Oldest record sits right after the newest once the ring has wrapped
+        self.start = self.count % self.capacity if self.count > self.capacity else 0
+        self.wrapped = self.count > self.capacity
+
+    def _ranges(self) -> List[Tuple[int, int]]:
+        if not self.wrapped:
+            return [(0, self.n)]
+        return [(self.start, self.capacity), (0, self.start)]
+
+    def rows(self) -> Iterator[tuple]:
+        """Raw tuples in column order."""
+        for a, b in self._ranges():
+            # Block by block, so a long ring is never copied out whole
+            for lo in range(a, b, 4096):
+                hi = min(b, lo + 4096)
+                yield from self.rec.iter_unpack(self._mm[HEADER_SIZE + lo * self.rec.size:HEADER_SIZE + hi * self.rec.size])
+
+    def arrays(self) -> Dict[str, Any]:
+        """Column name -> array of float64 (null as NaN), oldest first.
+
+        Uses NumPy (zero-copy view over the mapping, then one conversion) when it is
+        installed, otherwise ``array.array('d')``.
+        """
+        if np is not None:
+            dt = self._dtype()
+            parts = [np.frombuffer(self._mm, dtype=dt, count=b - a, offset=HEADER_SIZE + a * self.rec.size)
+                     for a, b in self._ranges() if b > a]
+            return self._to_columns(np.concatenate(parts) if parts else np.zeros(0, dtype=dt))
+        from array import array
+        out = {n: array("d") for n, _ in self.columns}
+        for row in self.rows():
+            for (n, c), v in zip(self.columns, row):
+                out[n].append(float("nan") if c == "i" and v == INT_NULL else float(v))
+        return out
+
+    def chunks(self, size: int = 4096) -> Iterator[Dict[str, Any]]:
+        """Like ``arrays()``, ``size`` records at a time, so memory stays at one chunk; needs NumPy."""
+        dt = self._dtype()
+        for a, b in self._ranges():
+            for lo in range(a, b, size):
+                hi = min(b, lo + size)
+                yield self._to_columns(np.frombuffer(self._mm, dtype=dt, count=hi - lo,
+                                                     offset=HEADER_SIZE + lo * self.rec.size))
+
+    def _dtype(self):
+        return np.dtype([(n, "<" + {"d": "f8", "f": "f4", "i": "i4"}[c]) for n, c in self.columns])
+
+    def _to_columns(self, recs) -> Dict[str, Any]:
+        out = {}
+        for n, c in self.columns:
+            col = recs[n].astype("f8")
+            if c == "i":
+                col[recs[n] == INT_NULL] = np.nan
+            elif c == "f":
+                col = _round_f32(col)
+            out[n] = col
+        return out
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """Records shaped like usage.jsonl lines (static context merged back in)."""
+        ctx = self.context
+        start = ctx.get("start_epoch")
+        optional = set(self.header.get("optional", []))
+        order = self.header.get("jsonl_order") or []
+        enums = self.header.get("enums", {})
+        for row in self.rows():
+            vals: Dict[str, Any] = {}
+            lists: Dict[str, List[Any]] = {}
+            for (n, c), v in zip(self.columns, row):
+                v = _unpack_value(c, v)
+                if n in enums and v is not None:
+                    v = enums[n][v] if 0 <= v < len(enums[n]) else None
+                base, dot, idx = n.rpartition(".")
+                if dot and idx.isdigit():
+                    lists.setdefault(base, []).append(v)
+                elif v is not None or n not in optional:
+                    vals[n] = v
+            for base, lst in lists.items():
+                if not (base in optional and all(x is None for x in lst)):
+                    vals[base] = lst
+            t = vals.pop("t", None)
+            rec: Dict[str, Any] = {}
+            if t is not None:
+                rec["ts"] = datetime.fromtimestamp(t).isoformat()
+                if start is not None:
+                    rec["mon_secs"] = int(t - start)
+            for k in order:
+                if k in ctx and k not in rec:
+                    rec[k] = ctx[k]
+                elif k in vals:
+                    rec[k] = vals.pop(k)
+            rec.update(vals)
+            yield rec
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+def export(path: str, jsonl: Optional[str] = None, tsv: Optional[str] = None) -> int:
+    """Write usage.jsonl and/or usage.tsv equivalents of a usage.bin file; returns the record count."""
+    r = StoreReader(path)
+    cols = r.header.get("tsv_columns") or []
+    n = 0
+    fj = open(jsonl, "w") if jsonl else None
+    ft = open(tsv, "w") if tsv else None
+    try:
+        if ft and cols:
+            ft.write("\t".join(["timestamp"] + cols) + "\n")
+        for rec in r.records():
+            n += 1
+            if fj:
+                fj.write(json.dumps(rec) + "\n")
+            if ft and cols:
+                ft.write("\t".join(map(str, [rec.get("ts", "")] + [rec.get(c) for c in cols])) + "\n")
+    finally:
+        for f in (fj, ft):
+            if f:
+                f.close()
+        r.close()
+    return n
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Export a monitor usage.bin file to JSONL/TSV.")
+    p.add_argument("path", help="usage.bin file")
+    p.add_argument("--jsonl", default=None, help="Write JSON lines here")
+    p.add_argument("--tsv", default=None, help="Write TSV here")
+    p.add_argument("--info", action="store_true", help="Print the header and record counts")
+    args = p.parse_args()
+    if args.info or not (args.jsonl or args.tsv):
+        hdr, count, capacity = read_header(args.path)
+        print(json.dumps({"count": count, "capacity": capacity, "header": hdr}, indent=2))
+    if args.jsonl or args.tsv:
+        n = export(args.path, args.jsonl, args.tsv)
+        print(f"Exported {n} records")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import json
+import math
+import os
+import random
+import time
+from datetime import datetime
+
+import pytest
+
+import aggregate
+from aggregate import QuantileSketch, RunningStats, StreamAggregator, feed
+from samplestore import SampleStore
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+needs_numpy = pytest.mark.skipif(np is None, reason="NumPy not installed")
+
+
+def exact_quantile(values, q):
+    s = sorted(values)
+    return s[int(q / 100.0 * (len(s) - 1))]
+
+
+@pytest.mark.parametrize("dist", ["uniform", "lognormal", "signed"])
+def test_sketch_quantiles_within_relative_error(dist):
+    rng = random.Random(7)
+    if dist == "uniform":
+        values = [rng.uniform(0, 100) for _ in range(20000)]
+    elif dist == "lognormal":
+        values = [rng.lognormvariate(3, 2) for _ in range(20000)]
+    else:
+        values = [rng.uniform(-50, 50) for _ in range(20000)]
+    sk = QuantileSketch()
+    for v in values:
+        sk.add(v)
+    for q in (50, 95, 99):
+        exact = exact_quantile(values, q)
+        assert abs(sk.quantile(q) - exact) <= sk.rel_err * abs(exact) + 1e-9
+
+
+@needs_numpy
+def test_sketch_add_array_and_merge_match_single_sketch():
+    rng = np.random.default_rng(3)
+    values = rng.lognormal(2, 1.5, 10000)
+    whole = QuantileSketch()
+    for v in values.tolist():
+        whole.add(v)
+    halves = QuantileSketch()
+    halves.add_array(values[:4000])
+    other = QuantileSketch.from_dict(json.loads(json.dumps(_sketch_of(values[4000:]).to_dict())))
+    halves.merge(other)
+    assert halves.count == whole.count
+    for q in (1, 50, 95, 99):
+        assert halves.quantile(q) == whole.quantile(q)
+
+
+def _sketch_of(values):
+    sk = QuantileSketch()
+    sk.add_array(values)
+    return sk
+
+
+@needs_numpy
+def test_running_stats_chunked_merge_equals_single_pass():
+    rng = np.random.default_rng(11)
+    values = rng.normal(500, 80, 9000)
+    values[rng.random(9000) < 0.1] = np.nan
+    dts = rng.uniform(0.5, 2.0, 9000)
+    single = RunningStats()
+    for v, dt in zip(values.tolist(), dts.tolist()):
+        if v == v:
+            single.add(v, dt)
+    chunked = RunningStats()
+    for lo in range(0, 9000, 1000):
+        chunked.add_array(values[lo:lo + 1000], dts[lo:lo + 1000])
+    assert chunked.n == single.n
+    assert chunked.min == single.min and chunked.max == single.max
+    # Sums accumulate in sample order on both paths: bit-identical, not merely close
+    assert (chunked.mean, chunked.m2, chunked.tw_sum, chunked.tw_span) == \
+        (single.mean, single.m2, single.tw_sum, single.tw_span)
+    assert chunked.m2 == pytest.approx(float(np.nanvar(values, ddof=0)) * single.n, rel=1e-9)
+    assert chunked.summary() == single.summary()
+
+
+@needs_numpy
+def test_running_stats_constant_series_has_no_variance():
+    st = RunningStats()
+    st.add_array(np.full(5000, 79.7), np.ones(5000))
+    s = st.summary()
+    assert (s["avg"], s["std"], s["tw_avg"], s["p95"]) == (79.7, 0.0, 79.7, 79.7)
+
+
+COLUMNS = [("t", "d"), ("load1", "f"), ("mem_used_mb", "i"), ("disk_free_gb", "f"),
+           ("alt_cpu", "f"), ("alt_rss_mb", "f"), ("cg_mem_peak_mb", "f"),
+           ("cg_mem_working_set_mb", "f"), ("alt_read_mb", "d"), ("phase", "i")]
+PHASES = ["", "bam_to_bed", "junction"]
+ORDER = ["ts", "task", "shard", "load1", "mem_used_mb", "disk_free_gb", "alt_cpu", "alt_rss_mb",
+         "cg_mem_peak_mb", "cg_mem_working_set_mb", "alt_read_mb", "phase"]
+
+
+def write_run(mon_dir, n=600):
+    """The same samples as usage.bin and as usage.jsonl, values rounded as monitor.py rounds them."""
+    rng = random.Random(5)
+    store = SampleStore(os.path.join(mon_dir, "usage.bin"), COLUMNS, {"task": "BamToBed", "shard": "3"},
+                        capacity=1 << 12, jsonl_order=ORDER, enums={"phase": PHASES})
+    t = time.time() - n
+    read = 0.0
+    with open(os.path.join(mon_dir, "usage.jsonl"), "w") as f:
+        for i in range(n):
+            t += rng.uniform(0.8, 1.3)
+            read += rng.uniform(0, 40)
+            rec = {
+                "ts": datetime.fromtimestamp(t).isoformat(), "task": "BamToBed", "shard": "3",
+                "load1": round(rng.uniform(0, 4), 2), "mem_used_mb": rng.randint(500, 9000),
+                "disk_free_gb": 79.7 if i < n // 2 else round(rng.uniform(3, 79), 1),
+                "alt_cpu": None if i % 50 == 0 else round(rng.uniform(0, 400), 1),
+                "alt_rss_mb": round(rng.lognormvariate(7, 0.5), 1), "cg_mem_peak_mb": 2082.8,
+                "cg_mem_working_set_mb": round(rng.uniform(100, 700), 1), "alt_read_mb": round(read, 2),
+                "phase": PHASES[1 + i * 2 // n],
+            }
+            f.write(json.dumps(rec) + "\n")
+            store.append({**rec, "t": t})
+    store.close()
+
+
+def summarize(mon_dir, source):
+    acc = StreamAggregator()
+    feed(acc, mon_dir, source)
+    return acc.result()
+
+
+def test_bin_jsonl_and_pure_python_summaries_match(tmp_path, monkeypatch):
+    write_run(str(tmp_path))
+    results = []
+    if np is not None:
+        results += [summarize(str(tmp_path), "bin"), summarize(str(tmp_path), "jsonl")]
+    monkeypatch.setattr(aggregate, "np", None)
+    results += [summarize(str(tmp_path), "bin"), summarize(str(tmp_path), "jsonl")]
+    from_bin = results[0]
+    for other in results[1:]:
+        assert other == from_bin
+    m = from_bin["metrics"]
+    # float32 storage must not leak digits: 79.7 stays 79.7
+    assert m["disk_free_gb"]["max"] == 79.7
+    assert m["cg_mem_peak_mb"]["avg"] == 2082.8
+    assert from_bin["count"] == 600 and from_bin["task"] == "BamToBed"
+    for stats in m.values():
+        for v in stats.values():
+            assert v is None or math.isfinite(v)
+
+
+def cgroup_run(n=10, cores=2.0, throttled_pct=0.0, limit=2.0):
+    for i in range(n):
+        yield {"ts": f"2026-01-01T00:{i // 6:02d}:{i % 6 * 10:02d}", "alt_cpu": 900.0, "alt_rss_mb": 100.0,
+               "cg_cpu_cores": cores, "cg_cpu_limit_cores": limit, "cg_throttled_s": float(i),
+               "cg_throttled_pct": throttled_pct, "cg_mem_working_set_mb": 1500.0 if i == 5 else 1000.0,
+               "cg_mem_limit_mb": 4096.0, "cg_mem_peak_mb": 3900.0}
+
+
+def test_sizing_from_the_cgroup():
+    sz = aggregate.aggregate(cgroup_run())["sizing"]
+    # The tree's alt_cpu (host-wide view) is ignored when cgroup fields exist
+    assert (sz["source"], sz["cpu_core_s"], sz["cpu_cores_avg"], sz["cpu_limit_cores"]) == ("cgroup", 180.0, 2.0, 2.0)
+    assert (sz["cpu_util_avg_pct"], sz["cpu_throttled_s"], sz["cpu_limited"]) == (100.0, 9.0, False)
+    assert sz["recommended_cpu_cores"] == 2
+    # memory.peak (page cache included) does not drive the recommendation
+    assert (sz["mem_working_set_max_mb"], sz["mem_peak_mb"], sz["mem_util_max_pct"]) == (1500.0, 1500.0, 36.6)
+    assert sz["recommended_mem_gb"] == math.ceil(1500 * aggregate.MEM_HEADROOM / 1024)
+
+
+def test_sizing_when_throttled_or_spiking():
+    acc = StreamAggregator()
+    for r in cgroup_run(throttled_pct=25.0):
+        acc.add(r)
+    acc.flush()
+    # Capped by the quota: ask for more than the limit; a VmHWM spike between samples counts
+    sz = aggregate.sizing(acc, alt_hwm_rss_mb=2500.0)
+    assert (sz["cpu_limited"], sz["recommended_cpu_cores"]) == (True, 3)
+    assert (sz["mem_peak_mb"], sz["recommended_mem_gb"]) == (2500.0, 3)
+
+
+def test_sizing_falls_back_to_the_tree():
+    recs = [{"ts": f"2026-01-01T00:00:{i * 10:02d}", "alt_cpu": 150.0, "alt_rss_mb": 800.0} for i in range(6)]
+    sz = aggregate.aggregate(recs)["sizing"]
+    assert (sz["source"], sz["cpu_cores_avg"], sz["cpu_core_s"]) == ("alt_tree", 1.5, 75.0)
+    assert (sz["recommended_cpu_cores"], sz["cpu_limit_cores"], sz["cpu_throttled_s"]) == (2, None, None)
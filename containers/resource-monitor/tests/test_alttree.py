@@ -0,0 +1,79 @@
+import os
+
+from monitor import AltTree
+
+MB = 1024 * 1024
+
+
+def row(pid, ppid, cmd, rss_mb=10, cpu=50.0, read_mb=0, write_mb=0, create_time=None, name=None):
+    return {"pid": pid, "ppid": ppid, "cmdline": cmd, "name": name or cmd.split()[0].rsplit("/", 1)[-1],
+            "create_time": float(pid if create_time is None else create_time), "cpu_percent": cpu,
+            "memory_percent": rss_mb / 100.0, "rss": rss_mb * MB, "vms": 2 * rss_mb * MB,
+            "read_bytes": read_mb * MB, "write_bytes": write_mb * MB}
+
+
+class FakeTable:
+    def __init__(self, pss=None, hwm=None):
+        self._pss, self._hwm = pss or {}, hwm or {}
+
+    def pss(self, pid):
+        return self._pss.get(pid)
+
+    def hwm(self, pid):
+        return self._hwm.get(pid)
+
+
+def tree_rows():
+    return [
+        row(1, 0, "/sbin/init"),
+        row(50, 1, "/bin/bash /cromwell_root/script"),
+        row(100, 50, "/bin/bash /usr/src/app/AltAnalyze.sh bam_to_bed a.bam", rss_mb=5),
+        # A matching child of a matching parent is a member, not another root
+        row(101, 100, "python /usr/src/app/AltAnalyze.py --runLineageProfiler", rss_mb=200, cpu=100.0),
+        row(102, 101, "samtools view a.bam", rss_mb=20, read_mb=30),
+        row(200, 1, "python unrelated.py", rss_mb=999),
+    ]
+
+
+def test_members_follow_the_tree():
+    tree = AltTree()
+    roots, members = tree.members(tree_rows())
+    assert [r["pid"] for r in roots] == [100]
+    assert sorted(r["pid"] for r in members) == [100, 101, 102]
+
+
+def test_archive_is_its_own_root_and_the_monitor_is_skipped():
+    rows = tree_rows() + [row(300, 50, "tar -czf altanalyze_output.tar.gz altanalyze_output"),
+                          row(os.getpid(), 100, "python3 monitor.py")]
+    roots, members = AltTree().members(rows)
+    assert [r["pid"] for r in roots] == [100, 300]
+    assert os.getpid() not in [r["pid"] for r in members]
+
+
+def test_collect_sums_the_tree():
+    tree = AltTree()
+    tree.pss = True
+    ptable = FakeTable(pss={100: 4 * MB, 101: 150 * MB}, hwm={100: 6 * MB, 101: 300 * MB, 102: 25 * MB})
+    alt = tree.collect(tree_rows(), ptable)
+    assert (alt["pid"], alt["workers"], alt["cpu"]) == (100, 3, 200.0)
+    assert (alt["rss_mb"], alt["vsz_mb"], alt["pss_mb"]) == (225.0, 450.0, 154.0)
+    assert (alt["hwm_sum_mb"], alt["proc_hwm_mb"]) == (331.0, 300.0)
+    assert alt["pmem"] == 2.25 and alt["read_mb"] == 30.0
+
+
+def test_io_of_exited_members_is_kept():
+    tree = AltTree()
+    assert tree.collect(tree_rows())["read_mb"] == 30.0
+    rows = [r for r in tree_rows() if r["pid"] != 102] + [row(103, 101, "samtools view b.bam", read_mb=5)]
+    assert tree.collect(rows)["read_mb"] == 35.0
+    # A reused pid is a new process: its counters start again on top of the old one's
+    rows.append(row(102, 101, "samtools view c.bam", read_mb=1, create_time=999))
+    assert tree.collect(rows)["read_mb"] == 36.0
+
+
+def test_no_tree_keeps_the_run_peak():
+    tree = AltTree()
+    tree.collect(tree_rows(), FakeTable(hwm={101: 300 * MB}))
+    alt = tree.collect([row(1, 0, "/sbin/init")], FakeTable())
+    assert (alt["pid"], alt["workers"], alt["rss_mb"], alt["read_mb"]) == (None, 0, None, None)
+    assert alt["proc_hwm_mb"] == 300.0
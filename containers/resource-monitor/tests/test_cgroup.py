@@ -0,0 +1,221 @@
+import json
+import os
+
+import pytest
+
+import monitor
+from monitor import CgroupSampler, HostTask, find_task_cgroups, host_index, host_index_row, read_cgroup_limits
+
+MB = 1024 * 1024
+CID = "ab" * 32
+OTHER = "cd" * 32
+
+
+def write(root, rel, files):
+    d = root / rel.lstrip("/")
+    d.mkdir(parents=True, exist_ok=True)
+    for name, text in files.items():
+        (d / name).write_text(text)
+    return d
+
+
+@pytest.fixture
+def v2(tmp_path, monkeypatch):
+    root = tmp_path / "cgroup"
+    write(root, "", {"cgroup.controllers": "cpu memory io\n"})
+    monkeypatch.setattr(monitor, "CGROUP_ROOT", str(root))
+    return root
+
+
+@pytest.fixture
+def v1(tmp_path, monkeypatch):
+    root = tmp_path / "cgroup"
+    for ctrl in ("memory", "cpu"):
+        (root / ctrl).mkdir(parents=True)
+    monkeypatch.setattr(monitor, "CGROUP_ROOT", str(root))
+    return root
+
+
+def test_limits_v2(v2):
+    write(v2, "/limited", {"cpu.max": "200000 100000\n", "memory.max": f"{1024 * MB}\n",
+                           "memory.current": f"{500 * MB}\n"})
+    write(v2, "/open", {"cpu.max": "max 100000\n", "memory.max": "max\n", "memory.current": f"{3 * MB}\n"})
+    assert read_cgroup_limits("/limited") == (2.0, 1024.0, 500.0)
+    assert read_cgroup_limits("/open") == (None, None, 3.0)
+    assert read_cgroup_limits("/missing") == (None, None, None)
+
+
+def test_limits_v1(v1):
+    write(v1, "/cpu/limited", {"cpu.cfs_quota_us": "150000\n", "cpu.cfs_period_us": "100000\n"})
+    write(v1, "/memory/limited", {"memory.limit_in_bytes": f"{2048 * MB}\n", "memory.usage_in_bytes": f"{10 * MB}\n"})
+    write(v1, "/cpu/open", {"cpu.cfs_quota_us": "-1\n", "cpu.cfs_period_us": "100000\n"})
+    # "Unlimited" is the largest page-aligned 64-bit value, not a real limit
+    write(v1, "/memory/open", {"memory.limit_in_bytes": "9223372036854771712\n", "memory.usage_in_bytes": "0\n"})
+    assert read_cgroup_limits("/limited") == (1.5, 2048.0, 10.0)
+    assert read_cgroup_limits("/open") == (None, None, 0.0)
+
+
+def test_find_task_cgroups(v2, monkeypatch):
+    write(v2, f"/system.slice/docker-{CID}.scope", {"cgroup.procs": "10\n"})
+    # Matching cgroups are not descended into
+    write(v2, f"/system.slice/docker-{CID}.scope/{OTHER}", {"cgroup.procs": ""})
+    write(v2, f"/kubepods/pod1/cri-containerd-{OTHER}.scope", {"cgroup.procs": ""})
+    write(v2, "/system.slice/ssh.service", {"cgroup.procs": "1\n"})
+    mine = f"/docker/{'ef' * 32}"
+    write(v2, mine, {"cgroup.procs": ""})
+    monkeypatch.setattr(monitor, "own_cgroup", lambda: mine)
+    found = find_task_cgroups(monitor.HOST_CGROUP_RE)
+    assert found == {f"/system.slice/docker-{CID}.scope": CID, f"/kubepods/pod1/cri-containerd-{OTHER}.scope": OTHER}
+
+
+def test_find_task_cgroups_v1(v1, monkeypatch):
+    write(v1, f"/memory/docker/{CID}", {"cgroup.procs": "10\n"})
+    monkeypatch.setattr(monitor, "own_cgroup", lambda: "")
+    assert find_task_cgroups(monitor.HOST_CGROUP_RE) == {f"/docker/{CID}": CID}
+
+
+def row(pid, ppid, cmd, rss_mb=10):
+    return {"pid": pid, "ppid": ppid, "cmdline": cmd, "name": cmd.split()[0].rsplit("/", 1)[-1],
+            "create_time": float(pid), "cpu_percent": 50.0, "memory_percent": 1.0,
+            "rss": rss_mb * MB, "vms": 2 * rss_mb * MB, "read_bytes": 0, "write_bytes": 0}
+
+
+def test_host_task_samples_the_pids_it_is_given(v2, tmp_path, monkeypatch):
+    path = f"/system.slice/docker-{CID}.scope"
+    write(v2, path, {"cgroup.procs": "100\n", "memory.current": f"{300 * MB}\n", "memory.max": f"{1000 * MB}\n",
+                     "memory.stat": f"anon {200 * MB}\nfile {100 * MB}\ninactive_file {50 * MB}\n",
+                     "cpu.max": "400000 100000\n", "memory.events": "oom 0\noom_kill 0\n"})
+    write(v2, f"{path}/workers", {"cgroup.procs": "101\n102\n"})
+    monkeypatch.setattr(monitor, "MON_DIR", str(tmp_path / "mon"))
+    task = HostTask(path, CID)
+    assert task.pids() == {100, 101, 102}
+    rows = [row(100, 1, "/bin/bash /usr/src/app/AltAnalyze.sh bam_to_bed bam/x.bam"),
+            row(101, 100, "python BAMtoJunctionBED.py --i bam/x.bam", rss_mb=40),
+            row(102, 100, "samtools view x.bam"),
+            row(200, 1, "python AltAnalyze.py")]
+    cwd = "/cromwell_root/wf/0f8e8c0a-1b2c-4d3e-8f90-123456789abc/call-BamToBed/shard-3/attempt-2"
+    monkeypatch.setattr(monitor.os, "readlink", lambda p: cwd)
+    pids = task.pids()
+    assert task.resolve([r for r in rows if r["pid"] in pids])
+    task.open(set())
+    assert (task.name, task.call, task.shard, task.attempt) == ("BamToBed.shard-3.attempt-2", "BamToBed", "3", "2")
+
+    def no_walk():
+        raise AssertionError("sample() must use the pids it was given")
+
+    task.pids = no_walk
+    rec = task.sample(1_700_000_000.0, "2026-01-01T00:00:00", rows, pids, None, {"load1": 0.5}, 5.0)
+    task.close()
+    assert rec["cg_procs"] == 3 and rec["alt_workers"] == 3 and rec["alt_rss_mb"] == 60.0
+    assert rec["phase"] == "bam_to_junction_bed" and rec["load1"] == 0.5
+    assert (rec["cg_mem_current_mb"], rec["cg_mem_working_set_mb"], rec["cg_mem_limit_mb"]) == (300.0, 250.0, 1000.0)
+    assert rec["cg_cpu_limit_cores"] == 4.0
+    with open(tmp_path / "mon" / "tasks" / task.name / "metadata.json") as f:
+        meta = json.load(f)
+    assert (meta["container"], meta["mem_limit_mb"], meta["cpu_limit_cores"]) == (CID, 1000.0, 4.0)
+    with open(tmp_path / "mon" / "tasks" / task.name / "usage.jsonl") as f:
+        assert [json.loads(line)["cg_procs"] for line in f] == [3]
+
+
+def test_host_index(v2):
+    task = HostTask(f"/docker/{CID}", CID)
+    task.name, task.call, task.shard = "BamToBed.shard-0", "BamToBed", "0"
+    unnamed = HostTask(f"/docker/{OTHER}", OTHER)
+    ended = [host_index_row(task, "exited")]
+    lines = host_index({"a": task, "b": unnamed}, ended).splitlines()
+    assert lines[0].split("\t") == monitor.HOST_INDEX_COLUMNS
+    assert [ln.split("\t")[-1] for ln in lines[1:]] == ["running", "exited"]
+    assert lines[1].split("\t")[:3] == ["BamToBed.shard-0", "BamToBed", "0"]
+
+
+def psi_text(some_avg, some_total, full_total=0):
+    return (f"some avg10={some_avg:.2f} avg60=0.00 avg300=0.00 total={some_total}\n"
+            f"full avg10=0.00 avg60=0.00 avg300=0.00 total={full_total}\n")
+
+
+def test_sampler_v2_memory_stat_counters_and_psi(v2):
+    write(v2, "/task", {"memory.current": f"{600 * MB}\n", "memory.max": f"{1000 * MB}\n",
+                        "memory.peak": f"{700 * MB}\n",
+                        "memory.stat": f"anon {400 * MB}\nfile {200 * MB}\nfile_dirty {3 * MB}\n"
+                                       f"file_writeback {MB}\ninactive_file {150 * MB}\nshmem 0\n",
+                        "memory.events": "low 0\nhigh 0\nmax 4\noom 1\noom_kill 1\n",
+                        "memory.pressure": psi_text(12.5, 1_000_000), "io.pressure": psi_text(0, 0)})
+    s = CgroupSampler(path="/task")
+    # Host mode never falls back to the VM-wide /proc/pressure for a task
+    assert sorted(s.psi) == ["io", "memory"]
+    fields, cur, limit = s.sample()
+    assert (cur, limit) == (600 * MB, 1000 * MB)
+    assert (fields["cg_mem_anon_mb"], fields["cg_mem_file_mb"], fields["cg_mem_dirty_mb"],
+            fields["cg_mem_writeback_mb"]) == (400.0, 200.0, 3.0, 1.0)
+    assert (fields["cg_mem_working_set_mb"], fields["cg_mem_util_pct"],
+            fields["cg_mem_peak_mb"]) == (450.0, 45.0, 700.0)
+    assert (fields["cg_oom"], fields["cg_oom_kill"]) == (1, 1)
+    # First PSI reading: the kernel's own 10 s average
+    assert (fields["psi_mem_some"], fields["psi_mem_full"], fields["psi_cpu_some"]) == (12.5, 0.0, None)
+
+
+def test_psi_is_the_stalled_share_since_the_previous_tick(v2):
+    d = write(v2, "/task", {"memory.current": "0\n", "cpu.pressure": psi_text(0, 5_000_000, 0),
+                            "memory.pressure": psi_text(0, 0, 0)})
+    s = CgroupSampler(path="/task")
+    s._psi(100.0)
+    # 2.5 s of 10 s stalled on CPU, whatever the kernel's avg10 says
+    (d / "cpu.pressure").write_text(psi_text(90.0, 7_500_000, 0))
+    (d / "memory.pressure").write_text(psi_text(0, 20_000_000, 20_000_000))
+    out = s._psi(110.0)
+    assert out["psi_cpu_some"] == 25.0 and out["psi_cpu_full"] == 0.0
+    # Never above 100%
+    assert out["psi_mem_some"] == 100.0
+
+
+def test_sampler_v1(v1):
+    write(v1, "/memory/task", {"memory.usage_in_bytes": f"{300 * MB}\n",
+                               "memory.limit_in_bytes": "9223372036854771712\n",
+                               "memory.max_usage_in_bytes": f"{350 * MB}\n",
+                               "memory.stat": f"cache {100 * MB}\nrss {200 * MB}\ndirty 0\nwriteback 0\n"
+                                              f"inactive_file {10 * MB}\ntotal_inactive_file {80 * MB}\n",
+                               "memory.oom_control": "oom_kill_disable 0\nunder_oom 0\noom_kill 2\n"})
+    write(v1, "/cpu,cpuacct/task", {"cpuacct.usage": "0\n", "cpu.cfs_quota_us": "200000\n",
+                                    "cpu.cfs_period_us": "100000\n",
+                                    "cpu.stat": "nr_periods 10\nnr_throttled 2\nthrottled_time 1500000000\n"})
+    s = CgroupSampler(path="/task")
+    fields, cur, limit = s.sample()
+    assert (cur, limit, fields["cg_mem_limit_mb"], fields["cg_mem_util_pct"]) == (300 * MB, None, None, None)
+    assert (fields["cg_mem_anon_mb"], fields["cg_mem_file_mb"],
+            fields["cg_mem_working_set_mb"]) == (200.0, 100.0, 220.0)
+    assert (fields["cg_mem_peak_mb"], fields["cg_oom"], fields["cg_oom_kill"]) == (350.0, None, 2)
+    assert (fields["cg_nr_throttled"], fields["cg_throttled_s"]) == (2, 1.5)
+    assert fields["cg_cpu_limit_cores"] == 2.0
+
+
+def test_cpu_cores_from_usage_deltas(v2):
+    d = write(v2, "/task", {"cgroup.controllers": "cpu io memory\n", "cpu.stat": "usage_usec 1000000\n",
+                            "io.stat": "8:0 rbytes=1048576 wbytes=0 rios=1\n259:0 rbytes=1048576 wbytes=3145728\n"})
+    s = CgroupSampler(path="/task")
+    out = s._cpu_io(100.0)
+    assert (out["cg_cpu_pct"], out["cg_read_mb"], out["cg_write_mb"]) == (None, 2.0, 3.0)
+    # 15 core-seconds in 10 s
+    (d / "cpu.stat").write_text("usage_usec 16000000\n")
+    assert s._cpu_io(110.0)["cg_cpu_pct"] == 150.0
+
+
+def test_throttled_share_of_periods(v2):
+    d = write(v2, "/task", {"cgroup.controllers": "cpu memory\n", "cpu.max": "200000 100000\n",
+                            "cpu.stat": "usage_usec 0\nnr_periods 10\nnr_throttled 2\nthrottled_usec 500000\n"})
+    s = CgroupSampler(path="/task")
+    fields = s.sample()[0]
+    assert (fields["cg_throttled_pct"], fields["cg_throttled_s"], fields["cg_cpu_limit_cores"]) == (None, 0.5, 2.0)
+    (d / "cpu.stat").write_text("usage_usec 0\nnr_periods 20\nnr_throttled 5\nthrottled_usec 900000\n")
+    assert s.sample()[0]["cg_throttled_pct"] == 30.0
+    # An idle cgroup runs no periods: not throttled
+    assert s.sample()[0]["cg_throttled_pct"] == 0.0
+
+
+@pytest.mark.parametrize("files, cores", [
+    ({"cpu.max": "150000 100000\n", "cpuset.cpus.effective": "0-7\n"}, 1.5),
+    ({"cpu.max": "max 100000\n", "cpuset.cpus.effective": "0-3,6\n"}, 5.0),
+    ({"cpu.max": "max 100000\n"}, float(os.cpu_count())),
+])
+def test_cpu_limit(v2, files, cores):
+    write(v2, "/task", {"cgroup.controllers": "cpu cpuset\n", **files})
+    assert CgroupSampler(path="/task").cpu_limit() == cores
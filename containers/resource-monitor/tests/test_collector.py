@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+from monitor import Collector, df_gb
+
+
+@pytest.fixture
+def gated():
+    """A collector whose runs block until the test opens the gate; returns the run count."""
+    gate = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(time.monotonic())
+        if not gate.wait(5):
+            raise RuntimeError("gate never opened")
+        return len(calls)
+
+    c = Collector("test", fn)
+    yield c, gate, calls
+    gate.set()
+    c.stop()
+
+
+def test_timeout_before_first_result(gated):
+    c, gate, _ = gated
+    ticket = c.request()
+    # No result yet: the caller must not get a made-up value
+    assert c.wait(ticket, 0.05) == (None, False)
+    assert c.timeouts == 1
+    gate.set()
+    assert c.wait(ticket, 2) == (1, True)
+    assert c.runs == 1 and c.latency_s is not None
+
+
+def test_timeout_keeps_last_good_result(gated):
+    c, gate, calls = gated
+    gate.set()
+    assert c.wait(c.request(), 2) == (1, True)
+    gate.clear()
+    ticket = c.request()
+    assert c.wait(ticket, 0.05) == (1, False)
+    gate.set()
+    assert c.wait(ticket, 2) == (2, True)
+    assert c.timeouts == 1
+
+
+def test_request_during_a_run_waits_for_the_next_one(gated):
+    c, gate, calls = gated
+    first = c.request()
+    deadline = time.monotonic() + 2
+    while not calls and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # The run in progress started before this request, so its result would be stale
+    second = c.request()
+    assert second == first + 1
+    gate.set()
+    assert c.wait(second, 2) == (2, True)
+
+
+def test_errors_keep_the_previous_result():
+    results = iter([1, ValueError("boom"), 3])
+
+    def fn():
+        r = next(results)
+        if isinstance(r, Exception):
+            raise r
+        return r
+
+    c = Collector("flaky", fn)
+    try:
+        assert c.wait(c.request(), 2) == (1, True)
+        assert c.wait(c.request(), 2) == (1, True)
+        assert c.errors == 1
+        assert c.wait(c.request(), 2) == (3, True)
+    finally:
+        c.stop()
+
+
+def test_periodic_and_paused():
+    calls = []
+    c = Collector("tick", lambda: calls.append(1), period_s=0.02)
+    try:
+        time.sleep(0.2)
+        assert len(calls) >= 3
+        c.configure(paused=True)
+        time.sleep(0.05)
+        n = len(calls)
+        # Paused: neither the schedule nor requests run it
+        ticket = c.request()
+        time.sleep(0.1)
+        assert len(calls) == n
+        assert c.wait(ticket, 0.01)[1] is False
+        c.configure(paused=False)
+        assert c.wait(ticket, 2)[1] is True
+    finally:
+        c.stop()
+
+
+def test_df_gb(tmp_path):
+    used, free = df_gb(str(tmp_path))
+    assert used >= 0 and free >= 0
+    # Unreadable is unknown, not a full disk
+    assert df_gb(str(tmp_path / "missing")) == (None, None)
+
+
+def test_slow_run_skips_missed_slots():
+    starts = []
+
+    def fn():
+        starts.append(time.monotonic())
+        if len(starts) == 2:
+            # Overruns three periods
+            time.sleep(0.35)
+
+    c = Collector("slow", fn, period_s=0.1)
+    try:
+        time.sleep(0.8)
+    finally:
+        c.stop()
+    gaps = [b - a for a, b in zip(starts, starts[1:])]
+    # The missed slots are dropped rather than run back to back to catch up
+    assert min(gaps) > 0.05
+    assert len(starts) <= 7
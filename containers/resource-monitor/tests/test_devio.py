@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+import monitor
+from monitor import DEVICE_FIELDS, DeviceIO, block_device
+
+
+def diskstats(rios, rms, wios, wms, busy_ms, queue_ms):
+    return (f"   8       0 sda {rios} 0 0 {rms} {wios} 0 0 {wms} 0 {busy_ms} {queue_ms} 0 0 0 0\n"
+            f"   8       1 sda1 {rios} 0 0 {rms} {wios} 0 0 {wms} 0 {busy_ms} {queue_ms} 0 0 0 0\n"
+            "   7       0 loop0 1 0 0 0 0 0 0 0 0 0 0\n")
+
+
+@pytest.fixture
+def stats(tmp_path, monkeypatch):
+    path = tmp_path / "diskstats"
+    path.write_text(diskstats(100, 200, 50, 100, 1000, 2000))
+    real_read = monitor.ProcReader.read
+    monkeypatch.setattr(monitor.ProcReader, "read",
+                        lambda self, p: real_read(self, str(path) if p == "/proc/diskstats" else p))
+    disks = {"/cromwell_root": "sda", "/mnt/data": None}
+    monkeypatch.setattr(monitor, "block_device", lambda p: disks.get(p))
+    return path, disks
+
+
+def test_iostat_style_deltas(stats):
+    path, _ = stats
+    dio = DeviceIO({"": "/cromwell_root"})
+    assert dio.sample() == {"": dict.fromkeys(DEVICE_FIELDS)}
+    # 10 s later: 1000 IOs taking 2000 ms, busy 5 s, 20 s of weighted queue time
+    dio._prev_t -= 10.0
+    path.write_text(diskstats(600, 1200, 550, 1100, 6000, 22000))
+    assert dio.sample() == {"": {"disk_iops": 100.0, "disk_await_ms": 2.0, "disk_queue": 2.0, "disk_util_pct": 50.0}}
+    # An idle disk: no IOs, no await
+    dio._prev_t -= 10.0
+    assert dio.sample() == {"": {"disk_iops": 0.0, "disk_await_ms": 0.0, "disk_queue": 0.0, "disk_util_pct": 0.0}}
+
+
+def test_unresolved_paths_are_retried(stats):
+    _, disks = stats
+    dio = DeviceIO({"": "/cromwell_root", "_data": "/mnt/data"}, retry_s=60.0)
+    assert dio.sample()["_data"] == dict.fromkeys(DEVICE_FIELDS)
+    assert dio.devices == {"": "sda", "_data": None}
+    # The mount appears later: picked up at the next retry, not before
+    disks["/mnt/data"] = "sda"
+    dio.resolve(dio._resolved_at + 30.0)
+    assert dio.devices["_data"] is None
+    dio.resolve(dio._resolved_at + 60.0)
+    assert dio.devices["_data"] == "sda"
+
+
+@pytest.mark.skipif(not os.path.isdir("/sys/dev/block"), reason="needs Linux sysfs")
+def test_block_device_is_a_whole_disk(tmp_path):
+    dev = block_device(str(tmp_path))
+    if dev is not None:
+        assert os.path.isdir(f"/sys/block/{dev}")
+    assert block_device(str(tmp_path / "missing")) is None
@@ -0,0 +1,84 @@
+import json
+import time
+
+import pytest
+
+from monitor import EventLog, LineLog
+
+T0 = time.time()
+
+
+@pytest.fixture
+def events(tmp_path):
+    path = tmp_path / "events.jsonl"
+    ev = EventLog(LineLog(str(path)), hysteresis=0.1, clear_samples=3)
+
+    def written():
+        ev.flush()
+        with open(path) as f:
+            return [json.loads(line) for line in f]
+
+    return ev, written
+
+
+def test_threshold_hysteresis_above(events):
+    ev, written = events
+    # Memory hovering at 90% of its limit: one begin, no end until it drops below 81%
+    for i, pct in enumerate([80, 90, 89, 91, 85, 82, 90, 80, 79, 90]):
+        ev.threshold("mem_near_limit", T0 + i, pct, 90.0, {"i": i})
+    got = [(e["event"], e["state"], e["sample"]["i"]) for e in written()]
+    assert got == [("mem_near_limit", "begin", 1), ("mem_near_limit", "end", 7),
+                   ("mem_near_limit", "begin", 9)]
+    end = written()[1]
+    assert end["worst"] == 91 and end["duration_s"] == 6.0 and end["threshold"] == 90.0
+    assert ev.counts["mem_near_limit"] == 2
+    assert "mem_near_limit" in ev.active
+
+
+def test_threshold_hysteresis_below(events):
+    ev, written = events
+    # Free disk under 20 GB clears only above 22 GB
+    for i, free in enumerate([30, 19.5, 21, 21.9, 15, 22.5]):
+        ev.threshold("low_disk_warn", T0 + i, free, 20.0, {"i": i}, below=True)
+    got = written()
+    assert [(e["state"], e["sample"]["i"]) for e in got] == [("begin", 1), ("end", 5)]
+    assert got[1]["worst"] == 15
+
+
+def test_threshold_ignores_missing_values(events):
+    ev, written = events
+    ev.threshold("mem_near_limit", T0, None, 90.0, {})
+    assert written() == [] and not ev.active
+
+
+def test_rising_counter_ends_after_quiet_samples(events):
+    ev, written = events
+    for i, nr in enumerate([100, 100, 105, 107, 107, 107, 110, 110, 110, 110]):
+        ev.rising("cpu_throttled", T0 + i, nr, {"i": i})
+    got = written()
+    assert [(e["state"], e["sample"]["i"]) for e in got] == [("begin", 2), ("end", 9)]
+    assert got[1]["count"] == 10
+
+
+def test_counter_event_per_increase(events):
+    ev, written = events
+    for i, n in enumerate([2, 2, 3, 3, 5]):
+        ev.counter("oom_kill", T0 + i, n, {"i": i})
+    got = written()
+    assert [(e["event"], e["count"], e["total"]) for e in got] == [("oom_kill", 1, 3), ("oom_kill", 2, 5)]
+    assert all(e["severity"] == "critical" for e in got)
+
+
+def test_process_start_exit_restart(events):
+    ev, written = events
+    sh = {"pid": 10, "create_time": T0 - 5, "name": "bash", "cmdline": "bash AltAnalyze.sh bam"}
+    py = {"pid": 11, "create_time": T0, "name": "python3", "cmdline": "python3 AltAnalyze.py --bam x"}
+    py2 = dict(py, pid=12, create_time=T0 + 3)
+    ev.processes(T0, [sh, py], {})
+    ev.processes(T0 + 1, None, {})
+    ev.processes(T0 + 2, [sh], {})
+    ev.processes(T0 + 3, [sh, py2], {})
+    got = [(e["event"], e["process"]) for e in written()]
+    assert got == [("process_start", "AltAnalyze.sh"), ("process_start", "AltAnalyze.py"),
+                   ("process_exit", "AltAnalyze.py"), ("process_restart", "AltAnalyze.py")]
+    assert written()[0]["already_running"] is True
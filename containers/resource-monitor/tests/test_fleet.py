@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from aggregate import fleet_ingest, fleet_query, workflow_from_path
+
+ROOT_ID = "0f8e8c0a-1b2c-4d3e-8f90-123456789abc"
+SUB_ID = "11111111-2222-4333-8444-555555555555"
+
+
+def make_run(root, call, shard, rss, cores=2.0, workflow=f"splicing/{ROOT_ID}"):
+    d = root / workflow / f"call-{call}" / f"shard-{shard}" / "monitoring"
+    d.mkdir(parents=True)
+    (d / "metadata.json").write_text(json.dumps({"task": call, "shard": str(shard), "attempt": "",
+                                                 "cpu_limit_cores": cores}) + "\n")
+    (d / "sample_name.txt").write_text(f"S{shard}\n")
+    with open(d / "usage.jsonl", "w") as f:
+        for i, mb in enumerate(rss):
+            f.write(json.dumps({"ts": f"2026-01-01T00:00:{i * 5:02d}", "alt_rss_mb": mb, "alt_cpu": 100.0,
+                                "cg_mem_peak_mb": max(rss[:i + 1]) + 100}) + "\n")
+    return d
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "exec"
+    make_run(root, "BamToBed", 0, [100.0, 200.0, 300.0])
+    make_run(root, "BamToBed", 1, [400.0, 500.0])
+    make_run(root, "BedToJunction", 0, [1000.0] * 4)
+    return root
+
+
+def test_workflow_from_path():
+    path = f"/exec/splicing/{ROOT_ID}/call-Sub/align/{SUB_ID}/call-BamToBed/shard-0/monitoring"
+    assert workflow_from_path(path) == ("align", SUB_ID, ROOT_ID)
+    assert workflow_from_path("/tmp/monitoring") == ("", "", "")
+
+
+def test_ingest_then_query(tree, tmp_path):
+    db = str(tmp_path / "fleet.db")
+    assert fleet_ingest(str(tree), db, jobs=1, label="v1") == {"found": 3, "skipped": 0, "ingested": 3, "failed": 0}
+
+    # One value per attempt from the runs table
+    res = fleet_query(db, "cg_mem_peak_mb", call="BamToBed")
+    assert (res["over"], res["attempts"], res["min"], res["max"]) == ("attempts", 2, 400.0, 600.0)
+    assert res["p50"] == 500.0
+    # A per-attempt statistic of the samples, filtered by a call GLOB
+    res = fleet_query(db, "alt_rss_mb.max", call="Bam*")
+    assert (res["attempts"], res["min"], res["max"]) == (2, 300.0, 500.0)
+    # Every sample of every attempt, from the merged sketches
+    res = fleet_query(db, "alt_rss_mb", q=50)
+    assert (res["over"], res["attempts"], res["n"]) == ("samples", 3, 9)
+    assert (res["min"], res["max"]) == (100.0, 1000.0)
+    assert res["avg"] == pytest.approx(5500.0 / 9)
+    assert res["value"] == pytest.approx(500.0, rel=0.01)
+    assert fleet_query(db, "alt_rss_mb", label="other")["attempts"] == 0
+
+
+def test_reingest_skips_unchanged_and_replaces_changed(tree, tmp_path, monkeypatch):
+    db = str(tmp_path / "fleet.db")
+    fleet_ingest(str(tree), db, jobs=1)
+    usage = tree / f"splicing/{ROOT_ID}/call-BamToBed/shard-1/monitoring/usage.jsonl"
+    with open(usage, "a") as f:
+        f.write(json.dumps({"ts": "2026-01-01T00:00:10", "alt_rss_mb": 900.0}) + "\n")
+    # Relative roots name the same directories
+    monkeypatch.chdir(tmp_path)
+    assert fleet_ingest("exec", db, jobs=1) == {"found": 3, "skipped": 2, "ingested": 1, "failed": 0}
+    res = fleet_query(db, "alt_rss_mb.max", call="BamToBed")
+    assert (res["attempts"], res["max"]) == (2, 900.0)
+
+
+def test_parallel_ingest_matches_serial(tree, tmp_path):
+    serial, parallel = str(tmp_path / "serial.db"), str(tmp_path / "parallel.db")
+    fleet_ingest(str(tree), serial, jobs=1)
+    assert fleet_ingest(str(tree), parallel, jobs=2)["ingested"] == 3
+    for what in ("alt_rss_mb", "alt_rss_mb.p95", "cores"):
+        assert fleet_query(serial, what) == fleet_query(parallel, what)
+
+
+def test_query_errors(tree, tmp_path):
+    db = str(tmp_path / "fleet.db")
+    with pytest.raises(SystemExit, match="Not found"):
+        fleet_query(db, "alt_rss_mb")
+    fleet_ingest(str(tree), db, jobs=1)
+    with pytest.raises(SystemExit, match="Unknown statistic"):
+        fleet_query(db, "alt_rss_mb.median")
+    with pytest.raises(SystemExit, match="Unknown field"):
+        fleet_query(db, "no_such_metric")
@@ -0,0 +1,78 @@
+import json
+import os
+
+import pytest
+
+from monitor import FlightRecorder
+
+
+class FakeCgroup:
+    def __init__(self):
+        self.oom_kill = 0
+
+    def sample(self):
+        return ({"cg_oom_kill": self.oom_kill, "cg_mem_current_mb": 100.0},)
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    rec = FlightRecorder(str(tmp_path / "flight"), seconds=10, max_dumps=2)
+    rec.cgroup = FakeCgroup()
+    return rec
+
+
+def read(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def dumps(recorder):
+    return sorted(os.listdir(recorder.out_dir)) if recorder.dumps else []
+
+
+def test_ring_keeps_last_seconds(recorder):
+    for _ in range(25):
+        assert recorder.sample() <= 10
+    path = recorder.dump("sigterm", final=True)
+    recs = read(path)
+    assert len(recs) == 10
+    assert path.endswith("-sigterm.jsonl")
+    assert all(r["cg_mem_current_mb"] == 100.0 and "alt_procs" in r for r in recs)
+
+
+def test_request_dumps_on_next_sample(recorder):
+    recorder.sample()
+    recorder.request("requested")
+    assert recorder.dumps == 0
+    recorder.sample()
+    assert recorder.dumps == 1
+    assert [p.split("-", 1)[1] for p in dumps(recorder)] == ["requested.jsonl"]
+    # One request, one dump
+    recorder.sample()
+    assert recorder.dumps == 1
+
+
+def test_oom_kill_increase_dumps(recorder):
+    recorder.sample()
+    recorder.sample()
+    assert recorder.dumps == 0
+    recorder.cgroup.oom_kill = 1
+    recorder.sample()
+    assert recorder.dumps == 1
+    assert dumps(recorder)[0].endswith("-oom_kill.jsonl")
+    recorder.sample()
+    assert recorder.dumps == 1
+
+
+def test_max_dumps_except_final(recorder):
+    recorder.sample()
+    paths = [recorder.dump("requested") for _ in range(3)]
+    assert paths[0] and paths[1] and paths[2] is None
+    # Same second and reason: later dumps get a numbered name instead of replacing the first
+    assert paths[0] != paths[1]
+    assert recorder.dump("failed", final=True) is not None
+    assert recorder.dumps == 3
+
+
+def test_no_dump_when_empty(recorder):
+    assert recorder.dump("sigterm", final=True) is None
@@ -0,0 +1,55 @@
+import random
+
+import pytest
+
+from monitor import TrendForecaster
+
+
+def test_slope_and_eta_of_a_linear_trend():
+    tr = TrendForecaster(window_s=600)
+    # Disk free space: 100 GB, falling 0.1 GB/s
+    for t in range(0, 40, 10):
+        assert tr.slope() is None
+        tr.add(1000.0 + t, 100.0 - 0.1 * t)
+    assert tr.slope() == pytest.approx(-0.1)
+    assert tr.eta(0.0) == pytest.approx(970.0)
+    # Not heading there, or already there
+    assert tr.eta(200.0) is None
+    assert tr.eta(97.0) == 0.0
+
+
+def test_window_forgets_old_points():
+    tr = TrendForecaster(window_s=100)
+    for t in range(0, 200, 10):
+        tr.add(t, 0.0)
+    # The rise only started at t=200; the flat history has slid out of the window
+    for t in range(200, 310, 10):
+        tr.add(t, 5.0 * (t - 200))
+    assert len(tr._pts) == 11
+    assert tr.slope() == pytest.approx(5.0)
+    assert tr.eta(1000.0) == pytest.approx(100.0)
+
+
+def test_noisy_trend_matches_least_squares():
+    rng = random.Random(1)
+    tr = TrendForecaster(window_s=10_000)
+    xs = [float(t) for t in range(0, 3000, 15)]
+    ys = [50.0 + 0.02 * x + rng.gauss(0, 2) for x in xs]
+    for x, y in zip(xs, ys):
+        tr.add(x, y)
+    mx, my = sum(xs) / len(xs), sum(ys) / len(ys)
+    expected = sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / sum((x - mx) ** 2 for x in xs)
+    assert tr.slope() == pytest.approx(expected, rel=1e-6)
+
+
+def test_flat_or_degenerate_trends_have_no_eta():
+    tr = TrendForecaster(window_s=600)
+    for t in range(4):
+        tr.add(100.0, 10.0 + t)
+    # All points at the same time: no slope
+    assert tr.slope() is None and tr.eta(0.0) is None
+    flat = TrendForecaster(window_s=600, max_eta_s=3600)
+    for t in range(0, 40, 10):
+        flat.add(t, 100.0 - 0.001 * t)
+    # Ten hours away at this rate: beyond max_eta_s, so not approaching
+    assert flat.slope() < 0 and flat.eta(64.0) is None
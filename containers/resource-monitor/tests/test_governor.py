@@ -0,0 +1,37 @@
+from monitor import OverheadGovernor
+
+
+def run(gov, start, end, pct, cpu, step=10.0):
+    """Feed points every ``step`` s from ``start`` to ``end`` at ``pct`` % of a core; returns (cpu, level changes)."""
+    changes = []
+    t = start
+    while t < end:
+        t += step
+        cpu += pct / 100.0 * step
+        if gov.update(t, cpu):
+            changes.append((t, gov.level))
+    return cpu, changes
+
+
+def test_sheds_quickly_and_restores_cautiously():
+    gov = OverheadGovernor(budget_pct=2.0, window_s=300.0)
+    assert not gov.update(0.0, 0.0) and gov.usage_pct is None
+    # 5% of a core: one level per window/5 of data at each level, up to the maximum
+    cpu, changes = run(gov, 0.0, 300.0, 5.0, 0.0)
+    assert changes == [(60.0, 1), (120.0, 2), (180.0, 3)]
+    assert gov.usage_pct == 5.0
+    # Between half the budget and the budget: stays put
+    cpu, changes = run(gov, 300.0, 1000.0, 1.5, cpu)
+    assert changes == [] and gov.level == 3
+    # Well under budget: one level down per full window
+    cpu, changes = run(gov, 1000.0, 1700.0, 0.5, cpu)
+    assert [lvl for _, lvl in changes] == [2, 1]
+    assert changes[1][0] - changes[0][0] == 300.0
+
+
+def test_usage_is_over_the_rolling_window():
+    gov = OverheadGovernor(budget_pct=0, window_s=100.0)
+    cpu, _ = run(gov, 0.0, 100.0, 50.0, 0.0)
+    cpu, changes = run(gov, 100.0, 300.0, 10.0, cpu)
+    # The 50% burst has left the window; no budget, no degrading
+    assert gov.usage_pct == 10.0 and changes == [] and gov.level == 0
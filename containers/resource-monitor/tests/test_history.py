@@ -0,0 +1,59 @@
+import json
+
+from monitor import ProcessHistory, cmd_signature
+
+MB = 1024 * 1024
+T0 = 1_700_000_000.0
+
+
+def row(pid, cpu, rss_mb, cmd="python3 /usr/src/app/AltAnalyze.py --species Hs", read_mb=0):
+    return {"pid": pid, "create_time": T0 - 100 + pid, "name": cmd.split()[0], "cmdline": cmd,
+            "cpu_percent": cpu, "rss": rss_mb * MB, "read_bytes": read_mb * MB, "write_bytes": None}
+
+
+def test_cmd_signature():
+    assert cmd_signature(row(1, 0, 0, "/usr/bin/python3 -u /usr/src/app/AltAnalyze.py --x 1")) == "python3 AltAnalyze.py"
+    assert cmd_signature(row(1, 0, 0, "python3 -c import sys")) == "python3 -c"
+    assert cmd_signature(row(1, 0, 0, "samtools view /data/bam/")) == "samtools view"
+    assert cmd_signature({"cmdline": "", "name": "kworker"}) == "kworker"
+
+
+def test_tracks_cpu_seconds_and_peaks():
+    h = ProcessHistory(k=2, points=100)
+    for i, rss in enumerate((100, 400, 200)):
+        h.observe(T0 + 10 * i, [row(1, 150.0, rss, read_mb=10 * i), row(2, 1.0, 5, "sleep 60")],
+                  phase=["bam_to_junction_bed", "prune", "prune"][i])
+    doc = json.loads(h.report({"task": "BamToBed"}))
+    assert doc["task"] == "BamToBed" and doc["columns"] == ["t", "cpu_pct", "rss_mb", "read_mb", "write_mb"]
+    p = doc["processes"][0]
+    assert (p["pid"], p["signature"], p["alive"]) == (1, "python3 AltAnalyze.py", True)
+    # First sample only starts the clock: 150% over 20 s
+    assert (p["cpu_core_s"], p["peak_rss_mb"], p["peak_phase"]) == (30.0, 400.0, "prune")
+    assert p["series"] == [[T0, 150.0, 100.0, 0.0, None], [T0 + 10, 150.0, 400.0, 10.0, None],
+                           [T0 + 20, 150.0, 200.0, 20.0, None]]
+
+
+def test_series_are_halved_when_full():
+    h = ProcessHistory(k=1, points=8)
+    for i in range(100):
+        h.observe(T0 + i, [row(1, float(i % 2) * 100, 100 + i, read_mb=i)])
+    p = json.loads(h.report())["processes"][0]
+    assert len(p["series"]) <= 8 and p["step_ticks"] == 16
+    # Merged points: first time, mean CPU, max RSS, last IO
+    t, cpu, rss, read, _ = p["series"][0]
+    assert (t, cpu, rss, read) == (T0, 50.0, 115.0, 15.0)
+    assert p["series"][-1][3] == 99.0
+
+
+def test_exited_peak_holder_is_kept():
+    h = ProcessHistory(k=1, points=100)
+    h.observe(T0, [row(1, 10.0, 5000), row(2, 200.0, 10)])
+    h.observe(T0 + 1, [row(1, 10.0, 5000), row(2, 200.0, 10)])
+    # Both exit; a stream of short-lived busy processes follows
+    for i in range(3, 20):
+        h.observe(T0 + i, [row(i, 50.0 + i, 50)])
+    procs = {p["pid"]: p for p in json.loads(h.report())["processes"]}
+    assert len(procs) <= 4
+    assert procs[1]["peak_rss_mb"] == 5000.0 and not procs[1]["alive"]
+    # The busiest by CPU seconds is kept as well
+    assert procs[2]["cpu_core_s"] == 2.0
@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from monitor import LargestFiles
+
+
+@pytest.fixture
+def root(tmp_path):
+    (tmp_path / "bed").mkdir()
+    (tmp_path / "bed" / "deep").mkdir()
+    (tmp_path / "a.bam").write_bytes(b"\0" * 5000)
+    (tmp_path / "bed" / "x.bed").write_bytes(b"\0" * 3000)
+    (tmp_path / "bed" / "deep" / "y.bed").write_bytes(b"\0" * 2000)
+    for i in range(200):
+        (tmp_path / f"small{i:03d}.txt").write_bytes(b"\0" * 10)
+    os.symlink(tmp_path / "a.bam", tmp_path / "link.bam")
+    return tmp_path
+
+
+def run_pass(lf):
+    for _ in range(1000):
+        if lf.step(10.0):
+            return
+    raise AssertionError("pass never completed")
+
+
+def test_full_pass(root):
+    lf = LargestFiles(str(root), top_n=3, track_bytes=1000)
+    assert lf.step(10.0) and lf.passes == 1
+    assert lf.top_files == [(5000, str(root / "a.bam")), (3000, str(root / "bed" / "x.bed")),
+                            (2000, str(root / "bed" / "deep" / "y.bed"))]
+    # Directory totals are recursive; symlinks are not followed
+    assert lf.top_dirs == [(12000, str(root)), (5000, str(root / "bed")), (2000, str(root / "bed" / "deep"))]
+    assert lf.growth == []
+    assert sorted(lf._seen) == sorted(str(p) for p in (root / "a.bam", root / "bed" / "x.bed",
+                                                       root / "bed" / "deep" / "y.bed"))
+    text = "".join(lf.report("ts"))
+    assert "pass 1 took" in text and "largest directories" in text
+
+
+def test_walk_resumes_across_steps(root):
+    lf = LargestFiles(str(root), top_n=3)
+    # A zero budget still makes progress: the deadline is checked every 64 entries
+    assert not lf.step(0.0)
+    assert lf.passes == 0 and 0 < lf._entries < 206
+    assert "first pass in progress" in lf.report("ts")[0]
+    steps = 1
+    while not lf.step(0.0):
+        steps += 1
+    assert steps > 1 and lf.passes == 1 and lf.top_files[0] == (5000, str(root / "a.bam"))
+
+
+def test_growth_rates(root):
+    lf = LargestFiles(str(root), top_n=5, track_bytes=1000)
+    run_pass(lf)
+    # Pretend the first pass ended 10 s ago
+    lf._seen = {p: (size, t - 10.0) for p, (size, t) in lf._seen.items()}
+    lf._prev_pass_end -= 10.0
+    with open(root / "bed" / "x.bed", "ab") as f:
+        f.write(b"\0" * 1000)
+    (root / "a.bam").unlink()
+    run_pass(lf)
+    rates = {p: r for r, p in lf.growth}
+    assert rates[str(root / "bed" / "x.bed")] == pytest.approx(100.0, rel=0.05)
+    assert rates[str(root / "bed") + os.sep] == pytest.approx(100.0, rel=0.05)
+    # The whole tree shrank: not growing
+    assert str(root) + os.sep not in rates
+    # Deleted files are forgotten
+    assert str(root / "a.bam") not in lf._seen
+    assert "fastest growing" in "".join(lf.report("ts"))
+
+
+def test_tracked_files_are_capped(root):
+    lf = LargestFiles(str(root), track_bytes=1, max_tracked=10)
+    run_pass(lf)
+    assert len(lf._seen) == 10
+
+
+def test_missing_root(tmp_path):
+    lf = LargestFiles(str(tmp_path / "missing"))
+    assert not lf.step(1.0) and lf.passes == 0
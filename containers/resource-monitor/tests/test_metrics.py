@@ -0,0 +1,91 @@
+import os
+import re
+import socket
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from monitor import Histogram, MetricsServer
+from test_stop import start, stop
+
+SAMPLE_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)\{((?:[a-zA-Z_]\w*="[^"]*",?)*)\} (\S+)$')
+
+
+def test_histogram_lines():
+    h = Histogram([10, 100, 1000.5])
+    for v in (5, 10, 50, 5000):
+        h.observe(v)
+    assert h.lines("x", 'task="t"') == [
+        "# TYPE x histogram",
+        'x_bucket{le="10",task="t"} 2',
+        'x_bucket{le="100",task="t"} 3',
+        'x_bucket{le="1000.5",task="t"} 3',
+        'x_bucket{le="+Inf",task="t"} 4',
+        'x_sum{task="t"} 5065.0',
+        'x_count{task="t"} 4',
+    ]
+
+
+def get(url):
+    with urllib.request.urlopen(url, timeout=5) as r:
+        return r.status, r.headers["Content-Type"], r.read().decode()
+
+
+def test_metrics_server():
+    server = MetricsServer("127.0.0.1", 0)
+    base = f"http://127.0.0.1:{server.httpd.server_address[1]}"
+    try:
+        assert get(base + "/metrics")[2] == ""
+        server.set('up{task="t"} 1\n')
+        status, ctype, body = get(base + "/metrics?x=1")
+        assert (status, body) == (200, 'up{task="t"} 1\n') and ctype.startswith("text/plain; version=0.0.4")
+        with pytest.raises(urllib.error.HTTPError) as e:
+            get(base + "/other")
+        assert e.value.code == 404
+    finally:
+        server.close()
+
+
+def check_exposition(text):
+    """Every sample parses, is not repeated, and no # TYPE is declared twice or after its samples."""
+    typed, seen = set(), set()
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            name = line.split(" ")[2]
+            assert name not in typed, f"TYPE {name} declared twice"
+            assert not any(re.sub(r"_(bucket|sum|count)$", "", n) == name for n, _ in seen), f"TYPE {name} too late"
+            typed.add(name)
+            continue
+        m = SAMPLE_RE.match(line)
+        assert m, f"bad sample line: {line!r}"
+        name, labels, value = m.groups()
+        float(value)
+        assert (name, labels) not in seen, f"duplicate series: {line!r}"
+        seen.add((name, labels))
+    return {name for name, _ in seen}
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self"), reason="needs Linux /proc")
+def test_monitor_serves_valid_metrics(tmp_path):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    proc = start(tmp_path, MON_EXPORT_PROM="1", MON_HTTP_PORT=str(port))
+    try:
+        deadline = time.monotonic() + 20
+        body = ""
+        while "resource_alt_cpu_percent_per_tick_count{" not in body:
+            assert time.monotonic() < deadline, "no metrics served"
+            time.sleep(0.2)
+            body = get(f"http://127.0.0.1:{port}/metrics")[2]
+    finally:
+        stop(proc, tmp_path, task_exit=0)
+    names = check_exposition(body)
+    assert {"resource_monitor_samples_total", "resource_monitor_cpu_seconds_total",
+            "resource_alt_rss_bytes_per_tick_bucket"} <= names
+    samples = re.search(r"^resource_monitor_samples_total\{[^}]*\} (\d+)$", body, re.M)
+    assert int(samples.group(1)) >= 1
+    # The textfile export carries the same exposition
+    check_exposition((tmp_path / "metrics.prom").read_text())
@@ -0,0 +1,115 @@
+import errno
+
+import monitor
+from aggregate import load_phases
+from monitor import AltTree, PhaseTracker
+
+T0 = 1_700_000_000.0
+
+
+def alt(rss, hwm=None, cpu=100.0, read=None, write=None):
+    return {"rss_mb": rss, "pss_mb": None, "hwm_sum_mb": hwm, "cpu": cpu, "read_mb": read, "write_mb": write}
+
+
+def test_peaks_fall_back_to_sampled_rss_without_resets():
+    ph = PhaseTracker(hwm=False)
+    ph.update(T0, "bam_to_junction_bed", alt(100.0, 500.0))
+    ph.update(T0 + 10, "bam_to_junction_bed", alt(200.0, 600.0))
+    # VmHWM still holds the previous phase's 600 MB: it must not become prune's peak
+    ph.update(T0 + 20, "prune", alt(50.0, 600.0))
+    ph.update(T0 + 30, "prune", alt(80.0, 600.0))
+    st = ph.stats
+    assert (st["bam_to_junction_bed"]["peak_rss_mb"], st["bam_to_junction_bed"]["peak_hwm_sum_mb"]) == (200.0, None)
+    assert (st["prune"]["peak_rss_mb"], st["prune"]["peak_hwm_sum_mb"]) == (80.0, None)
+    assert "\tNone\t" in ph.report().splitlines()[2]
+
+
+def test_peaks_per_phase_with_resets():
+    ph = PhaseTracker(hwm=True)
+    ph.update(T0, "bam_to_junction_bed", alt(100.0, 500.0))
+    ph.update(T0 + 10, "bam_to_junction_bed", alt(200.0, 600.0))
+    assert ph.update(T0 + 20, "prune", alt(50.0, 600.0))
+    # The caller reset VmHWM after the phase change; the first prune sample predates it
+    ph.hwm = True
+    ph.update(T0 + 30, "prune", alt(80.0, 90.0))
+    assert ph.stats["bam_to_junction_bed"]["peak_hwm_sum_mb"] == 600.0
+    assert ph.stats["prune"]["peak_hwm_sum_mb"] == 90.0
+    # A failed reset turns VmHWM peaks off for the next phase
+    ph.update(T0 + 40, "go_elite", alt(40.0, 95.0))
+    ph.hwm = False
+    ph.update(T0 + 50, "go_elite", alt(45.0, 95.0))
+    assert ph.stats["go_elite"]["peak_hwm_sum_mb"] is None and ph.stats["go_elite"]["peak_rss_mb"] == 45.0
+
+
+def test_intervals_are_charged_to_the_earlier_phase():
+    ph = PhaseTracker()
+    assert ph.update(T0, "idle", alt(None, cpu=None))
+    assert ph.update(T0 + 10, "bam_to_exon_bed", alt(10.0, cpu=200.0, read=0.0, write=0.0))
+    assert not ph.update(T0 + 20, "bam_to_exon_bed", alt(10.0, cpu=100.0, read=50.0, write=5.0))
+    ph.update(T0 + 30, "idle", alt(None, cpu=None, read=80.0, write=6.0), cg_peak_mb=700.0)
+    ph.update(T0 + 35, "bam_to_exon_bed", alt(None, cpu=None))
+    idle, bed = ph.stats["idle"], ph.stats["bam_to_exon_bed"]
+    assert (idle["entries"], idle["samples"], idle["duration_s"]) == (2, 2, 15.0)
+    assert (bed["entries"], bed["samples"], bed["duration_s"]) == (2, 3, 20.0)
+    # 200% for 10 s plus 100% for 10 s
+    assert bed["cpu_pct_s"] == 3000.0
+    assert (bed["read_mb"], bed["write_mb"]) == (80.0, 6.0)
+    assert bed["peak_cg_mem_mb"] == 700.0
+    hdr, _, bed_row = [line.split("\t") for line in ph.report().splitlines()]
+    row = dict(zip(hdr, bed_row))
+    assert (row["mean_cpu_pct"], row["cpu_core_s"]) == ("150.0", "30.0")
+
+
+def test_detect():
+    ph = PhaseTracker()
+
+    def row(cmd, name="python"):
+        return {"cmdline": cmd, "name": name}
+
+    assert ph.detect([]) == "idle"
+    assert ph.detect([row("bash /usr/src/app/AltAnalyze.sh bed_to_junction bed", "bash")]) == "altanalyze"
+    # The later stage wins when both run
+    assert ph.detect([row("python BAMtoJunctionBED.py --i a.bam"), row("python prune.py")]) == "prune"
+    assert ph.detect([row("tar -czf altanalyze_output.tar.gz altanalyze_output", "tar"),
+                      row("python GO_Elite.py")]) == "archive"
+
+
+def test_reset_hwm_is_opt_in(monkeypatch, capsys):
+    opened = []
+
+    def fake_open(path, mode="r"):
+        opened.append(path)
+        if path == "/proc/2/clear_refs":
+            raise FileNotFoundError(errno.ENOENT, "gone")
+        if path.startswith("/proc/3/"):
+            raise PermissionError(errno.EACCES, "Permission denied")
+        return open("/dev/null", mode)
+
+    monkeypatch.setattr(monitor, "open", fake_open, raising=False)
+    tree = AltTree()
+    members = [{"pid": 1}, {"pid": 2}]
+    monkeypatch.setattr(monitor, "RESET_HWM", 0)
+    assert tree.reset_hwm(members) is False and opened == []
+    monkeypatch.setattr(monitor, "RESET_HWM", 1)
+    # An exited process is not a failure
+    assert tree.reset_hwm(members) is True
+    assert opened == ["/proc/1/clear_refs", "/proc/2/clear_refs"]
+    assert capsys.readouterr().err == ""
+    assert tree.reset_hwm(members + [{"pid": 3}]) is False
+    assert tree.reset_hwm([{"pid": 3}]) is False
+    assert capsys.readouterr().err.count("cannot reset VmHWM") == 1
+
+
+def test_report_round_trips_through_aggregate(tmp_path):
+    ph = PhaseTracker()
+    ph.update(T0, "bam_to_junction_bed", alt(100.0, cpu=300.0, read=0.0, write=0.0))
+    ph.update(T0 + 60, "prune", alt(40.0, cpu=100.0, read=900.0, write=12.5))
+    ph.update(T0 + 90, "prune", alt(45.0, cpu=None, read=900.0, write=13.0))
+    (tmp_path / "phases.tsv").write_text(ph.report())
+    rows = {r["phase"]: r for r in load_phases(str(tmp_path))}
+    assert list(rows) == ["bam_to_junction_bed", "prune"]
+    bed, prune = rows["bam_to_junction_bed"], rows["prune"]
+    assert (bed["entries"], bed["samples"], bed["duration_s"], bed["cpu_core_s"]) == (1, 1, 60.0, 180.0)
+    assert (bed["read_mb"], bed["write_mb"], bed["peak_rss_mb"], bed["peak_pss_mb"]) == (900.0, 12.5, 100.0, None)
+    assert (prune["samples"], prune["duration_s"], prune["mean_cpu_pct"], prune["write_mb"]) == (2, 30.0, 100.0, 0.5)
+    assert isinstance(prune["start"], str)
@@ -0,0 +1,187 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import monitor
+from monitor import ProcBackend, ProcessTable, ProcReader, parse_kv
+
+needs_psutil = pytest.mark.skipif(monitor.psutil is None, reason="psutil not installed")
+
+
+@pytest.fixture
+def child():
+    p = subprocess.Popen([sys.executable, "-c", "import sys; print(flush=True); sys.stdin.read()", "--tag",
+                          "resmon-test"], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    # Started up and blocked reading stdin: its memory no longer changes
+    p.stdout.readline()
+    yield p
+    p.stdin.close()
+    p.stdout.close()
+    p.wait(5)
+
+
+def by_pid(rows):
+    return {r["pid"]: r for r in rows}
+
+
+@needs_psutil
+def test_process_table_keeps_processes_between_scans(child):
+    table = ProcessTable()
+    rows = by_pid(table.scan())
+    row = rows[child.pid]
+    assert row["ppid"] == os.getpid() and row["cmdline"].endswith("--tag resmon-test")
+    assert row["rss"] > 0 and row["memory_percent"] > 0
+    # Primed on the first scan: a percentage only from the second one
+    assert row["cpu_percent"] is None
+    proc = table._procs[child.pid]["proc"]
+    assert by_pid(table.scan())[child.pid]["cpu_percent"] is not None
+    assert table._procs[child.pid]["proc"] is proc
+    child.stdin.close()
+    child.wait(5)
+    assert child.pid not in by_pid(table.scan()) and child.pid not in table._procs
+
+
+@needs_psutil
+def test_process_table_hwm():
+    table = ProcessTable()
+    rss = by_pid(table.scan())[os.getpid()]["rss"]
+    assert table.hwm(os.getpid()) >= rss
+    assert table.hwm(2 ** 22 + 1) is None
+
+
+class TreeReader(ProcReader):
+    """A ProcReader that reads a synthetic tree in place of /proc."""
+
+    root = ""
+
+    def read(self, path):
+        return super().read(self.root + path[len("/proc"):])
+
+    def read_once(self, path):
+        return super().read_once(self.root + path[len("/proc"):])
+
+
+def stat_line(pid, comm, ppid=1, state="S", ticks=(0, 0), start=500, vsize=1 << 30, rss_pages=256):
+    f = [state, ppid] + [0] * 9 + list(ticks) + [0] * 6 + [start, vsize, rss_pages, 0, 0]
+    return f"{pid} ({comm}) " + " ".join(map(str, f)) + "\n"
+
+
+def add_proc(root, pid, comm, cmdline, io=(4096, 8192), **kw):
+    d = root / str(pid)
+    d.mkdir(exist_ok=True)
+    (d / "stat").write_text(stat_line(pid, comm, **kw))
+    (d / "cmdline").write_bytes(b"\0".join(a.encode() for a in cmdline) + b"\0")
+    if io is not None:
+        (d / "io").write_text(f"rchar: 1\nwchar: 2\nread_bytes: {io[0]}\nwrite_bytes: {io[1]}\n")
+    (d / "status").write_text("Name:\tx\nVmHWM:\t  2048 kB\nVmRSS:\t  1024 kB\n")
+
+
+@pytest.fixture
+def proc(tmp_path, monkeypatch):
+    root = tmp_path / "proc"
+    (root / "net").mkdir(parents=True)
+    (root / "stat").write_text("cpu  200 0 100 1600 0 0 0 0 0 0\n"
+                               "cpu0 100 0 50 800 0 0 0 0 0 0\ncpu1 100 0 50 800 0 0 0 0 0 0\n"
+                               "intr 0\nbtime 1700000000\n")
+    (root / "meminfo").write_text("MemTotal:       8000000 kB\nMemFree:        1000000 kB\n"
+                                  "MemAvailable:   4000000 kB\nCached:          500000 kB\n")
+    (root / "loadavg").write_text("1.50 1.00 0.50 2/300 1234\n")
+    (root / "diskstats").write_text("   8       0 sda 10 0 100 0 20 0 300 0 0 0 0\n"
+                                    "   8       1 sda1 10 0 100 0 20 0 300 0 0 0 0\n"
+                                    " 259       0 nvme0n1 1 0 8 0 2 0 16 0 0 0 0\n")
+    (root / "net" / "dev").write_text("Inter-|   Receive\n face |bytes    packets\n"
+                                      "    lo: 1000 10 0 0 0 0 0 0 1000 10 0 0 0 0 0 0\n"
+                                      "  eth0: 5000 50 0 0 0 0 0 0 7000 70 0 0 0 0 0 0\n")
+    TreeReader.root = str(root)
+    monkeypatch.setattr(monitor, "ProcReader", TreeReader)
+    real_listdir = os.listdir
+    monkeypatch.setattr(monitor.os, "listdir", lambda p=".": real_listdir(root if p == "/proc" else p))
+    return root
+
+
+def test_proc_backend_system_metrics(proc):
+    b = ProcBackend()
+    b._block_devs.update({"sda": True, "sda1": False, "nvme0n1": True})
+    assert b.boot_time == 1700000000.0 and b.mem_total == 8000000 * 1024
+    assert b.load1() == 1.5
+    assert b.memory() == (8000000 * 1024, 4000000 * 1024)
+    assert b.disk_io() == (108 * 512, 316 * 512)
+    assert b.net_io() == (6000, 8000)
+    assert b.percpu_percent() == [0.0, 0.0]
+    # cpu0: 100 busy of 200 ticks; cpu1: idle
+    (proc / "stat").write_text("cpu  350 0 150 1800 0 0 0 0 0 0\n"
+                               "cpu0 175 0 75 900 0 0 0 0 0 0\ncpu1 100 0 50 900 0 0 0 0 0 0\n"
+                               "btime 1700000000\n")
+    assert b.percpu_percent() == [50.0, 0.0]
+
+
+def test_proc_table_rows(proc):
+    add_proc(proc, 100, "bash", ["/bin/bash", "/usr/src/app/AltAnalyze.sh", "bam_to_bed"], ticks=(10, 5))
+    # comm keeps spaces and parentheses, and is cut to 15 characters
+    add_proc(proc, 101, "x) (y", ["x"], ppid=100, io=None)
+    add_proc(proc, 102, "BAMtoJunctionBE", ["/opt/BAMtoJunctionBED.py", "--i", "a.bam"], ppid=100)
+    add_proc(proc, 103, "defunct", [], state="Z")
+    (proc / "self").mkdir()
+    b = ProcBackend()
+    rows = by_pid(b.table.scan())
+    assert sorted(rows) == [100, 101, 102]
+    r = rows[100]
+    assert (r["ppid"], r["name"], r["cmdline"]) == (1, "bash", "/bin/bash /usr/src/app/AltAnalyze.sh bam_to_bed")
+    assert r["create_time"] == 1700000000.0 + 500 / monitor._CLK_TCK
+    assert (r["rss"], r["vms"]) == (256 * monitor._PAGE_SIZE, 1 << 30)
+    assert r["memory_percent"] == pytest.approx(256 * monitor._PAGE_SIZE * 100.0 / (8000000 * 1024))
+    assert (r["read_bytes"], r["write_bytes"], r["cpu_percent"]) == (4096, 8192, None)
+    assert (rows[101]["name"], rows[101]["ppid"], rows[101]["read_bytes"]) == ("x) (y", 100, None)
+    assert rows[102]["name"] == "BAMtoJunctionBED.py"
+    assert b.table.hwm(100) == 2048 * 1024 and b.table.pss(100) is None
+
+
+def test_proc_table_cpu_exec_and_reuse(proc):
+    add_proc(proc, 100, "bash", ["bash", "run.sh"], ticks=(10, 5))
+    add_proc(proc, 200, "sleep", ["sleep", "60"])
+    table = ProcBackend().table
+    table.scan()
+    # 1 s of CPU over 2 s of wall time
+    table._procs[100]["wall"] -= 2.0
+    add_proc(proc, 100, "bash", ["bash", "run.sh"], ticks=(10 + monitor._CLK_TCK, 5))
+    assert by_pid(table.scan())[100]["cpu_percent"] == pytest.approx(50.0, rel=0.01)
+    # exec() changes comm: the cached cmdline is refreshed
+    add_proc(proc, 100, "python", ["python", "prune.py"], ticks=(200, 5))
+    assert by_pid(table.scan())[100]["cmdline"] == "python prune.py"
+    # Same pid, new start time: a new process, primed again
+    add_proc(proc, 100, "python", ["python", "other.py"], start=900)
+    assert (by_pid(table.scan())[100]["cpu_percent"], table._procs[100]["cmdline"]) == (None, "python other.py")
+    (proc / "200" / "stat").unlink()
+    table.scan()
+    assert sorted(table._procs) == [100]
+
+
+def test_proc_reader_grows_and_rereads(tmp_path):
+    path = tmp_path / "big"
+    path.write_bytes(b"x" * 100)
+    reader = ProcReader(size=16)
+    assert reader.read(str(path)) == b"x" * 100
+    with open(path, "r+b") as f:
+        f.write(b"yy")
+    # The kept descriptor reads the current content from offset 0
+    assert reader.read(str(path)).startswith(b"yyx")
+    assert reader.read_once(str(path)) == reader.read(str(path))
+    reader.close()
+    assert reader._fds == {}
+
+
+def test_parse_kv():
+    assert parse_kv(b"MemTotal:  16 kB\nBad line\nName:\tbash\nVmHWM:\t 3 kB\n") == {"MemTotal": 16, "VmHWM": 3}
+
+
+@needs_psutil
+@pytest.mark.skipif(not os.path.exists("/proc/self/stat"), reason="needs Linux /proc")
+def test_proc_table_matches_psutil(child):
+    native = by_pid(ProcBackend().table.scan())[child.pid]
+    ref = by_pid(ProcessTable().scan())[child.pid]
+    for k in ("ppid", "name", "cmdline", "vms"):
+        assert native[k] == ref[k], k
+    assert native["create_time"] == pytest.approx(ref["create_time"], abs=0.05)
+    assert native["rss"] == pytest.approx(ref["rss"], rel=0.1)
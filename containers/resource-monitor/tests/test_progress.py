@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+from monitor import InputProgress, prom_value
+
+pytestmark = pytest.mark.skipif(not os.path.isdir("/proc/self/fdinfo"), reason="needs Linux /proc")
+
+KB = 1024
+WALL = 1_700_000_000.0
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    bam = tmp_path / "a.bam"
+    bam.write_bytes(b"\0" * (1000 * KB))
+    fin = open(bam, "rb")
+    # Written BEDs are outputs, not inputs
+    fout = open(tmp_path / "out.bed", "wb")
+    yield str(bam), fin, fout
+    fin.close()
+    fout.close()
+
+
+def test_rate_eta_and_percent(inputs):
+    path, fin, _ = inputs
+    prog = InputProgress((".bam", ".bed"), window_s=600, stall_s=60)
+    me = [{"pid": os.getpid()}]
+    prog.scan(me, 0.0, WALL)
+    assert list(prog.active) == [path]
+    # Unknown rate: no ETA yet, exported as NaN rather than an infinite ETA
+    f = prog.fields(0.0)
+    assert (f["progress_pct"], f["progress_eta_s"], f["progress_inputs"]) == (0.0, None, 1)
+    assert prom_value(f["progress_eta_s"]) == "NaN"
+    for t in (10.0, 20.0):
+        fin.seek(int(t) * 10 * KB)
+        prog.scan(me, t, WALL + t)
+    f = prog.fields(20.0)
+    assert f["progress_pct"] == 20.0
+    assert f["progress_mb_s"] == round(10 * KB / 1024 / 1024, 3)
+    assert f["progress_eta_s"] == 80.0
+    assert f["progress_stalled_s"] == 0.0
+    assert prom_value(f["progress_eta_s"]) == "80.0"
+
+
+def test_stall_warns_once(inputs, capsys):
+    path, fin, _ = inputs
+    prog = InputProgress((".bam",), window_s=600, stall_s=30)
+    me = [{"pid": os.getpid()}]
+    fin.seek(500 * KB)
+    for t in (0.0, 20.0, 40.0, 60.0):
+        prog.scan(me, t, WALL + t)
+    assert prog.fields(60.0)["progress_stalled_s"] == 60.0
+    assert capsys.readouterr().err.count("input read stalled") == 1
+    # Moving again clears the stall and re-arms the warning
+    fin.seek(600 * KB)
+    prog.scan(me, 70.0, WALL + 70)
+    assert prog.fields(70.0)["progress_stalled_s"] == 0.0
+
+
+def test_closed_inputs_move_to_done(inputs):
+    path, fin, _ = inputs
+    prog = InputProgress((".bam",), window_s=600, stall_s=60)
+    me = [{"pid": os.getpid()}]
+    fin.seek(1000 * KB)
+    prog.scan(me, 0.0, WALL)
+    fin.close()
+    prog.scan(me, 10.0, WALL + 10)
+    assert prog.active == {} and prog.fields(10.0)["progress_pct"] is None
+    assert [(p, size, pos) for p, size, pos, _, _ in prog.done] == [(path, 1000 * KB, 1000 * KB)]
+    lines = prog.report(10.0, WALL + 10).splitlines()
+    assert lines[-1].startswith("closed\t" + path + "\t")
+
+
+def test_prom_value():
+    assert prom_value(None) == "NaN"
+    assert prom_value(0.0) == "0.0"
+    assert prom_value(3600) == "3600"
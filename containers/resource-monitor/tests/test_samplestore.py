@@ -0,0 +1,139 @@
+import json
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+from samplestore import HEADER_SIZE, SampleStore, StoreReader, export, read_header
+
+COLUMNS = [("t", "d"), ("load1", "f"), ("mem_used_mb", "i"), ("alt_read_mb", "d"), ("phase", "i"),
+           ("disk_read_mb_s", "f"), ("percpu_percent.0", "f"), ("percpu_percent.1", "f")]
+ORDER = ["ts", "mon_secs", "task", "shard", "load1", "mem_used_mb", "alt_read_mb", "phase",
+         "disk_read_mb_s", "percpu_percent"]
+START = time.time() - 3600
+
+
+def make_records(n):
+    out = []
+    for i in range(n):
+        out.append({
+            "t": START + 10 * i, "load1": round(0.37 * i, 2), "mem_used_mb": 1000 + i,
+            "alt_read_mb": 1234567.891 + i, "phase": ["bam_to_bed", "junction"][i % 2],
+            # Optional: omitted from usage.jsonl when unavailable
+            "disk_read_mb_s": None if i % 3 == 0 else round(1.1 * i, 1),
+            "percpu_percent": [12.5, 99.9],
+        })
+    return out
+
+
+def open_store(path, capacity=1 << 10):
+    return SampleStore(path, COLUMNS, {"task": "BamToBed", "shard": "2", "start_epoch": START},
+                       capacity=capacity, optional=["disk_read_mb_s"], jsonl_order=ORDER,
+                       enums={"phase": ["", "bam_to_bed", "junction"]})
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "usage.bin")
+    recs = make_records(300)
+    store = open_store(path)
+    for r in recs:
+        store.append(r)
+    store.close()
+
+    reader = StoreReader(path)
+    got = list(reader.records())
+    reader.close()
+    assert len(got) == 300
+    for want, rec in zip(recs, got):
+        assert rec["ts"] == datetime.fromtimestamp(want["t"]).isoformat()
+        assert rec["task"] == "BamToBed" and rec["shard"] == "2"
+        # float32 columns come back at 7 significant digits, float64 exactly
+        assert rec["load1"] == want["load1"]
+        assert rec["alt_read_mb"] == want["alt_read_mb"]
+        assert rec["mem_used_mb"] == want["mem_used_mb"]
+        assert rec["phase"] == want["phase"]
+        assert rec["percpu_percent"] == [12.5, 99.9]
+        if want["disk_read_mb_s"] is None:
+            assert "disk_read_mb_s" not in rec
+        else:
+            assert rec["disk_read_mb_s"] == want["disk_read_mb_s"]
+    assert list(got[0]) == [k for k in ORDER if k in got[0]]
+
+
+def test_truncated_tail_record_is_dropped(tmp_path):
+    path = str(tmp_path / "usage.bin")
+    store = open_store(path)
+    for r in make_records(10):
+        store.append(r)
+    size = store.rec.size
+    store.close()
+    assert os.path.getsize(path) == HEADER_SIZE + 10 * size
+    # A copy cut off halfway through the last record, while the header still says 10
+    with open(path, "r+b") as f:
+        f.truncate(HEADER_SIZE + 9 * size + size // 2)
+    assert read_header(path)[1] == 10
+    reader = StoreReader(path)
+    got = list(reader.records())
+    reader.close()
+    assert len(got) == 9
+    assert [r["mem_used_mb"] for r in got] == list(range(1000, 1009))
+
+
+def test_ring_keeps_newest_records_oldest_first(tmp_path):
+    path = str(tmp_path / "usage.bin")
+    store = open_store(path, capacity=64)
+    for r in make_records(150):
+        store.append(r)
+    store.close()
+    reader = StoreReader(path)
+    assert reader.wrapped
+    got = [r["mem_used_mb"] for r in reader.records()]
+    reader.close()
+    assert got == list(range(1000 + 150 - 64, 1000 + 150))
+
+
+def test_reopen_with_same_schema_appends(tmp_path):
+    path = str(tmp_path / "usage.bin")
+    recs = make_records(20)
+    store = open_store(path)
+    for r in recs[:12]:
+        store.append(r)
+    store.close()
+    store = open_store(path)
+    for r in recs[12:]:
+        store.append(r)
+    store.close()
+    reader = StoreReader(path)
+    assert [r["mem_used_mb"] for r in reader.records()] == [r["mem_used_mb"] for r in recs]
+    reader.close()
+
+
+def test_chunks_match_records(tmp_path):
+    np = pytest.importorskip("numpy")
+    path = str(tmp_path / "usage.bin")
+    store = open_store(path, capacity=100)
+    for r in make_records(250):
+        store.append(r)
+    store.close()
+    reader = StoreReader(path)
+    cols = {}
+    for chunk in reader.chunks(size=32):
+        for k, v in chunk.items():
+            cols.setdefault(k, []).append(v)
+    load1 = np.concatenate(cols["load1"]).tolist()
+    assert load1 == [r["load1"] for r in reader.records()]
+    reader.close()
+
+
+def test_export_jsonl(tmp_path):
+    path = str(tmp_path / "usage.bin")
+    store = open_store(path)
+    for r in make_records(5):
+        store.append(r)
+    store.close()
+    out = str(tmp_path / "usage.jsonl")
+    assert export(path, jsonl=out) == 5
+    with open(out) as f:
+        lines = [json.loads(line) for line in f]
+    assert [r["load1"] for r in lines] == [0.0, 0.37, 0.74, 1.11, 1.48]
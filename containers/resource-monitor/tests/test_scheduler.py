@@ -0,0 +1,77 @@
+import pytest
+
+from monitor import SampleScheduler
+
+RUNNING = {"pid": 100, "workers": 3, "cpu": 250.0}
+IDLE = {"pid": None, "workers": 0, "cpu": None}
+
+
+@pytest.fixture
+def sched():
+    return SampleScheduler(base_s=15.0, dense_s=2.0, idle_s=60.0, hold_s=60.0, idle_after_s=120.0)
+
+
+def test_dense_after_a_change_then_back_to_base(sched):
+    assert sched.next_interval(0.0, RUNNING, "bam_to_junction_bed") == (15.0, "base")
+    assert sched.next_interval(15.0, RUNNING, "prune") == (2.0, "phase_change")
+    assert sched.next_interval(70.0, RUNNING, "prune") == (2.0, "phase_change")
+    assert sched.next_interval(80.0, RUNNING, "prune") == (15.0, "base")
+    # A worker exiting is a change too
+    assert sched.next_interval(95.0, dict(RUNNING, workers=2), "prune") == (2.0, "phase_change")
+
+
+def test_idle_after_nothing_runs(sched):
+    assert sched.next_interval(0.0, IDLE) == (15.0, "base")
+    assert sched.next_interval(100.0, IDLE) == (15.0, "base")
+    assert sched.next_interval(120.0, IDLE) == (60.0, "idle")
+    # The tree starting ends idle sampling at once
+    assert sched.next_interval(180.0, RUNNING, "altanalyze") == (2.0, "phase_change")
+
+
+def test_io_spike(sched):
+    for t in range(0, 60, 15):
+        assert sched.next_interval(float(t), RUNNING, "prune", io_mb_s=5.0)[1] == "base"
+    assert sched.next_interval(60.0, RUNNING, "prune", io_mb_s=50.0) == (2.0, "io_spike")
+    # Small absolute rates never count as spikes
+    quiet = SampleScheduler(15.0, 2.0, 60.0)
+    quiet.next_interval(0.0, RUNNING, io_mb_s=0.1)
+    assert quiet.next_interval(15.0, RUNNING, io_mb_s=5.0)[1] == "base"
+
+
+def test_memory_disk_and_forecast_triggers(sched):
+    assert sched.next_interval(0.0, RUNNING, mem_frac=0.95) == (2.0, "mem_near_limit")
+    assert sched.next_interval(15.0, RUNNING, disk_critical=True) == (2.0, "disk_critical")
+    # ETA/120: 10 min away -> 5 s, never below the floor
+    assert sched.next_interval(30.0, RUNNING, etas=(600.0, 3600.0)) == (5.0, "forecast")
+    assert sched.next_interval(45.0, RUNNING, etas=(30.0,)) == (2.0, "forecast")
+    assert sched.next_interval(60.0, RUNNING, etas=(7200.0,)) == (15.0, "base")
+
+
+def test_intervals_are_ordered():
+    s = SampleScheduler(base_s=5.0, dense_s=10.0, idle_s=1.0)
+    assert (s.dense_s, s.idle_s) == (5.0, 5.0)
+
+
+def test_cpu_budget_caps_dense_sampling():
+    s = SampleScheduler(15.0, 2.0, 60.0, cpu_per_hour=1.0)
+    s.tick_done(0.0, 0.6)
+    assert s.next_interval(1.0, RUNNING, mem_frac=0.95) == (2.0, "mem_near_limit")
+    s.tick_done(2.0, 0.6)
+    assert s.next_interval(3.0, RUNNING, mem_frac=0.95) == (15.0, "capped")
+    # An hour later the spent CPU has left the window
+    s.tick_done(3602.0, 0.1)
+    assert s.next_interval(3603.0, RUNNING, mem_frac=0.95) == (2.0, "mem_near_limit")
+
+
+def test_tick_budget():
+    s = SampleScheduler(15.0, 2.0, 60.0, max_per_hour=10)
+    for t in range(7):
+        s.tick_done(float(t), 0.0)
+    assert s.next_interval(7.0, RUNNING, mem_frac=0.95) == (2.0, "mem_near_limit")
+    s.tick_done(7.0, 0.0)
+    # 80% of the hourly ticks used: no faster than base
+    assert s.next_interval(8.0, RUNNING, mem_frac=0.95) == (15.0, "capped")
+    s.tick_done(8.0, 0.0)
+    s.tick_done(9.0, 0.0)
+    # All used: wait for the oldest tick of the hour to expire
+    assert s.next_interval(10.0, RUNNING) == (3590.0, "capped")
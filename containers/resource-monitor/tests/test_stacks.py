@@ -0,0 +1,76 @@
+import os
+import sys
+
+import pytest
+
+from monitor import StackSampler
+
+GONE = 2 ** 22 + 1
+
+FAKE_PYSPY = """#!{python}
+import sys
+args = sys.argv[1:]
+pid = args[args.index("--pid") + 1]
+if {fail!r}:
+    print("Error: Failed to open process " + pid + ": Permission denied", file=sys.stderr)
+    sys.exit(1)
+assert "--nonblocking" in args and args[args.index("--format") + 1] == "raw"
+with open(args[args.index("--output") + 1], "w") as f:
+    f.write("<module> (AltAnalyze.py);main;work_" + pid + " 3\\n<module> (AltAnalyze.py);main 1\\n")
+"""
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="needs an executable script")
+
+
+def fake_pyspy(tmp_path, fail=False):
+    exe = tmp_path / ("py-spy-fail" if fail else "py-spy")
+    exe.write_text(FAKE_PYSPY.format(python=sys.executable, fail=fail))
+    exe.chmod(0o755)
+    return str(exe)
+
+
+def row(pid, cmd, cpu, name="python3"):
+    return {"pid": pid, "cmdline": cmd, "name": name, "cpu_percent": cpu}
+
+
+def test_targets_are_the_busiest_python_processes():
+    members = [row(1, "/bin/bash AltAnalyze.sh", 300.0, "bash"), row(2, "python3 prune.py", 50.0),
+               row(3, "/usr/bin/python3.11 AltAnalyze.py", 90.0, "AltAnalyze.py"), row(4, "python3 x.py", None)]
+    assert StackSampler.targets(members, 2) == [3, 2]
+    assert StackSampler.targets(members, 5) == [3, 2, 4]
+
+
+def test_capture_merges_folded_stacks(tmp_path):
+    out = tmp_path / "stacks"
+    out.mkdir()
+    # Counts from before a monitor restart are kept
+    (out / "prune.folded").write_text("<module> (AltAnalyze.py);main 10\n")
+    s = StackSampler(fake_pyspy(tmp_path), str(out), duration_s=1)
+    members = [row(11, "python3 prune.py", 90.0), row(12, "python3 prune.py", 80.0)]
+    assert s.capture(members, "prune") == 8
+    assert s.capture(members[:1], "prune") == 4
+    lines = (out / "prune.folded").read_text().splitlines()
+    assert lines[0] == "<module> (AltAnalyze.py);main 13"
+    assert sorted(lines[1:]) == ["<module> (AltAnalyze.py);main;work_11 6", "<module> (AltAnalyze.py);main;work_12 3"]
+    assert s.samples == 12 and not any(n.startswith(".capture") for n in os.listdir(out))
+    # Nothing to sample
+    assert s.capture([row(1, "bash run.sh", 100.0, "bash")], "prune") == 0
+
+
+def test_repeated_failures_disable_sampling(tmp_path, capsys):
+    s = StackSampler(fake_pyspy(tmp_path, fail=True), str(tmp_path / "stacks"), duration_s=1)
+    # A target that exited during the capture is not a failure
+    assert s.capture([row(GONE, "python3 prune.py", 90.0)], "prune") == 0
+    assert s.failures == 0
+    me = [row(os.getpid(), "python3 prune.py", 90.0)]
+    for _ in range(3):
+        s.capture(me, "prune")
+    assert not s.enabled and s.capture(me, "prune") == 0
+    err = capsys.readouterr().err
+    assert err.count("Permission denied") == 2 and "disabled" in err
+
+
+def test_missing_executable(tmp_path):
+    s = StackSampler(str(tmp_path / "no-py-spy"), str(tmp_path / "stacks"))
+    assert s.capture([row(os.getpid(), "python3 prune.py", 90.0)], "prune") == 0
+    assert s.failures == 1
@@ -0,0 +1,106 @@
+import json
+
+import pytest
+
+from aggregate import attempt_info, end_reason, stitch, write_attempts_tsv
+
+CALL = "wf/0f8e8c0a-1b2c-4d3e-8f90-123456789abc/call-BamToBed"
+
+
+def make_attempt(root, shard, attempt, status, wall_s=100.0, **ckpt):
+    d = root / CALL / f"shard-{shard}"
+    if attempt > 1:
+        d = d / f"attempt-{attempt}"
+    d = d / "monitoring"
+    d.mkdir(parents=True)
+    (d / "metadata.json").write_text(json.dumps({"cpu_limit_cores": 2.0}) + "\n")
+    doc = {"status": status, "task": "BamToBed", "shard": str(shard), "attempt": str(attempt) if attempt > 1 else "",
+           "start_ts": f"2026-01-01T0{attempt}:00:00", "wall_s": wall_s, "phase": "bam_to_junction_bed",
+           "phases_reached": ["idle", "bam_to_junction_bed"],
+           "counters": {"cg_cpu_core_s": wall_s, "alt_read_mb": 10.0, "alt_write_mb": 5.0}, **ckpt}
+    (d / "checkpoint.json").write_text(json.dumps(doc) + "\n")
+    return d
+
+
+@pytest.fixture
+def tree(tmp_path):
+    # shard 0: preempted, then finished
+    make_attempt(tmp_path, 0, 1, "terminated", preempted=True)
+    make_attempt(tmp_path, 0, 2, "finished", task_exit=0)
+    # shard 1: VM vanished, SIGTERM without a metadata answer, task failure, then finished
+    make_attempt(tmp_path, 1, 1, "running")
+    make_attempt(tmp_path, 1, 2, "terminated", preempted=None)
+    make_attempt(tmp_path, 1, 3, "finished", task_exit=1)
+    make_attempt(tmp_path, 1, 4, "finished", task_exit=0)
+    # shard 2: aborted (metadata says not preempted), then still failing
+    make_attempt(tmp_path, 2, 1, "terminated", preempted=False)
+    make_attempt(tmp_path, 2, 2, "finished", task_exit=2)
+    # shard 3: one clean attempt
+    make_attempt(tmp_path, 3, 1, "finished", task_exit=0)
+    return tmp_path
+
+
+def test_attempt_info_from_checkpoint(tree):
+    info = attempt_info(str(tree / CALL / "shard-1" / "monitoring"))
+    assert (info["task"], info["shard"], info["attempt"]) == ("BamToBed", "1", 1)
+    assert info["status"] == "vanished" and info["preempted"] is None
+    assert info["vcpu_s"] == 200.0 and info["cpu_core_s"] == 100.0 and info["read_mb"] == 10.0
+    info = attempt_info(str(tree / CALL / "shard-1" / "attempt-3" / "monitoring"))
+    assert (info["attempt"], info["status"], info["task_exit"]) == (3, "finished", 1)
+
+
+def test_attempt_info_from_samples(tmp_path):
+    d = tmp_path / "monitoring"
+    d.mkdir()
+    (d / "metadata.json").write_text(json.dumps({"task": "BedToJunction", "shard": "", "attempt": "",
+                                                 "cpu_count": 4}) + "\n")
+    with open(d / "usage.jsonl", "w") as f:
+        for i in range(11):
+            f.write(json.dumps({"ts": f"2026-01-01T00:00:{i * 5:02d}", "alt_cpu": 200.0, "alt_read_mb": i,
+                                "alt_write_mb": 2 * i, "phase": "prune"}) + "\n")
+    info = attempt_info(str(d))
+    assert info["status"] == "unknown" and info["task"] == "BedToJunction"
+    assert info["wall_s"] == 50.0 and info["vcpu_s"] == 200.0
+    assert info["cpu_core_s"] == 100.0 and (info["read_mb"], info["write_mb"]) == (10, 20)
+    assert info["phase"] == "prune"
+
+
+@pytest.mark.parametrize("status, ckpt, reason", [
+    ("terminated", {"preempted": True}, "preempted"),
+    ("terminated", {"preempted": False}, "terminated"),
+    ("terminated", {"preempted": None}, "terminated"),
+    ("vanished", {}, "vanished"),
+    ("finished", {"task_exit": 0}, "finished"),
+    ("finished", {"task_exit": 137}, "task_failed"),
+    ("finished", {}, "finished"),
+    (None, {}, "unknown"),
+])
+def test_end_reason(status, ckpt, reason):
+    assert end_reason({"status": status, "preempted": None, **ckpt}) == reason
+
+
+def test_stitch(tree):
+    res = stitch(str(tree))
+    rows = {r["shard"]: r for r in res["shards"]}
+    assert [(r["attempts"], r["lost_attempts"], r["preempted_attempts"], r["final_status"])
+            for r in res["shards"]] == [(2, 1, 1, "finished"), (4, 3, 2, "finished"),
+                                        (2, 1, 0, "finished"), (1, 0, 0, "finished")]
+    assert [a["reason"] for a in rows["1"]["attempt_details"]] == ["vanished", "terminated", "task_failed", None]
+    assert [a["lost"] for a in rows["1"]["attempt_details"]] == [True, True, True, False]
+    assert [a["reason"] for a in rows["2"]["attempt_details"]] == ["terminated", None]
+    assert rows["2"]["attempt_details"][-1]["task_exit"] == 2
+    t = res["totals"]
+    assert (t["shards"], t["attempts"], t["lost_attempts"], t["preempted_attempts"]) == (4, 9, 5, 3)
+    assert t["total_vcpu_s"] == 1800.0 and t["wasted_vcpu_s"] == 1000.0
+    assert t["wasted_vcpu_fraction"] == round(1000 / 1800, 4)
+
+
+def test_attempts_tsv(tree, tmp_path):
+    path = tmp_path / "attempts.tsv"
+    write_attempts_tsv(stitch(str(tree)), str(path))
+    rows = [line.rstrip("\n").split("\t") for line in open(path)]
+    hdr = rows[0]
+    assert len(rows) == 10
+    shard1 = [dict(zip(hdr, r)) for r in rows[1:] if r[1] == "1"]
+    assert [(r["attempt"], r["reason"], r["task_exit"]) for r in shard1] == [
+        ("1", "vanished", ""), ("2", "terminated", ""), ("3", "task_failed", "1"), ("4", "", "0")]
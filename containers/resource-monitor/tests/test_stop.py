@@ -0,0 +1,81 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytestmark = pytest.mark.skipif(not os.path.isdir("/proc/self"), reason="needs Linux /proc")
+
+
+def start(mon_dir, **env):
+    env = {**os.environ, "MON_DIR": str(mon_dir), "MONITOR_INTERVAL_SECONDS": "1", "MON_MIN_INTERVAL_SECONDS": "1",
+           "MON_DENSE_INTERVAL_SECONDS": "1", "MON_FLUSH_SECONDS": "60", "MON_PREEMPT_URL": "", **env}
+    proc = subprocess.Popen([sys.executable, os.path.join(HERE, "monitor.py")], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 20
+    while not (mon_dir / "checkpoint.json").exists():
+        assert proc.poll() is None, "monitor exited during startup"
+        assert time.monotonic() < deadline, "monitor wrote no checkpoint"
+        time.sleep(0.1)
+    return proc
+
+
+def stop(proc, mon_dir, task_exit=None):
+    if task_exit is not None:
+        (mon_dir / "stop").write_text(f"{task_exit}\n")
+    proc.send_signal(signal.SIGTERM)
+    assert proc.wait(timeout=20) == 0
+    with open(mon_dir / "checkpoint.json") as f:
+        return json.load(f)
+
+
+def flight(mon_dir):
+    d = mon_dir / "flight"
+    return sorted(p.split("-", 1)[1] for p in os.listdir(d)) if d.exists() else []
+
+
+def lines(path):
+    with open(path) as f:
+        return sum(1 for _ in f)
+
+
+def test_sigusr1_without_flight_recorder_is_ignored(tmp_path):
+    proc = start(tmp_path, MON_FLIGHT="0")
+    proc.send_signal(signal.SIGUSR1)
+    time.sleep(1.5)
+    assert proc.poll() is None
+    ckpt = stop(proc, tmp_path, task_exit=0)
+    assert ckpt["status"] == "finished" and ckpt["task_exit"] == 0
+    # The buffered samples still reach usage.jsonl
+    assert lines(tmp_path / "usage.jsonl") >= 2
+    assert flight(tmp_path) == []
+
+
+def test_task_stop_is_not_a_termination(tmp_path):
+    proc = start(tmp_path)
+    ckpt = stop(proc, tmp_path, task_exit=0)
+    assert ckpt["status"] == "finished" and "preempted" not in ckpt
+    assert flight(tmp_path) == []
+
+
+def test_failed_task_dumps_flight_recorder(tmp_path):
+    proc = start(tmp_path)
+    time.sleep(1.5)
+    ckpt = stop(proc, tmp_path, task_exit=1)
+    assert ckpt["status"] == "finished" and ckpt["task_exit"] == 1
+    assert flight(tmp_path) == ["task_failed.jsonl"]
+
+
+def test_unexpected_sigterm(tmp_path):
+    # A stop file from an earlier run in the same directory does not count
+    (tmp_path / "stop").write_text("0\n")
+    proc = start(tmp_path)
+    time.sleep(1.5)
+    ckpt = stop(proc, tmp_path)
+    assert ckpt["status"] == "terminated" and ckpt["preempted"] is None and "task_exit" not in ckpt
+    assert flight(tmp_path) == ["sigterm.jsonl"]